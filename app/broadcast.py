@@ -0,0 +1,128 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramServerError,
+)
+
+import app.db as db
+from app.db import DELIVERY_BLOCKED, DELIVERY_FAILED, DELIVERY_RETRY, DELIVERY_SENT
+from app.outbound import SendPriority, send_priority
+
+BROADCAST_PAGE_SIZE = 500
+BROADCAST_WORKERS = 8
+
+
+async def deliver(bot: Bot, broadcast_id: int, chat_id: int, text: str) -> str:
+    """Send one broadcast message and record the outcome."""
+    error = None
+    try:
+        with send_priority(SendPriority.BULK):
+            await bot.send_message(chat_id, text, parse_mode=ParseMode.HTML)
+    except TelegramForbiddenError as exc:
+        # Blocked the bot or deleted the account.
+        status, error = DELIVERY_BLOCKED, exc.message
+    except (TelegramNetworkError, TelegramServerError) as exc:
+        # Timeouts and 5xx say nothing about the recipient; try again later.
+        status, error = DELIVERY_RETRY, exc.message
+    except TelegramAPIError as exc:
+        status, error = DELIVERY_FAILED, exc.message
+    else:
+        status = DELIVERY_SENT
+    await db.save_broadcast_delivery(broadcast_id, chat_id, status, error)
+    return status
+
+
+async def run_broadcast(
+    bot: Bot,
+    broadcast_id: int,
+    workers: int = BROADCAST_WORKERS,
+    page_size: int = BROADCAST_PAGE_SIZE,
+) -> dict[str, int]:
+    """Deliver a broadcast to every recipient that has no delivery record yet.
+
+    Recipients are read one page at a time and handed to ``workers`` concurrent
+    senders; the Bot API rate limits are applied by the session's
+    ``OutboundLimiter``. Each delivery is recorded as soon as it completes and
+    the cursor is saved after every page, so running an interrupted broadcast
+    again continues where it stopped. Deliveries that hit a network error or a
+    Telegram server error are recorded as ``retry`` and sent again once after
+    the last page; if any are still left, the broadcast stays unfinished and a
+    resume repeats them. Other failed deliveries are final (a 429 is already
+    retried by the session). If a delivery could not be recorded, the run stops
+    after the current page and the broadcast stays unfinished. Returns delivery
+    counts by status.
+    """
+    broadcast = await db.load_broadcast(broadcast_id)
+    if broadcast is None:
+        raise ValueError(f"Broadcast {broadcast_id} does not exist")
+    text = broadcast["text"]
+    queue: asyncio.Queue[int] = asyncio.Queue(maxsize=workers * 2)
+    unrecorded = 0
+
+    async def worker():
+        nonlocal unrecorded
+        while True:
+            chat_id = await queue.get()
+            try:
+                await deliver(bot, broadcast_id, chat_id, text)
+            except Exception:
+                unrecorded += 1
+                logging.exception("Broadcast %s to chat %s failed", broadcast_id, chat_id)
+            finally:
+                queue.task_done()
+
+    async def deliver_page(page: list[int]):
+        for chat_id in page:
+            await queue.put(chat_id)
+        await queue.join()
+
+    tasks = [asyncio.create_task(worker()) for _ in range(max(1, workers))]
+    try:
+        cursor = broadcast["cursor"]
+        while True:
+            page = await db.load_broadcast_recipients(broadcast_id, cursor, page_size)
+            if not page:
+                break
+            await deliver_page(page)
+            if unrecorded:
+                # Keep the cursor so a resume scans this page again.
+                break
+            cursor = page[-1]
+            await db.set_broadcast_cursor(broadcast_id, cursor)
+        retry_cursor = None
+        while not unrecorded:
+            page = await db.load_broadcast_retries(broadcast_id, retry_cursor, page_size)
+            if not page:
+                break
+            await deliver_page(page)
+            retry_cursor = page[-1]
+        counts = await db.count_broadcast_deliveries(broadcast_id)
+        if not unrecorded and not counts.get(DELIVERY_RETRY):
+            await db.finish_broadcast(broadcast_id)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return counts
+
+
+def format_broadcast_report(broadcast_id: int, counts: dict[str, int]) -> str:
+    outcome = "не завершена" if counts.get(DELIVERY_RETRY) else "завершена"
+    return (
+        f"Рассылка #{broadcast_id} {outcome}.\n"
+        f"Доставлено: {counts.get(DELIVERY_SENT, 0)}\n"
+        f"Заблокировали бота: {counts.get(DELIVERY_BLOCKED, 0)}\n"
+        f"Ошибки: {counts.get(DELIVERY_FAILED, 0)}"
+        + (
+            f"\nНе доставлено из-за сбоя Telegram: {counts[DELIVERY_RETRY]}, "
+            f"повторить: /broadcast_resume {broadcast_id}"
+            if counts.get(DELIVERY_RETRY)
+            else ""
+        )
+    )
@@ -1,4 +1,6 @@
 import os
+import re
+from dataclasses import dataclass
 
 from dotenv import load_dotenv
 
@@ -6,6 +8,11 @@ from app.paths import BASE_DIR
 
 ENV_PATH = BASE_DIR / ".env"
 BOT_TOKEN_PLACEHOLDER = "replace_with_telegram_bot_token"
+BOT_MODES = ("polling", "webhook")
+STATE_BACKENDS = ("sqlite", "shared", "memory")
+DEFAULT_WEBHOOK_PATH = "/telegram/webhook"
+# Telegram accepts 1-256 characters A-Z, a-z, 0-9, _ and - as a webhook secret.
+WEBHOOK_SECRET_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,256}")
 
 load_dotenv(ENV_PATH)
 
@@ -38,3 +45,132 @@ def get_admin_chat_id() -> int:
         raise RuntimeError(
             f"ADMIN_CHAT_ID must be an integer, got {raw_value!r}."
         ) from exc
+
+
+def get_int_env(name: str, default: int) -> int:
+    raw_value = os.getenv(name)
+    if raw_value is None or not raw_value.strip():
+        return default
+    try:
+        return int(raw_value)
+    except ValueError as exc:
+        raise RuntimeError(
+            f"{name} must be an integer, got {raw_value!r}."
+        ) from exc
+
+
+def get_float_env(name: str, default: float) -> float:
+    raw_value = os.getenv(name)
+    if raw_value is None or not raw_value.strip():
+        return default
+    try:
+        return float(raw_value)
+    except ValueError as exc:
+        raise RuntimeError(
+            f"{name} must be a number, got {raw_value!r}."
+        ) from exc
+
+
+def get_activity_batch_size() -> int:
+    return max(1, get_int_env("ACTIVITY_BATCH_SIZE", 100))
+
+
+def get_activity_flush_interval() -> float:
+    return max(0.01, get_float_env("ACTIVITY_FLUSH_INTERVAL", 1.0))
+
+
+def get_bot_mode() -> str:
+    mode = (os.getenv("BOT_MODE") or "polling").strip().lower()
+    if mode not in BOT_MODES:
+        raise RuntimeError(
+            f"BOT_MODE must be one of {', '.join(BOT_MODES)}, got {mode!r}."
+        )
+    return mode
+
+
+@dataclass(frozen=True)
+class WebhookSettings:
+    base_url: str
+    path: str
+    host: str
+    port: int
+    secret_token: str
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}{self.path}"
+
+
+def get_webhook_settings() -> WebhookSettings:
+    base_url = get_required_env("WEBHOOK_BASE_URL").rstrip("/")
+    if not base_url.startswith("https://"):
+        raise RuntimeError(
+            f"WEBHOOK_BASE_URL must be a public https:// URL, got {base_url!r}."
+        )
+    path = (os.getenv("WEBHOOK_PATH") or DEFAULT_WEBHOOK_PATH).strip()
+    if not path.startswith("/"):
+        path = f"/{path}"
+    secret_token = get_required_env("WEBHOOK_SECRET")
+    if not WEBHOOK_SECRET_PATTERN.fullmatch(secret_token):
+        raise RuntimeError(
+            "WEBHOOK_SECRET may contain only 1-256 characters A-Z, a-z, 0-9, _ and -."
+        )
+    return WebhookSettings(
+        base_url=base_url,
+        path=path,
+        host=(os.getenv("WEBHOOK_HOST") or "0.0.0.0").strip(),
+        port=get_int_env("WEBHOOK_PORT", 8080),
+        secret_token=secret_token,
+    )
+
+
+def get_session_cache_size() -> int:
+    return max(1, get_int_env("SESSION_CACHE_SIZE", 1000))
+
+
+def get_session_cache_ttl() -> float:
+    return max(1.0, get_float_env("SESSION_CACHE_TTL", 3600.0))
+
+
+def get_outbound_global_rate() -> float:
+    """Bot API sends per second across all chats."""
+    return max(0.1, get_float_env("OUTBOUND_GLOBAL_RATE", 30.0))
+
+
+def get_outbound_admin_rate() -> float:
+    """Bot API sends per minute to ADMIN_CHAT_ID; Telegram allows 20 in a group."""
+    return max(1.0, get_float_env("OUTBOUND_ADMIN_RATE", 20.0))
+
+
+def get_updates_concurrency_limit() -> int | None:
+    """Max updates handled at once while polling; 0 or unset means no limit."""
+    limit = get_int_env("UPDATES_CONCURRENCY_LIMIT", 0)
+    return limit if limit > 0 else None
+
+
+def get_metrics_address() -> tuple[str, int] | None:
+    """Where to serve /metrics; disabled unless METRICS_PORT is set."""
+    port = get_int_env("METRICS_PORT", 0)
+    if port <= 0:
+        return None
+    return (os.getenv("METRICS_HOST") or "127.0.0.1").strip(), port
+
+
+def get_slow_callback_threshold() -> float | None:
+    """Seconds an event loop step may take before it is logged; unset disables it."""
+    milliseconds = get_float_env("SLOW_CALLBACK_MS", 0.0)
+    return milliseconds / 1000 if milliseconds > 0 else None
+
+
+def get_recommendation_workers() -> int:
+    """Threads that render diagnostic results; 0 renders on the event loop."""
+    return max(0, get_int_env("RECOMMENDATION_WORKERS", 2))
+
+
+def get_state_backend() -> str:
+    backend = (os.getenv("STATE_BACKEND") or "sqlite").strip().lower()
+    if backend not in STATE_BACKENDS:
+        raise RuntimeError(
+            f"STATE_BACKEND must be one of {', '.join(STATE_BACKENDS)}, got {backend!r}."
+        )
+    return backend
@@ -1,6 +1,7 @@
 from app.config import get_admin_chat_id
 
-ADMIN_CHAT_ID: int = get_admin_chat_id()
+# Resolved from the environment on first access, see __getattr__ below.
+ADMIN_CHAT_ID: int
 
 START = "start"
 CLIENT = "client"
@@ -14,3 +15,12 @@ REVIEWS = "reviews"
 SIGNING = "signing"
 CONSULTING = "consulting"
 TEST = "test"
+
+
+def __getattr__(name: str):
+    # Importing handlers (tests, tooling, benchmarks) must not require a
+    # configured .env; the value is cached as a plain attribute once read.
+    if name == "ADMIN_CHAT_ID":
+        value = globals()[name] = get_admin_chat_id()
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,13 +1,80 @@
+import asyncio
 import json
+import logging
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator
+
 import aiosqlite
 from datetime import datetime, timezone
+from app.config import get_activity_batch_size, get_activity_flush_interval
+from app.metrics import DB_SECONDS, timed
 from app.paths import DATA_DIR
 
 DB_PATH = DATA_DIR / "contacts.db"
+# sqlite3 keeps this many prepared statements per connection; every query below is
+# a constant string, so repeated calls reuse the compiled statement.
+STATEMENT_CACHE_SIZE = 128
+# While the database is unavailable, ActivityLog keeps at most this many batches.
+ACTIVITY_BACKLOG_BATCHES = 10
+
+# broadcast_deliveries.status. All but DELIVERY_RETRY are final: a resumed
+# broadcast skips chats with any delivery record and sends again only to chats
+# whose last attempt hit a network or Telegram server error.
+DELIVERY_SENT = "sent"
+DELIVERY_BLOCKED = "blocked"
+DELIVERY_FAILED = "failed"
+DELIVERY_RETRY = "retry"
+
+_connection: aiosqlite.Connection | None = None
+_write_lock: asyncio.Lock | None = None
+
+
+async def _connect() -> aiosqlite.Connection:
+    connection = await aiosqlite.connect(DB_PATH, cached_statements=STATEMENT_CACHE_SIZE)
+    # WAL lets readers proceed while a write is in progress; with WAL, NORMAL only
+    # syncs on checkpoints and still never corrupts the database on a crash.
+    await connection.execute("PRAGMA journal_mode=WAL")
+    await connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def get_connection() -> aiosqlite.Connection:
+    if _connection is None:
+        raise RuntimeError("Database is not initialized. Call init_db() first.")
+    return _connection
+
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[aiosqlite.Connection]:
+    """Run statements on the shared connection as one committed unit.
+
+    The connection is shared by all handlers, so writers take a lock to keep other
+    coroutines from committing or rolling back a half-finished transaction.
+
+    The lock only serializes writers. A read made outside ``transaction()`` runs
+    on the same connection and therefore sees the statements of a transaction
+    that another coroutine has not committed yet, and may still roll back. Reads
+    whose result must not depend on such writes (e.g. checking a row and then
+    updating it) belong inside ``transaction()``.
+    """
+    connection = get_connection()
+    async with _write_lock:
+        try:
+            yield connection
+        except BaseException:
+            await connection.rollback()
+            raise
+        await connection.commit()
 
 
 async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
+    global _connection, _write_lock, _activity_log
+    if _connection is None:
+        _connection = await _connect()
+        _write_lock = asyncio.Lock()
+        _activity_log = ActivityLog(get_activity_batch_size(), get_activity_flush_interval())
+        _activity_log.start()
+    async with transaction() as db:
         # await db.execute("""DROP TABLE IF EXISTS users;""")
         # await db.commit()
         await db.execute("""
@@ -31,7 +98,192 @@ async def init_db():
             updated_at TEXT NOT NULL
         );
         """)
-        await db.commit()
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS consultation_chats (
+            chat_id INTEGER PRIMARY KEY,
+            updated_at TEXT NOT NULL
+        );
+        """)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS consultation_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_chat_id INTEGER NOT NULL,
+            direction TEXT NOT NULL,
+            content_type TEXT NOT NULL,
+            text TEXT,
+            client_message_id INTEGER,
+            created_at TEXT NOT NULL
+        );
+        """)
+        await db.execute("""
+        CREATE INDEX IF NOT EXISTS consultation_messages_client
+        ON consultation_messages (client_chat_id, id);
+        """)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS consultation_links (
+            admin_message_id INTEGER PRIMARY KEY,
+            client_chat_id INTEGER NOT NULL,
+            consultation_message_id INTEGER NOT NULL
+        );
+        """)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS media_files (
+            content_hash TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            uploaded_at TEXT NOT NULL
+        );
+        """)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS blocked_users (
+            chat_id INTEGER PRIMARY KEY,
+            blocked_at TEXT NOT NULL
+        );
+        """)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL,
+            cursor INTEGER,
+            created_at TEXT NOT NULL,
+            finished_at TEXT
+        );
+        """)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            broadcast_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (broadcast_id, chat_id)
+        );
+        """)
+
+
+async def close_db():
+    global _connection, _write_lock, _activity_log
+    activity_log, _activity_log = _activity_log, None
+    if activity_log is not None:
+        # Activity queued before shutdown must reach the database.
+        await activity_log.stop()
+    connection, _connection, _write_lock = _connection, None, None
+    if connection is not None:
+        await connection.close()
+
+
+_UPSERT_USER = """
+INSERT INTO users (
+    chat_id, first_name, last_name, username,
+    phone_number, is_bot, language_code,
+    last_activity_at, command
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(chat_id) DO UPDATE SET
+    first_name = excluded.first_name,
+    last_name = excluded.last_name,
+    username = excluded.username,
+    -- без нового номера сохраняем старый
+    phone_number = COALESCE(excluded.phone_number, users.phone_number),
+    is_bot = excluded.is_bot,
+    language_code = excluded.language_code,
+    last_activity_at = excluded.last_activity_at,
+    command = excluded.command
+"""
+
+
+class ActivityLog:
+    """Write-behind buffer for user activity.
+
+    Handlers only append a row; a background task writes pending rows in one
+    transaction when ``batch_size`` rows are queued or every ``flush_interval``
+    seconds, so replying to the user never waits for the disk. Rows of a failed
+    write are kept for the next one, collapsed to one per chat and capped at
+    ``ACTIVITY_BACKLOG_BATCHES`` batches.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: list[tuple] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, row: tuple):
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Failed to write user activity, will retry")
+
+    @timed(DB_SECONDS)
+    async def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            async with transaction() as db:
+                await db.executemany(_UPSERT_USER, rows)
+                # A user who writes to the bot again has unblocked it.
+                await db.executemany(
+                    "DELETE FROM blocked_users WHERE chat_id = ?",
+                    [(row[0],) for row in rows],
+                )
+        except BaseException:
+            self._requeue(rows)
+            raise
+
+    def _requeue(self, rows: list[tuple]):
+        # Rows are upserts by chat_id, so the newest row per chat is enough as
+        # long as it keeps the last known phone number (see _UPSERT_USER).
+        merged: dict[int, tuple] = {}
+        for row in (*rows, *self._pending):
+            previous = merged.pop(row[0], None)
+            if previous is not None and row[4] is None:
+                row = (*row[:4], previous[4], *row[5:])
+            merged[row[0]] = row
+        backlog = list(merged.values())
+        limit = self.batch_size * ACTIVITY_BACKLOG_BATCHES
+        if len(backlog) > limit:
+            logging.warning(
+                "Activity backlog is full, dropping %d oldest rows", len(backlog) - limit
+            )
+            backlog = backlog[-limit:]
+        self._pending = backlog
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        await self.flush()
+
+
+_activity_log: ActivityLog | None = None
+
+
+async def flush_activity():
+    if _activity_log is not None:
+        await _activity_log.flush()
 
 
 async def log_user(chat_id: int,
@@ -40,78 +292,27 @@ async def log_user(chat_id: int,
                    phone_number: str = None):
     if user is None:
         return
+    if _activity_log is None:
+        raise RuntimeError("Database is not initialized. Call init_db() first.")
 
     now = datetime.now(timezone.utc).isoformat()
-
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "SELECT chat_id, phone_number FROM users WHERE chat_id = ?",
-            (chat_id,)
-        )
-        row = await cursor.fetchone()
-
-        if row is not None and phone_number is None:
-            _, existing_phone = row
-            phone_number = existing_phone
-
-        if row is None:
-            # Вставка нового пользователя
-            await db.execute(
-                """
-                INSERT INTO users (
-                    chat_id, first_name, last_name, username, 
-                    phone_number, is_bot, language_code,
-                    last_activity_at, command
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    chat_id,
-                    user.first_name,
-                    user.last_name,
-                    user.username,
-                    phone_number,
-                    int(user.is_bot),
-                    user.language_code,
-                    now,
-                    command,
-                )
-            )
-        else:
-            # Обновление существующего
-            await db.execute(
-                """
-                UPDATE users
-                SET
-                    first_name = ?,
-                    last_name = ?,
-                    username = ?,
-                    phone_number = ?,
-                    is_bot = ?,
-                    language_code = ?,
-                    last_activity_at = ?,
-                    command = ?
-                WHERE chat_id = ?
-                """,
-                (
-                    user.first_name,
-                    user.last_name,
-                    user.username,
-                    phone_number,
-                    int(user.is_bot),
-                    user.language_code,
-                    now,
-                    command,
-                    chat_id,
-                )
-            )
-
-        await db.commit()
+    _activity_log.add((
+        chat_id,
+        user.first_name,
+        user.last_name,
+        user.username,
+        phone_number,
+        int(user.is_bot),
+        user.language_code,
+        now,
+        command,
+    ))
 
 
+@timed(DB_SECONDS)
 async def save_diagnostic_session(chat_id: int, answers: list[str], question_id: str):
     now = datetime.now(timezone.utc).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         await db.execute(
             """
             INSERT INTO diagnostic_sessions (chat_id, answers_json, question_id, updated_at)
@@ -123,18 +324,17 @@ async def save_diagnostic_session(chat_id: int, answers: list[str], question_id:
             """,
             (chat_id, json.dumps(answers, ensure_ascii=False), question_id, now),
         )
-        await db.commit()
 
 
+@timed(DB_SECONDS)
 async def load_diagnostic_session(chat_id: int) -> dict | None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "SELECT answers_json, question_id FROM diagnostic_sessions WHERE chat_id = ?",
-            (chat_id,),
-        )
-        row = await cursor.fetchone()
-    if row is None:
+    rows = await get_connection().execute_fetchall(
+        "SELECT answers_json, question_id FROM diagnostic_sessions WHERE chat_id = ?",
+        (chat_id,),
+    )
+    if not rows:
         return None
+    row = rows[0]
     try:
         answers = json.loads(row[0])
     except (json.JSONDecodeError, TypeError):
@@ -144,7 +344,287 @@ async def load_diagnostic_session(chat_id: int) -> dict | None:
     return {"answers": answers, "question_id": row[1]}
 
 
+@timed(DB_SECONDS)
 async def delete_diagnostic_session(chat_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction() as db:
         await db.execute("DELETE FROM diagnostic_sessions WHERE chat_id = ?", (chat_id,))
-        await db.commit()
+
+
+@timed(DB_SECONDS)
+async def set_consultation_active(chat_id: int, active: bool):
+    async with transaction() as db:
+        if active:
+            await db.execute(
+                """
+                INSERT INTO consultation_chats (chat_id, updated_at)
+                VALUES (?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET updated_at = excluded.updated_at
+                """,
+                (chat_id, datetime.now(timezone.utc).isoformat()),
+            )
+        else:
+            await db.execute("DELETE FROM consultation_chats WHERE chat_id = ?", (chat_id,))
+
+
+@timed(DB_SECONDS)
+async def is_consultation_active(chat_id: int) -> bool:
+    rows = await get_connection().execute_fetchall(
+        "SELECT 1 FROM consultation_chats WHERE chat_id = ?",
+        (chat_id,),
+    )
+    return bool(rows)
+
+
+@timed(DB_SECONDS)
+async def load_consultation_chats() -> set[int]:
+    rows = await get_connection().execute_fetchall("SELECT chat_id FROM consultation_chats")
+    return {row[0] for row in rows}
+
+
+@timed(DB_SECONDS)
+async def save_consultation_message(
+    client_chat_id: int,
+    direction: str,
+    content_type: str,
+    text: str | None,
+    admin_message_ids: list[int],
+    client_message_id: int | None = None,
+) -> int:
+    """Add a message to the client's consultation thread.
+
+    ``direction`` is ``in`` for client questions and ``out`` for admin replies.
+    Every admin chat message in ``admin_message_ids`` is linked to the client,
+    so a reply to any of them reaches the right chat.
+    """
+    async with transaction() as db:
+        cursor = await db.execute(
+            """
+            INSERT INTO consultation_messages (
+                client_chat_id, direction, content_type, text, client_message_id, created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                client_chat_id,
+                direction,
+                content_type,
+                text,
+                client_message_id,
+                datetime.now(timezone.utc).isoformat(),
+            ),
+        )
+        message_id = cursor.lastrowid
+        await db.executemany(
+            """
+            INSERT OR REPLACE INTO consultation_links (
+                admin_message_id, client_chat_id, consultation_message_id
+            )
+            VALUES (?, ?, ?)
+            """,
+            [(admin_id, client_chat_id, message_id) for admin_id in admin_message_ids],
+        )
+    return message_id
+
+
+@timed(DB_SECONDS)
+async def find_consultation_client(admin_message_id: int) -> int | None:
+    rows = await get_connection().execute_fetchall(
+        "SELECT client_chat_id FROM consultation_links WHERE admin_message_id = ?",
+        (admin_message_id,),
+    )
+    return rows[0][0] if rows else None
+
+
+@timed(DB_SECONDS)
+async def load_consultation_history(client_chat_id: int, limit: int = 20) -> list[dict]:
+    """The client's last ``limit`` consultation messages, oldest first."""
+    rows = await get_connection().execute_fetchall(
+        """
+        SELECT direction, content_type, text, created_at FROM consultation_messages
+        WHERE client_chat_id = ?
+        ORDER BY id DESC
+        LIMIT ?
+        """,
+        (client_chat_id, limit),
+    )
+    return [
+        {"direction": row[0], "content_type": row[1], "text": row[2], "created_at": row[3]}
+        for row in reversed(rows)
+    ]
+
+
+@timed(DB_SECONDS)
+async def load_media_file_ids() -> dict[str, str]:
+    rows = await get_connection().execute_fetchall(
+        "SELECT content_hash, file_id FROM media_files"
+    )
+    return {row[0]: row[1] for row in rows}
+
+
+@timed(DB_SECONDS)
+async def save_media_file_id(content_hash: str, file_id: str):
+    async with transaction() as db:
+        await db.execute(
+            """
+            INSERT INTO media_files (content_hash, file_id, uploaded_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(content_hash) DO UPDATE SET
+                file_id = excluded.file_id,
+                uploaded_at = excluded.uploaded_at
+            """,
+            (content_hash, file_id, datetime.now(timezone.utc).isoformat()),
+        )
+
+
+@timed(DB_SECONDS)
+async def delete_media_file_id(content_hash: str):
+    async with transaction() as db:
+        await db.execute("DELETE FROM media_files WHERE content_hash = ?", (content_hash,))
+
+
+@timed(DB_SECONDS)
+async def create_broadcast(text: str) -> int:
+    async with transaction() as db:
+        cursor = await db.execute(
+            "INSERT INTO broadcasts (text, status, created_at) VALUES (?, 'running', ?)",
+            (text, datetime.now(timezone.utc).isoformat()),
+        )
+        return cursor.lastrowid
+
+
+@timed(DB_SECONDS)
+async def load_broadcast(broadcast_id: int) -> dict | None:
+    rows = await get_connection().execute_fetchall(
+        "SELECT text, status, cursor FROM broadcasts WHERE id = ?",
+        (broadcast_id,),
+    )
+    if not rows:
+        return None
+    text, status, cursor = rows[0]
+    return {"id": broadcast_id, "text": text, "status": status, "cursor": cursor}
+
+
+@timed(DB_SECONDS)
+async def load_broadcast_recipients(
+    broadcast_id: int, after_chat_id: int | None, limit: int
+) -> list[int]:
+    """Next page of recipients in chat ID order, starting after ``after_chat_id``.
+
+    Keyset pagination: every page is an index range scan, so a broadcast never
+    holds more than one page in memory. Bots, users who blocked the bot and
+    chats that already have a delivery record of any status are skipped; see
+    ``load_broadcast_retries`` for deliveries to repeat.
+    """
+    rows = await get_connection().execute_fetchall(
+        """
+        SELECT users.chat_id FROM users
+        WHERE users.chat_id > ?
+            AND users.is_bot = 0
+            AND NOT EXISTS (
+                SELECT 1 FROM blocked_users WHERE blocked_users.chat_id = users.chat_id
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM broadcast_deliveries
+                WHERE broadcast_deliveries.broadcast_id = ?
+                    AND broadcast_deliveries.chat_id = users.chat_id
+            )
+        ORDER BY users.chat_id
+        LIMIT ?
+        """,
+        (after_chat_id if after_chat_id is not None else -(2 ** 63), broadcast_id, limit),
+    )
+    return [row[0] for row in rows]
+
+
+@timed(DB_SECONDS)
+async def load_broadcast_retries(
+    broadcast_id: int, after_chat_id: int | None, limit: int
+) -> list[int]:
+    """Next page of chats whose delivery is to be repeated, in chat ID order."""
+    rows = await get_connection().execute_fetchall(
+        """
+        SELECT chat_id FROM broadcast_deliveries
+        WHERE broadcast_id = ?
+            AND status = ?
+            AND chat_id > ?
+            AND NOT EXISTS (
+                SELECT 1 FROM blocked_users
+                WHERE blocked_users.chat_id = broadcast_deliveries.chat_id
+            )
+        ORDER BY chat_id
+        LIMIT ?
+        """,
+        (
+            broadcast_id,
+            DELIVERY_RETRY,
+            after_chat_id if after_chat_id is not None else -(2 ** 63),
+            limit,
+        ),
+    )
+    return [row[0] for row in rows]
+
+
+@timed(DB_SECONDS)
+async def save_broadcast_delivery(
+    broadcast_id: int, chat_id: int, status: str, error: str | None = None
+):
+    now = datetime.now(timezone.utc).isoformat()
+    async with transaction() as db:
+        await db.execute(
+            """
+            INSERT INTO broadcast_deliveries (broadcast_id, chat_id, status, error, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(broadcast_id, chat_id) DO UPDATE SET
+                status = excluded.status,
+                error = excluded.error,
+                updated_at = excluded.updated_at
+            """,
+            (broadcast_id, chat_id, status, error, now),
+        )
+        if status == DELIVERY_BLOCKED:
+            await db.execute(
+                """
+                INSERT INTO blocked_users (chat_id, blocked_at) VALUES (?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET blocked_at = excluded.blocked_at
+                """,
+                (chat_id, now),
+            )
+
+
+@timed(DB_SECONDS)
+async def set_broadcast_cursor(broadcast_id: int, chat_id: int):
+    async with transaction() as db:
+        await db.execute(
+            "UPDATE broadcasts SET cursor = ? WHERE id = ?", (chat_id, broadcast_id)
+        )
+
+
+@timed(DB_SECONDS)
+async def finish_broadcast(broadcast_id: int):
+    async with transaction() as db:
+        await db.execute(
+            "UPDATE broadcasts SET status = 'done', finished_at = ? WHERE id = ?",
+            (datetime.now(timezone.utc).isoformat(), broadcast_id),
+        )
+
+
+@timed(DB_SECONDS)
+async def count_broadcast_deliveries(broadcast_id: int) -> dict[str, int]:
+    rows = await get_connection().execute_fetchall(
+        """
+        SELECT status, COUNT(*) FROM broadcast_deliveries
+        WHERE broadcast_id = ?
+        GROUP BY status
+        """,
+        (broadcast_id,),
+    )
+    return {row[0]: row[1] for row in rows}
+
+
+@timed(DB_SECONDS)
+async def is_user_blocked(chat_id: int) -> bool:
+    rows = await get_connection().execute_fetchall(
+        "SELECT 1 FROM blocked_users WHERE chat_id = ?",
+        (chat_id,),
+    )
+    return bool(rows)
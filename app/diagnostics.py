@@ -1,17 +1,15 @@
 from __future__ import annotations
 
 import html
-import json
-from collections import Counter
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Iterable, NamedTuple
 
-from app.paths import DATA_DIR
+from app.diagnostics_snapshot import current_sources, load_sources
 
-FACTORS_PATH = DATA_DIR / "diagnostic_factors.json"
-RULES_PATH = DATA_DIR / "diagnostic_rules.json"
-SNAPSHOT_PATH = DATA_DIR / "diagnostics_snapshot.json"
+# Enough for every terminal path of the current question tree (3 696).
+RECOMMENDATION_CACHE_SIZE = 4096
 
 
 @dataclass(frozen=True)
@@ -25,24 +23,15 @@ class DiagnosticResult:
     addons: list[dict[str, Any]]
 
 
-def _load_json(path: Path) -> dict[str, Any]:
-    try:
-        with path.open(encoding="utf-8") as file:
-            value = json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError, OSError):
-        return {}
-    return value if isinstance(value, dict) else {}
-
-
 def load_diagnostic_sources() -> tuple[dict[str, Any], dict[str, Any], dict[str, Any]]:
     """Read the last published diagnostic snapshot.
 
-    Sources are deliberately loaded per calculation. A successfully published content
-    update therefore becomes available without restarting the bot.
+    Sources are checked for changes on every calculation and re-read only when a
+    file was replaced. A successfully published content update therefore becomes
+    available without restarting the bot. Returned values are shared and read-only.
     """
-    snapshot = _load_json(SNAPSHOT_PATH)
-    content = snapshot.get("content", {})
-    return (_load_json(FACTORS_PATH), _load_json(RULES_PATH), content)
+    sources = load_sources()
+    return (sources.factors, sources.rules, sources.content)
 
 
 def _as_list(value: Any) -> list[Any]:
@@ -51,48 +40,97 @@ def _as_list(value: Any) -> list[Any]:
     return value if isinstance(value, list) else [value]
 
 
-def _rule_matches(
-    rule: dict[str, Any],
-    answers: list[str],
-    labels: dict[str, str],
-    scores: dict[str, int],
-    tags: set[str],
-) -> bool:
-    conditions = rule.get("conditions", {})
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+@dataclass(frozen=True, slots=True)
+class _CompiledRule:
+    """A rule with its conditions frozen into tuples and sets at compile time."""
+
+    module: dict[str, Any]
+    role: str
+    min_scores: tuple[tuple[str, Any], ...]
+    max_scores: tuple[tuple[str, Any], ...]
+    label_equals: tuple[tuple[str, Any], ...]
+    label_in: tuple[tuple[str, frozenset[Any]], ...]
+    any_tags: frozenset[str] | None
+    all_tags: frozenset[str] | None
+    answers_any: frozenset[str] | None
+    answers_all: frozenset[str] | None
+    answers_none: frozenset[str] | None
+
+    def matches(
+        self,
+        answers: frozenset[str],
+        labels: dict[str, str],
+        scores: dict[str, int],
+        tags: set[str],
+    ) -> bool:
+        for key, value in self.min_scores:
+            if scores.get(key, 0) < value:
+                return False
+
+        for key, value in self.max_scores:
+            if scores.get(key, 0) > value:
+                return False
+
+        for key, value in self.label_equals:
+            if labels.get(key) != value:
+                return False
+
+        for key, values in self.label_in:
+            if labels.get(key) not in values:
+                return False
+
+        if self.any_tags is not None and self.any_tags.isdisjoint(tags):
+            return False
 
-    for key, value in conditions.get("min_scores", {}).items():
-        if scores.get(key, 0) < value:
+        if self.all_tags is not None and not self.all_tags <= tags:
             return False
 
-    for key, value in conditions.get("max_scores", {}).items():
-        if scores.get(key, 0) > value:
+        if self.answers_any is not None and self.answers_any.isdisjoint(answers):
             return False
 
-    for key, value in conditions.get("label_equals", {}).items():
-        if labels.get(key) != value:
+        if self.answers_all is not None and not self.answers_all <= answers:
             return False
 
-    for key, values in conditions.get("label_in", {}).items():
-        if labels.get(key) not in set(_as_list(values)):
+        if self.answers_none is not None and not self.answers_none.isdisjoint(answers):
             return False
 
-    if conditions.get("any_tags") and not tags.intersection(conditions["any_tags"]):
-        return False
+        return True
 
-    if conditions.get("all_tags") and not set(conditions["all_tags"]).issubset(tags):
-        return False
 
-    answer_set = set(answers)
-    if conditions.get("answers_any") and not answer_set.intersection(conditions["answers_any"]):
-        return False
+def _frozen_items(value: Any) -> tuple[tuple[str, Any], ...]:
+    return tuple(value.items()) if isinstance(value, dict) else ()
 
-    if conditions.get("answers_all") and not set(conditions["answers_all"]).issubset(answer_set):
-        return False
 
-    if conditions.get("answers_none") and answer_set.intersection(conditions["answers_none"]):
-        return False
+def _frozen_set(value: Any) -> frozenset[Any] | None:
+    # An empty or missing condition does not restrict the rule.
+    return frozenset(value) if value else None
 
-    return True
+
+def _compile_rule(rule: dict[str, Any], module: dict[str, Any]) -> _CompiledRule:
+    conditions = rule.get("conditions", {})
+    return _CompiledRule(
+        module=module,
+        role=rule.get("role"),
+        min_scores=_frozen_items(conditions.get("min_scores", {})),
+        max_scores=_frozen_items(conditions.get("max_scores", {})),
+        label_equals=_frozen_items(conditions.get("label_equals", {})),
+        label_in=tuple(
+            (key, frozenset(_as_list(values)))
+            for key, values in conditions.get("label_in", {}).items()
+        ),
+        any_tags=_frozen_set(conditions.get("any_tags")),
+        all_tags=_frozen_set(conditions.get("all_tags")),
+        answers_any=_frozen_set(conditions.get("answers_any")),
+        answers_all=_frozen_set(conditions.get("answers_all")),
+        answers_none=_frozen_set(conditions.get("answers_none")),
+    )
 
 
 def _active_modules(content: dict[str, Any]) -> dict[str, dict[str, Any]]:
@@ -108,70 +146,268 @@ def _active_modules(content: dict[str, Any]) -> dict[str, dict[str, Any]]:
     }
 
 
+_Factor = tuple[tuple[tuple[str, str], ...], tuple[tuple[str, int], ...], tuple[str, ...]]
+
+
+@dataclass(frozen=True, slots=True)
+class PathState:
+    """Labels, scores and tags accumulated along a prefix of answers."""
+
+    answers: tuple[str, ...]
+    answer_set: frozenset[str]
+    labels: dict[str, str]
+    scores: dict[str, int]
+    tags: frozenset[str]
+
+
+EMPTY_PATH_STATE = PathState((), frozenset(), {}, {}, frozenset())
+
+
+class CompiledDiagnostics:
+    """Diagnostic sources prepared once for repeated evaluation.
+
+    Rules are pre-sorted by priority and bound to their active modules, and every
+    condition is frozen, so evaluating a path allocates only the result itself.
+    Rendered recommendations are memoized per instance; a new snapshot produces a
+    new instance, which drops the memo together with the old sources.
+    """
+
+    def __init__(
+        self,
+        factors: dict[str, Any],
+        rules_config: dict[str, Any],
+        content: dict[str, Any],
+    ):
+        self.factors = factors
+        self.rules_config = rules_config
+        self.content = content
+
+        self._factors: dict[str, _Factor] = {}
+        for answer_id, factor in factors.get("answers", {}).items():
+            if not isinstance(factor, dict):
+                continue
+            self._factors[answer_id] = (
+                tuple(factor.get("labels", {}).items()),
+                tuple(factor.get("scores", {}).items()),
+                tuple(factor.get("tags", [])),
+            )
+
+        modules = _active_modules(content)
+        rules = sorted(
+            rules_config.get("rules", []),
+            key=lambda item: item.get("priority", 0),
+            reverse=True,
+        )
+        self._rules = tuple(
+            _compile_rule(rule, modules[rule.get("module_id")])
+            for rule in rules
+            if isinstance(rule, dict)
+            and rule.get("module_id") in modules
+            and rule.get("role") in ("primary", "alert", "addon")
+        )
+        self._fallback_primary = modules.get(rules_config.get("fallback_primary_id"), {})
+        self._max_addons = content.get("settings", {}).get("max_addons", 2)
+        # LRU of rendered texts by answer path. Unlike functools.lru_cache it can
+        # be looked up without rendering, and recommend() may run in threads.
+        self._rendered: OrderedDict[tuple[str, ...], str] = OrderedDict()
+        self._rendered_lock = threading.Lock()
+        self._hits = self._misses = 0
+
+    def analyze(self, answers: list[str]) -> DiagnosticResult:
+        labels: dict[str, str] = {}
+        scores: dict[str, int] = {}
+        tags: set[str] = set()
+
+        # Duplicate callbacks must never increase a score twice.
+        unique_answers = list(dict.fromkeys(answers))
+        for answer_id in unique_answers:
+            factor = self._factors.get(answer_id)
+            if factor is None:
+                continue
+            factor_labels, factor_scores, factor_tags = factor
+            labels.update(factor_labels)
+            for key, value in factor_scores:
+                scores[key] = scores.get(key, 0) + value
+            tags.update(factor_tags)
+
+        return self._select(unique_answers, frozenset(unique_answers), labels, scores, tags)
+
+    def extend(self, state: PathState, answer_id: str) -> PathState:
+        """State for ``state`` followed by ``answer_id``.
+
+        Walking a question tree with this shares the work for a common prefix
+        between all paths below it instead of replaying every path from scratch.
+        """
+        if answer_id in state.answer_set:
+            # Duplicate callbacks must never increase a score twice.
+            return state
+        factor = self._factors.get(answer_id)
+        labels = state.labels
+        scores = state.scores
+        tags = state.tags
+        if factor is not None:
+            factor_labels, factor_scores, factor_tags = factor
+            if factor_labels:
+                labels = dict(labels)
+                labels.update(factor_labels)
+            if factor_scores:
+                scores = dict(scores)
+                for key, value in factor_scores:
+                    scores[key] = scores.get(key, 0) + value
+            if factor_tags:
+                tags = tags.union(factor_tags)
+        return PathState(
+            (*state.answers, answer_id),
+            state.answer_set | {answer_id},
+            labels,
+            scores,
+            tags,
+        )
+
+    def finish(self, state: PathState) -> DiagnosticResult:
+        """Result for a path whose answers were accumulated with ``extend``."""
+        return self._select(
+            list(state.answers),
+            state.answer_set,
+            dict(state.labels),
+            dict(state.scores),
+            set(state.tags),
+        )
+
+    def _select(
+        self,
+        unique_answers: list[str],
+        answer_set: frozenset[str],
+        labels: dict[str, str],
+        scores: dict[str, int],
+        tags: set[str],
+    ) -> DiagnosticResult:
+        max_addons = self._max_addons
+        addons_full = isinstance(max_addons, int) and max_addons >= 0
+        primary = None
+        alerts: list[dict[str, Any]] = []
+        addons: list[dict[str, Any]] = []
+        for rule in self._rules:
+            role = rule.role
+            if role == "primary":
+                if primary is None and rule.matches(answer_set, labels, scores, tags):
+                    primary = rule.module
+            elif role == "alert":
+                if rule.matches(answer_set, labels, scores, tags):
+                    alerts.append(rule.module)
+            elif not (addons_full and len(addons) >= max_addons):
+                if rule.matches(answer_set, labels, scores, tags):
+                    addons.append(rule.module)
+
+        return DiagnosticResult(
+            answers=unique_answers,
+            labels=labels,
+            scores=scores,
+            tags=tags,
+            primary=primary if primary is not None else self._fallback_primary,
+            alerts=alerts,
+            addons=addons[:max_addons],
+        )
+
+    @staticmethod
+    def _path_key(answers: list[str]) -> tuple[str, ...]:
+        # Labels of later answers override earlier ones, so the key keeps the
+        # answer order instead of sorting it.
+        return tuple(dict.fromkeys(answers))
+
+    def cached_recommendation(self, answers: list[str]) -> str | None:
+        """The memoized text for ``answers``, or None without rendering it."""
+        key = self._path_key(answers)
+        with self._rendered_lock:
+            text = self._rendered.get(key)
+            if text is not None:
+                self._rendered.move_to_end(key)
+                self._hits += 1
+            return text
+
+    def recommend(self, answers: list[str]) -> str:
+        text = self.cached_recommendation(answers)
+        if text is not None:
+            return text
+        key = self._path_key(answers)
+        text = render_recommendation(self.analyze(list(key)), self.content)
+        with self._rendered_lock:
+            self._misses += 1
+            # Another thread may have rendered the same path meanwhile.
+            text = self._rendered.setdefault(key, text)
+            if len(self._rendered) > RECOMMENDATION_CACHE_SIZE:
+                self._rendered.popitem(last=False)
+        return text
+
+    def recommendation_cache_info(self) -> CacheInfo:
+        with self._rendered_lock:
+            return CacheInfo(
+                self._hits, self._misses, RECOMMENDATION_CACHE_SIZE, len(self._rendered)
+            )
+
+
+def compile_diagnostics(
+    factors: dict[str, Any],
+    rules_config: dict[str, Any],
+    content: dict[str, Any],
+) -> CompiledDiagnostics:
+    return CompiledDiagnostics(factors, rules_config, content)
+
+
+_COMPILED: tuple[int, CompiledDiagnostics] | None = None
+_compiled_lock = threading.Lock()
+# Recommendation cache hits and misses of instances replaced by a newer version.
+_retired_hits = 0
+_retired_misses = 0
+
+
+def load_compiled_diagnostics() -> CompiledDiagnostics:
+    """Compiled form of the published sources, rebuilt once per source version."""
+    global _COMPILED, _retired_hits, _retired_misses
+    sources = load_sources()
+    compiled = _COMPILED
+    if compiled is None or compiled[0] != sources.version:
+        fresh = compile_diagnostics(sources.factors, sources.rules, sources.content)
+        with _compiled_lock:
+            compiled = _COMPILED
+            if compiled is None or compiled[0] != sources.version:
+                if compiled is not None:
+                    retired = compiled[1].recommendation_cache_info()
+                    _retired_hits += retired.hits
+                    _retired_misses += retired.misses
+                compiled = (sources.version, fresh)
+                _COMPILED = compiled
+    return compiled[1]
+
+
+def recommendation_cache_info() -> CacheInfo:
+    """Recommendation cache totals since start, summed over source versions.
+
+    Hits and misses only grow, so they can be exported as counters; ``currsize``
+    is the size of the current version's cache.
+    """
+    with _compiled_lock:
+        compiled = _COMPILED
+        if compiled is None:
+            info = CacheInfo(0, 0, RECOMMENDATION_CACHE_SIZE, 0)
+        else:
+            info = compiled[1].recommendation_cache_info()
+        return info._replace(
+            hits=info.hits + _retired_hits, misses=info.misses + _retired_misses
+        )
+
+
 def analyze_answers_with_sources(
     answers: list[str],
     factors: dict[str, Any],
     rules_config: dict[str, Any],
     content: dict[str, Any],
 ) -> DiagnosticResult:
-    answer_factors = factors.get("answers", {})
-    labels: dict[str, str] = {}
-    scores: Counter[str] = Counter()
-    tags: set[str] = set()
-
-    # Duplicate callbacks must never increase a score twice.
-    unique_answers = list(dict.fromkeys(answers))
-    for answer_id in unique_answers:
-        factor = answer_factors.get(answer_id, {})
-        if not isinstance(factor, dict):
-            continue
-        labels.update(factor.get("labels", {}))
-        scores.update(factor.get("scores", {}))
-        tags.update(factor.get("tags", []))
-
-    modules = _active_modules(content)
-    rules = sorted(
-        rules_config.get("rules", []),
-        key=lambda item: item.get("priority", 0),
-        reverse=True,
-    )
-    matched = [
-        rule
-        for rule in rules
-        if isinstance(rule, dict)
-        and rule.get("module_id") in modules
-        and _rule_matches(rule, unique_answers, labels, dict(scores), tags)
-    ]
-
-    primary_rule = next((rule for rule in matched if rule.get("role") == "primary"), None)
-    primary_id = (
-        primary_rule.get("module_id")
-        if primary_rule
-        else rules_config.get("fallback_primary_id")
-    )
-    primary = modules.get(primary_id, {})
-
-    alerts = [modules[rule["module_id"]] for rule in matched if rule.get("role") == "alert"]
-    max_addons = content.get("settings", {}).get("max_addons", 2)
-    addons = [
-        modules[rule["module_id"]]
-        for rule in matched
-        if rule.get("role") == "addon"
-    ][:max_addons]
-
-    return DiagnosticResult(
-        answers=unique_answers,
-        labels=labels,
-        scores=dict(scores),
-        tags=tags,
-        primary=primary,
-        alerts=alerts,
-        addons=addons,
-    )
+    return compile_diagnostics(factors, rules_config, content).analyze(answers)
 
 
 def analyze_answers(answers: list[str]) -> DiagnosticResult:
-    return analyze_answers_with_sources(answers, *load_diagnostic_sources())
+    return load_compiled_diagnostics().analyze(answers)
 
 
 def _escape(value: Any) -> str:
@@ -227,13 +463,7 @@ def _module_items(modules: Iterable[dict[str, Any]], field: str) -> list[str]:
     ]
 
 
-def build_recommendation_with_sources(
-    answers: list[str],
-    factors: dict[str, Any],
-    rules_config: dict[str, Any],
-    content: dict[str, Any],
-) -> str:
-    result = analyze_answers_with_sources(answers, factors, rules_config, content)
+def render_recommendation(result: DiagnosticResult, content: dict[str, Any]) -> str:
     primary = result.primary
     settings = content.get("settings", {})
 
@@ -311,5 +541,27 @@ def build_recommendation_with_sources(
     return "\n\n".join(part for part in parts if part)
 
 
+def build_recommendation_with_sources(
+    answers: list[str],
+    factors: dict[str, Any],
+    rules_config: dict[str, Any],
+    content: dict[str, Any],
+) -> str:
+    return compile_diagnostics(factors, rules_config, content).recommend(answers)
+
+
 def build_recommendation(answers: list[str]) -> str:
-    return build_recommendation_with_sources(answers, *load_diagnostic_sources())
+    return load_compiled_diagnostics().recommend(answers)
+
+
+def cached_recommendation(answers: list[str]) -> str | None:
+    """The memoized recommendation, if the published sources did not change.
+
+    Costs the ``stat()`` calls of the source check and a dict lookup; files are
+    never read and nothing is compiled or rendered.
+    """
+    sources = current_sources()
+    compiled = _COMPILED
+    if sources is None or compiled is None or compiled[0] != sources.version:
+        return None
+    return compiled[1].cached_recommendation(answers)
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import marshal
+import os
+import struct
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from app.file_cache import FileStamp, file_stamp, read_json_object
+from app.paths import DATA_DIR
+
+FACTORS_PATH = DATA_DIR / "diagnostic_factors.json"
+RULES_PATH = DATA_DIR / "diagnostic_rules.json"
+SNAPSHOT_PATH = DATA_DIR / "diagnostics_snapshot.json"
+ARTIFACT_PATH = DATA_DIR / "diagnostics_compiled.bin"
+SOURCE_PATHS = (SNAPSHOT_PATH, FACTORS_PATH, RULES_PATH)
+
+ARTIFACT_MAGIC = b"TTBDIAG\x00"
+ARTIFACT_FORMAT = 2
+# magic, artifact format, marshal format, SHA-256 of the payload
+_HEADER = struct.Struct(">8sHH32s")
+
+
+class ArtifactError(ValueError):
+    """The compiled artifact is damaged or was written in another format."""
+
+
+def source_digests(paths: tuple[Path, ...] = SOURCE_PATHS) -> dict[str, str]:
+    """SHA-256 of every JSON source; an absent file has an empty digest."""
+    digests: dict[str, str] = {}
+    for path in paths:
+        try:
+            digests[path.name] = hashlib.sha256(path.read_bytes()).hexdigest()
+        except OSError:
+            digests[path.name] = ""
+    return digests
+
+
+def source_stamps(paths: tuple[Path, ...] = SOURCE_PATHS) -> dict[str, FileStamp]:
+    """``file_stamp()`` of every JSON source, keyed by file name."""
+    return {path.name: file_stamp(path) for path in paths}
+
+
+def dump_artifact(payload: dict[str, Any]) -> bytes:
+    body = marshal.dumps(payload)
+    header = _HEADER.pack(
+        ARTIFACT_MAGIC, ARTIFACT_FORMAT, marshal.version, hashlib.sha256(body).digest()
+    )
+    return header + body
+
+
+def load_artifact(data: bytes) -> dict[str, Any]:
+    if len(data) < _HEADER.size:
+        raise ArtifactError("file is shorter than the header")
+    magic, artifact_format, marshal_version, checksum = _HEADER.unpack_from(data)
+    if magic != ARTIFACT_MAGIC:
+        raise ArtifactError("not a compiled diagnostics snapshot")
+    if artifact_format != ARTIFACT_FORMAT or marshal_version != marshal.version:
+        raise ArtifactError(
+            f"format {artifact_format}/{marshal_version}, "
+            f"expected {ARTIFACT_FORMAT}/{marshal.version}"
+        )
+    body = memoryview(data)[_HEADER.size:]
+    if hashlib.sha256(body).digest() != checksum:
+        raise ArtifactError("checksum mismatch")
+    try:
+        payload = marshal.loads(body)
+    except (EOFError, ValueError, TypeError) as error:
+        raise ArtifactError(f"unreadable payload: {error}") from error
+    if not isinstance(payload, dict):
+        raise ArtifactError("payload is not a dict")
+    return payload
+
+
+def write_artifact(
+    path: Path = ARTIFACT_PATH,
+    source_paths: tuple[Path, ...] = SOURCE_PATHS,
+) -> None:
+    """Atomically compile the JSON sources now on disk into one artifact.
+
+    Must run after the JSON files are published. The data is read back from those
+    files, so the bot gets exactly what the JSON fallback would give. Their stat
+    stamps are stored for the bot to detect an artifact that no longer matches
+    them, and their digests for ``check_artifact()``.
+    """
+    # Stamped before reading: a file replaced meanwhile makes the artifact stale.
+    stamps = source_stamps(source_paths)
+    sources = read_json_sources(source_paths)
+    data = dump_artifact(
+        {
+            "stamps": stamps,
+            "sources": source_digests(source_paths),
+            "questions": sources.questions,
+            "factors": sources.factors,
+            "rules": sources.rules,
+            "content": sources.content,
+        }
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False, suffix=".tmp") as file:
+        file.write(data)
+        temp_path = Path(file.name)
+    os.replace(temp_path, path)
+    os.chmod(path, 0o644)
+
+
+def check_artifact(
+    path: Path = ARTIFACT_PATH, source_paths: tuple[Path, ...] = SOURCE_PATHS
+) -> str | None:
+    """Why the artifact cannot be used, or None if it is valid.
+
+    Unlike loading, also hashes the JSON sources, so an artifact whose stamps
+    still match but whose data differs from them is reported too.
+    """
+    try:
+        payload = load_artifact(path.read_bytes())
+    except FileNotFoundError:
+        return f"{path.name} not found"
+    except (OSError, ArtifactError) as error:
+        return f"{path.name}: {error}"
+    if payload.get("stamps") != source_stamps(source_paths):
+        return f"{path.name} is older than the JSON sources"
+    if payload.get("sources") != source_digests(source_paths):
+        return f"{path.name} does not match the contents of the JSON sources"
+    return None
+
+
+@dataclass(frozen=True)
+class DiagnosticSources:
+    """One consistent version of the published diagnostics data.
+
+    ``version`` changes every time new sources are picked up; the structures are
+    shared between callers and must not be mutated.
+    """
+
+    version: int
+    questions: dict[str, Any]
+    factors: dict[str, Any]
+    rules: dict[str, Any]
+    content: dict[str, Any]
+    # "artifact" or "json"
+    origin: str
+
+
+def _read_artifact(path: Path, source_paths: tuple[Path, ...]) -> dict[str, Any] | None:
+    try:
+        payload = load_artifact(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except (OSError, ArtifactError) as error:
+        logging.warning("Ignoring %s: %s", path.name, error)
+        return None
+    if payload.get("stamps") != source_stamps(source_paths):
+        # JSON edited, copied or published without the artifact.
+        logging.info("%s does not match the JSON sources, using JSON", path.name)
+        return None
+    return payload
+
+
+def read_sources(
+    version: int = 0,
+    artifact_path: Path = ARTIFACT_PATH,
+    source_paths: tuple[Path, ...] = SOURCE_PATHS,
+) -> DiagnosticSources:
+    """Read the artifact if it is valid, else the JSON sources.
+
+    ``source_paths`` are the snapshot, factors and rules files, in this order.
+    """
+    payload = _read_artifact(artifact_path, source_paths)
+    if payload is None:
+        return read_json_sources(source_paths, version)
+    return DiagnosticSources(
+        version=version,
+        questions=payload.get("questions", {}),
+        factors=payload.get("factors", {}),
+        rules=payload.get("rules", {}),
+        content=payload.get("content", {}),
+        origin="artifact",
+    )
+
+
+def read_json_sources(
+    source_paths: tuple[Path, ...] = SOURCE_PATHS, version: int = 0
+) -> DiagnosticSources:
+    snapshot_path, factors_path, rules_path = source_paths
+    snapshot = read_json_object(snapshot_path)
+    return DiagnosticSources(
+        version=version,
+        questions=snapshot.get("questions", {}),
+        factors=read_json_object(factors_path),
+        rules=read_json_object(rules_path),
+        content=snapshot.get("content", {}),
+        origin="json",
+    )
+
+
+_lock = threading.Lock()
+_current: tuple[tuple[FileStamp, ...], DiagnosticSources] | None = None
+
+
+def _stamps() -> tuple[FileStamp, ...]:
+    return tuple(file_stamp(path) for path in (ARTIFACT_PATH, *SOURCE_PATHS))
+
+
+def current_sources() -> DiagnosticSources | None:
+    """The loaded data if no file changed since, else None; only ``stat()``s files."""
+    current = _current
+    if current is not None and current[0] == _stamps():
+        return current[1]
+    return None
+
+
+async def refresh_sources() -> DiagnosticSources:
+    """``load_sources()`` for coroutines: a reload runs in a worker thread.
+
+    Right after a publication the artifact or the JSON files have to be read
+    (and without a valid artifact, parsed); that happens off the event loop.
+    Otherwise the data is returned right away.
+    """
+    current = current_sources()
+    if current is not None:
+        return current
+    return await asyncio.to_thread(load_sources)
+
+
+def load_sources() -> DiagnosticSources:
+    """Current diagnostics data, from the compiled artifact when it is valid.
+
+    Between publications a call costs four ``stat()`` calls. When any file
+    changes, the artifact is used if its header and checksum check out and the
+    JSON sources' stat stamps equal the ones it recorded; otherwise the JSON
+    sources are parsed. Source contents are not hashed here, see
+    ``check_artifact()``.
+    """
+    global _current
+    stamps = _stamps()
+    current = _current
+    if current is not None and current[0] == stamps:
+        return current[1]
+    with _lock:
+        current = _current
+        if current is None or current[0] != stamps:
+            version = current[1].version + 1 if current is not None else 1
+            current = (stamps, read_sources(version))
+            _current = current
+    return current[1]
@@ -1,12 +1,26 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass, field
-from typing import Any
+from typing import Any, Callable, Iterable, Iterator, TypeVar
 
-from app.diagnostics import analyze_answers_with_sources, build_recommendation_with_sources
+from app.diagnostics import (
+    EMPTY_PATH_STATE,
+    CompiledDiagnostics,
+    DiagnosticResult,
+    PathState,
+    compile_diagnostics,
+    render_recommendation,
+)
 
 TELEGRAM_TEXT_LIMIT = 4096
 VALID_ROLES = {"primary", "alert", "addon"}
+# Path errors beyond this count are summarized in one line instead of listed.
+MAX_REPORTED_PATH_ERRORS = 20
+# Each worker gets several subtrees so uneven branches still balance out.
+CHUNKS_PER_JOB = 4
+
+T = TypeVar("T")
 
 
 @dataclass
@@ -21,32 +35,220 @@ class ValidationReport:
         return not self.errors
 
 
+def _question_options(
+    questions: dict[str, Any], question_id: str, trail: list[str]
+) -> list[dict[str, Any]]:
+    if question_id in trail:
+        raise ValueError(f"Обнаружен цикл вопросов: {' -> '.join([*trail, question_id])}")
+    question = questions.get(question_id)
+    if not isinstance(question, dict):
+        raise ValueError(f"Не найден вопрос {question_id}")
+    options = question.get("options", [])
+    if not options:
+        raise ValueError(f"У вопроса {question_id} нет ответов")
+    return options
+
+
+def _walk(
+    questions: dict[str, Any],
+    question_id: str,
+    path: list[str],
+    trail: list[str],
+    state: T,
+    step: Callable[[T, str], T],
+) -> Iterator[tuple[list[str], T]]:
+    # Iterative depth-first walk over shared ``path``/``trail`` stacks: memory is
+    # bounded by the tree depth rather than by the number of paths.
+    trail.append(question_id)
+    frames = [(iter(_question_options(questions, question_id, trail[:-1])), state)]
+    while frames:
+        options, state = frames[-1]
+        option = next(options, None)
+        if option is None:
+            frames.pop()
+            trail.pop()
+            if frames:
+                path.pop()
+            continue
+        answer_id = option.get("id")
+        next_question = option.get("next")
+        next_state = step(state, answer_id)
+        path.append(answer_id)
+        if next_question == "advice":
+            yield list(path), next_state
+            path.pop()
+        else:
+            frames.append((iter(_question_options(questions, next_question, trail)), next_state))
+            trail.append(next_question)
+
+
+def _no_state(state: None, answer_id: str) -> None:
+    return None
+
+
+def iter_paths(config: dict[str, Any]) -> Iterator[list[str]]:
+    """Yield every terminal answer path in a deterministic depth-first order."""
+    start = config.get("start")
+    if start:
+        for path, _ in _walk(config.get("questions", {}), start, [], [], None, _no_state):
+            yield path
+
+
 def enumerate_paths(config: dict[str, Any]) -> list[list[str]]:
+    return list(iter_paths(config))
+
+
+def iter_analyzed_paths(
+    config: dict[str, Any],
+    compiled: CompiledDiagnostics,
+) -> Iterator[tuple[list[str], DiagnosticResult]]:
+    """Yield every terminal path with its analysis.
+
+    Labels, scores and tags are accumulated down the tree, so a shared prefix is
+    evaluated once for all paths below it.
+    """
+    for path, state in _iter_subtree(config, compiled, _Shard([], [], config.get("start"))):
+        yield path, compiled.finish(state)
+
+
+@dataclass(frozen=True)
+class _Shard:
+    """A subtree: answers leading to ``question_id``, or a finished path if None."""
+
+    answers: list[str]
+    trail: list[str]
+    question_id: str | None
+
+
+def _iter_subtree(
+    config: dict[str, Any],
+    compiled: CompiledDiagnostics,
+    shard: _Shard,
+) -> Iterator[tuple[list[str], PathState]]:
+    state = EMPTY_PATH_STATE
+    for answer_id in shard.answers:
+        state = compiled.extend(state, answer_id)
+    if shard.question_id is None:
+        yield list(shard.answers), state
+    elif shard.question_id:
+        yield from _walk(
+            config.get("questions", {}),
+            shard.question_id,
+            list(shard.answers),
+            list(shard.trail),
+            state,
+            compiled.extend,
+        )
+
+
+def _split_tree(config: dict[str, Any], min_shards: int) -> list[_Shard]:
+    """Split the tree into at least ``min_shards`` subtrees, keeping path order."""
     questions = config.get("questions", {})
-    start = config.get("start")
-    paths: list[list[str]] = []
-
-    def walk(question_id: str, answers: list[str], visited: set[str]) -> None:
-        if question_id in visited:
-            raise ValueError(f"Обнаружен цикл вопросов: {' -> '.join([*visited, question_id])}")
-        question = questions.get(question_id)
-        if not isinstance(question, dict):
-            raise ValueError(f"Не найден вопрос {question_id}")
-        options = question.get("options", [])
-        if not options:
-            raise ValueError(f"У вопроса {question_id} нет ответов")
-        for option in options:
-            answer_id = option.get("id")
-            next_question = option.get("next")
-            path = [*answers, answer_id]
-            if next_question == "advice":
-                paths.append(path)
-            else:
-                walk(next_question, path, visited | {question_id})
+    shards = [_Shard([], [], config.get("start"))]
+    while len(shards) < min_shards:
+        expanded: list[_Shard] = []
+        for shard in shards:
+            if not shard.question_id:
+                expanded.append(shard)
+                continue
+            options = _question_options(questions, shard.question_id, shard.trail)
+            trail = [*shard.trail, shard.question_id]
+            for option in options:
+                next_question = option.get("next")
+                expanded.append(
+                    _Shard(
+                        [*shard.answers, option.get("id")],
+                        trail,
+                        None if next_question == "advice" else next_question,
+                    )
+                )
+        if len(expanded) == len(shards):
+            break
+        shards = expanded
+    return shards
 
-    if start:
-        walk(start, [], set())
-    return paths
+
+PathErrors = list[tuple[int, str]]
+
+
+def _check_results(
+    compiled: CompiledDiagnostics,
+    results: Iterable[tuple[list[str], DiagnosticResult]],
+) -> tuple[PathErrors, int, int]:
+    errors: PathErrors = []
+    longest_result = 0
+    count = 0
+    for index, (path, result) in enumerate(results):
+        count += 1
+        if not result.primary:
+            errors.append((index, f"Путь {'|'.join(path)} не получил основную рекомендацию."))
+            continue
+        text = render_recommendation(result, compiled.content)
+        longest_result = max(longest_result, len(text))
+        if len(text) > TELEGRAM_TEXT_LIMIT:
+            errors.append(
+                (
+                    index,
+                    f"Результат пути {'|'.join(path)} длиннее лимита Telegram: "
+                    f"{len(text)} символов.",
+                )
+            )
+    return errors, count, longest_result
+
+
+_worker_sources: tuple[dict[str, Any], CompiledDiagnostics] | None = None
+
+
+def _init_worker(
+    questions_config: dict[str, Any],
+    factors: dict[str, Any],
+    rules_config: dict[str, Any],
+    content: dict[str, Any],
+):
+    global _worker_sources
+    _worker_sources = (questions_config, compile_diagnostics(factors, rules_config, content))
+
+
+def _check_shard(shard: _Shard) -> tuple[PathErrors, int, int]:
+    config, compiled = _worker_sources
+    results = (
+        (path, compiled.finish(state))
+        for path, state in _iter_subtree(config, compiled, shard)
+    )
+    return _check_results(compiled, results)
+
+
+def _check_tree_parallel(
+    questions_config: dict[str, Any],
+    factors: dict[str, Any],
+    rules_config: dict[str, Any],
+    content: dict[str, Any],
+    jobs: int,
+) -> tuple[PathErrors, int, int]:
+    # multiprocessing is only loaded when --jobs asks for it.
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = _split_tree(questions_config, jobs * CHUNKS_PER_JOB)
+    errors: PathErrors = []
+    longest_result = 0
+    count = 0
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(questions_config, factors, rules_config, content),
+    ) as executor:
+        # Shards are in depth-first order, so offsetting local indexes by the
+        # paths of earlier shards reproduces the serial numbering.
+        for shard_errors, shard_count, shard_longest in executor.map(_check_shard, shards):
+            errors.extend((count + index, message) for index, message in shard_errors)
+            count += shard_count
+            longest_result = max(longest_result, shard_longest)
+    return errors, count, longest_result
+
+
+def resolve_jobs(jobs: int) -> int:
+    """``0`` or a negative value means one worker per CPU."""
+    return jobs if jobs > 0 else os.cpu_count() or 1
 
 
 def validate_sources(
@@ -54,7 +256,14 @@ def validate_sources(
     factors: dict[str, Any],
     rules_config: dict[str, Any],
     content: dict[str, Any],
+    jobs: int = 1,
 ) -> ValidationReport:
+    """Check sources and every terminal path of the question tree.
+
+    Paths are streamed from the tree rather than materialized. With ``jobs > 1``
+    subtrees are sharded across worker processes. Failures of all paths are
+    collected and reported in path order regardless of ``jobs``.
+    """
     report = ValidationReport()
     questions = questions_config.get("questions", {})
     start = questions_config.get("start")
@@ -157,26 +366,29 @@ def validate_sources(
     if report.errors:
         return report
 
+    jobs = resolve_jobs(jobs)
     try:
-        paths = enumerate_paths(questions_config)
+        if jobs > 1:
+            path_errors, report.terminal_paths, report.longest_result = _check_tree_parallel(
+                questions_config, factors, rules_config, content, jobs
+            )
+        else:
+            compiled = compile_diagnostics(factors, rules_config, content)
+            path_errors, report.terminal_paths, report.longest_result = _check_results(
+                compiled, iter_analyzed_paths(questions_config, compiled)
+            )
     except (TypeError, ValueError) as error:
         report.errors.append(str(error))
         return report
 
-    report.terminal_paths = len(paths)
-    for path in paths:
-        result = analyze_answers_with_sources(path, factors, rules_config, content)
-        if not result.primary:
-            report.errors.append(f"Путь {'|'.join(path)} не получил основную рекомендацию.")
-            break
-        text = build_recommendation_with_sources(path, factors, rules_config, content)
-        report.longest_result = max(report.longest_result, len(text))
-        if len(text) > TELEGRAM_TEXT_LIMIT:
-            report.errors.append(
-                f"Результат пути {'|'.join(path)} длиннее лимита Telegram: {len(text)} символов."
-            )
-            break
+    path_errors.sort(key=lambda item: item[0])
+    report.errors.extend(message for _, message in path_errors[:MAX_REPORTED_PATH_ERRORS])
+    if len(path_errors) > MAX_REPORTED_PATH_ERRORS:
+        report.errors.append(
+            f"…и еще {len(path_errors) - MAX_REPORTED_PATH_ERRORS} путей с ошибками "
+            f"(всего {len(path_errors)})."
+        )
 
-    if not paths:
+    if not report.terminal_paths:
         report.errors.append("В дереве вопросов нет ни одного завершающего пути.")
     return report
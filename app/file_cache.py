@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+# (st_mtime_ns, st_size, st_ino) or None when the file does not exist.
+FileStamp = tuple[int, int, int] | None
+
+
+def file_stamp(path: Path) -> FileStamp:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class CachedFile(Generic[T]):
+    """Parsed file contents that are re-read only when the file changes on disk.
+
+    Publishing replaces files atomically via ``os.replace``, which always changes
+    the inode, so comparing the stat stamp is enough to notice a new version
+    without restarting the bot. Between changes a lookup costs one ``stat()``;
+    with ``check_interval`` the file is stat-ed at most that often.
+
+    If a reload fails (e.g. a file caught mid-edit), the previous value is kept
+    until the file changes again. A failure on the first load is raised.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        loader: Callable[[Path], T],
+        check_interval: float = 0.0,
+    ):
+        self.path = path
+        self.check_interval = check_interval
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._stamp: FileStamp = None
+        self._value: T | None = None
+        self._loaded = False
+        self._checked_at = float("-inf")
+        self.version = 0
+
+    def get(self) -> T:
+        if self._loaded and self.check_interval:
+            now = time.monotonic()
+            if now - self._checked_at < self.check_interval:
+                return self._value
+            self._checked_at = now
+        stamp = file_stamp(self.path)
+        if self._loaded and stamp == self._stamp:
+            return self._value
+        with self._lock:
+            if not self._loaded or stamp != self._stamp:
+                self._reload(stamp)
+        return self._value
+
+    def _reload(self, stamp: FileStamp):
+        try:
+            value = self._loader(self.path)
+        except Exception:
+            if not self._loaded:
+                raise
+            logging.exception("Failed to reload %s, keeping the previous version", self.path)
+        else:
+            self._value = value
+            self.version += 1
+        self._stamp = stamp
+        self._loaded = True
+        self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded = False
+
+
+def read_json_object(path: Path) -> dict[str, Any]:
+    try:
+        with path.open(encoding="utf-8") as file:
+            value = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError, OSError):
+        return {}
+    return value if isinstance(value, dict) else {}
@@ -0,0 +1,30 @@
+from aiogram.filters import Filter
+from aiogram.types import Message
+
+import app.const as const
+from app.texts import button_key
+
+
+class ButtonFilter(Filter):
+    """Matches reply-keyboard buttons by their current label.
+
+    Labels are resolved through the texts registry on every message, so copy
+    changes in ``data/texts.json`` apply without restarting the bot. The matched
+    key is passed to the handler as ``button``.
+    """
+
+    def __init__(self, *keys: str):
+        self.keys = frozenset(keys)
+
+    async def __call__(self, message: Message) -> bool | dict[str, str]:
+        key = button_key(message.text)
+        if key is None or (self.keys and key not in self.keys):
+            return False
+        return {"button": key}
+
+
+class IsAdminChat(Filter):
+    """Matches messages from ``ADMIN_CHAT_ID``, read on the first check."""
+
+    async def __call__(self, message: Message) -> bool:
+        return message.chat.id == const.ADMIN_CHAT_ID
@@ -1,32 +1,53 @@
+import asyncio
+import html
+import logging
 import re
+from typing import Any, Awaitable, Callable
 
 from aiogram import Router, F, Bot
+from aiogram.dispatcher.event.bases import SkipHandler
 from aiogram.enums import ParseMode
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import (
     Message,
     FSInputFile,
     CallbackQuery,
-    InputMediaPhoto,
 )
 
 import app.const as const
 import app.db as db
-from app.texts import text, file, files, button
+from app.broadcast import format_broadcast_report, run_broadcast
+from app.texts import registry, text, files
 import app.keyboards as keyboards
-from app.paths import DATA_DIR
+import app.media as media
+import app.profiling as profiling
+from app.filters import ButtonFilter, IsAdminChat
+from app.outbound import SendPriority, send_priority
+from app.state import get_store
 
 router = Router()
 
-ADMIN_CHATS: set[int] = set()
+ButtonAction = Callable[[Message], Awaitable[Any]]
+# Ключ кнопки -> действие. Все нажатия reply-кнопок проходят через один
+# обработчик message_button вместо цепочки фильтров по тексту.
+BUTTON_ACTIONS: dict[str, ButtonAction] = {}
+
+
+def button_action(key: str) -> Callable[[ButtonAction], ButtonAction]:
+    def register(action: ButtonAction) -> ButtonAction:
+        BUTTON_ACTIONS[key] = action
+        return action
+
+    return register
 
 
 async def send_client_menu(message: Message, user):
-    ADMIN_CHATS.discard(message.chat.id)
+    await get_store().set_consulting(message.chat.id, False)
     await db.log_user(message.chat.id, user, const.CLIENT)
     name = user.first_name if user else ""
-    await message.answer_photo(
-        file(const.CLIENT),
+    await media.answer_photo(
+        message,
+        const.CLIENT,
         caption=text(const.CLIENT).format(name=name),
         parse_mode=ParseMode.HTML,
         reply_markup=keyboards.client_keyboard()
@@ -34,10 +55,11 @@ async def send_client_menu(message: Message, user):
 
 
 async def send_services_menu(message: Message, user):
-    ADMIN_CHATS.discard(message.chat.id)
+    await get_store().set_consulting(message.chat.id, False)
     await db.log_user(message.chat.id, user, const.SERVICES)
-    await message.answer_photo(
-        file(const.SERVICES),
+    await media.answer_photo(
+        message,
+        const.SERVICES,
         caption=text(const.SERVICES),
         parse_mode=ParseMode.HTML,
         reply_markup=keyboards.services_keyboard()
@@ -45,10 +67,11 @@ async def send_services_menu(message: Message, user):
 
 
 async def send_service(message: Message, user, service: str):
-    ADMIN_CHATS.discard(message.chat.id)
+    await get_store().set_consulting(message.chat.id, False)
     await db.log_user(message.chat.id, user, service)
-    await message.answer_photo(
-        file(service),
+    await media.answer_photo(
+        message,
+        service,
         caption=text(service),
         parse_mode=ParseMode.HTML,
         reply_markup=keyboards.services_menu_keyboard()
@@ -56,7 +79,7 @@ async def send_service(message: Message, user, service: str):
 
 
 async def send_consulting(message: Message, user):
-    ADMIN_CHATS.add(message.chat.id)
+    await get_store().set_consulting(message.chat.id, True)
     await db.log_user(message.chat.id, user, const.CONSULTING)
     await message.answer(
         text(const.CONSULTING),
@@ -66,7 +89,7 @@ async def send_consulting(message: Message, user):
 
 
 async def send_master_menu(message: Message, user):
-    ADMIN_CHATS.discard(message.chat.id)
+    await get_store().set_consulting(message.chat.id, False)
     await db.log_user(message.chat.id, user, const.MASTER)
     await message.answer(
         text(const.MASTER),
@@ -76,7 +99,7 @@ async def send_master_menu(message: Message, user):
 
 
 async def send_price(message: Message, user):
-    ADMIN_CHATS.discard(message.chat.id)
+    await get_store().set_consulting(message.chat.id, False)
     await db.log_user(message.chat.id, user, const.PRICE)
     await message.answer(
         text(const.PRICE),
@@ -86,7 +109,7 @@ async def send_price(message: Message, user):
 
 
 async def send_signing(message: Message, user):
-    ADMIN_CHATS.discard(message.chat.id)
+    await get_store().set_consulting(message.chat.id, False)
     await db.log_user(message.chat.id, user, const.SIGNING)
     await message.answer(
         f"Записаться можно по ссылке:\n{keyboards.SIGNING_URL}",
@@ -96,10 +119,11 @@ async def send_signing(message: Message, user):
 
 @router.message(Command(const.START))
 async def command_start(message: Message):
-    ADMIN_CHATS.discard(message.chat.id)
+    await get_store().set_consulting(message.chat.id, False)
     await db.log_user(message.chat.id, message.from_user, const.START)
-    await message.answer_photo(
-        file(const.START),
+    await media.answer_photo(
+        message,
+        const.START,
         caption=text(const.START),
         parse_mode=ParseMode.HTML,
         reply_markup=keyboards.start_keyboard()
@@ -143,7 +167,7 @@ async def callback_consulting(callback: CallbackQuery):
 
 
 async def get_reviews(message: Message):
-    ADMIN_CHATS.discard(message.chat.id)
+    await get_store().set_consulting(message.chat.id, False)
     intro = text(const.REVIEWS)
     photo_ids = files(const.REVIEWS)
 
@@ -151,12 +175,7 @@ async def get_reviews(message: Message):
         await message.answer(intro, parse_mode=ParseMode.HTML)
         return
 
-    media = [
-        InputMediaPhoto(media=pid)
-        for pid in photo_ids
-    ]
-
-    await message.answer_media_group(media)
+    await media.answer_photo_group(message, const.REVIEWS)
 
     await message.answer(
         intro,
@@ -190,53 +209,61 @@ async def callback_price(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.message(F.text == button(const.CLIENT), ~F.reply_to_message)
+@router.message(ButtonFilter(), ~F.reply_to_message)
+async def message_button(message: Message, button: str):
+    action = BUTTON_ACTIONS.get(button)
+    if action is None:
+        raise SkipHandler()
+    await action(message)
+
+
+@button_action(const.CLIENT)
 async def message_menu_client(message: Message):
     await send_client_menu(message, message.from_user)
 
 
-@router.message(F.text == button(const.MASTER), ~F.reply_to_message)
+@button_action(const.MASTER)
 async def message_menu_master(message: Message):
     await send_master_menu(message, message.from_user)
 
 
-@router.message(F.text == button(const.SERVICES), ~F.reply_to_message)
+@button_action(const.SERVICES)
 async def message_menu_services(message: Message):
     await send_services_menu(message, message.from_user)
 
 
-@router.message(F.text == button(const.KERATIN), ~F.reply_to_message)
+@button_action(const.KERATIN)
 async def message_keratin(message: Message):
     await send_service(message, message.from_user, const.KERATIN)
 
 
-@router.message(F.text == button(const.BOTOX), ~F.reply_to_message)
+@button_action(const.BOTOX)
 async def message_botox(message: Message):
     await send_service(message, message.from_user, const.BOTOX)
 
 
-@router.message(F.text == button(const.NANOPLASTIC), ~F.reply_to_message)
+@button_action(const.NANOPLASTIC)
 async def message_nanoplastic(message: Message):
     await send_service(message, message.from_user, const.NANOPLASTIC)
 
 
-@router.message(F.text == button(const.PRICE), ~F.reply_to_message)
+@button_action(const.PRICE)
 async def message_price(message: Message):
     await send_price(message, message.from_user)
 
 
-@router.message(F.text == button(const.REVIEWS), ~F.reply_to_message)
+@button_action(const.REVIEWS)
 async def message_reviews(message: Message):
     await db.log_user(message.chat.id, message.from_user, const.REVIEWS)
     await get_reviews(message)
 
 
-@router.message(F.text == button(const.SIGNING), ~F.reply_to_message)
+@button_action(const.SIGNING)
 async def message_signing(message: Message):
     await send_signing(message, message.from_user)
 
 
-@router.message(F.text == button(const.CONSULTING), ~F.reply_to_message)
+@button_action(const.CONSULTING)
 async def message_consulting(message: Message):
     await send_consulting(message, message.from_user)
 
@@ -256,36 +283,209 @@ async def message_consulting(message: Message):
 #             await message.answer_document(FSInputFile(pdf_path), caption=caption)
 
 
-@router.message(Command("load"))
+@router.message(Command("load"), IsAdminChat())
 async def cmd_load(message: Message):
-    sent = await message.answer_photo(
-        FSInputFile(DATA_DIR / "IMG_2358.jpg")
-    )
-    if sent.photo:
-        print(sent.photo.pop().file_id)
+    """Upload local media from data/files.json that has no file ID yet."""
 
+    async def upload(path):
+        if path.suffix.lower() in media.PHOTO_SUFFIXES:
+            return await message.answer_photo(FSInputFile(path))
+        return await message.answer_document(FSInputFile(path))
 
-@router.message(F.chat.id == const.ADMIN_CHAT_ID, F.reply_to_message)
-async def admin_reply(message: Message, bot: Bot):
+    uploaded, cached, missing = await media.get_media().upload_missing(
+        media.media_values(registry().files), upload
+    )
+    lines = [f"Загружено: {uploaded}", f"Уже в кеше: {cached}"]
+    if missing:
+        lines.append("Нет файлов: " + ", ".join(missing))
+    await message.answer("\n".join(lines))
+
+
+# Running broadcasts by ID; the references also keep the tasks from being
+# garbage collected.
+_broadcast_tasks: dict[int, asyncio.Task] = {}
+
+
+def start_broadcast(message: Message, bot: Bot, broadcast_id: int):
+    async def run():
+        try:
+            counts = await run_broadcast(bot, broadcast_id)
+        except Exception:
+            logging.exception("Broadcast %s stopped", broadcast_id)
+            await message.answer(
+                f"Рассылка #{broadcast_id} прервана. "
+                f"Продолжить: /broadcast_resume {broadcast_id}"
+            )
+            return
+        await message.answer(format_broadcast_report(broadcast_id, counts))
+
+    task = asyncio.create_task(run())
+    _broadcast_tasks[broadcast_id] = task
+    task.add_done_callback(lambda _: _broadcast_tasks.pop(broadcast_id, None))
+
+
+@router.message(Command("broadcast"), IsAdminChat())
+async def cmd_broadcast(message: Message, bot: Bot, command: CommandObject):
+    """Send the reply-to message (with formatting) or the command text to all users."""
     original = message.reply_to_message
-    if not original or not original.text:
+    if original and original.text:
+        broadcast_text = original.html_text
+    elif command.args:
+        broadcast_text = html.escape(command.args)
+    else:
+        await message.answer(
+            "Напишите текст после /broadcast или ответьте командой на сообщение."
+        )
+        return
+    broadcast_id = await db.create_broadcast(broadcast_text)
+    await message.answer(f"Рассылка #{broadcast_id} запущена.")
+    start_broadcast(message, bot, broadcast_id)
+
+
+@router.message(Command("broadcast_resume"), IsAdminChat())
+async def cmd_broadcast_resume(message: Message, bot: Bot, command: CommandObject):
+    broadcast = None
+    if command.args and command.args.strip().isdigit():
+        broadcast = await db.load_broadcast(int(command.args))
+    if broadcast is None:
+        await message.answer("Укажите номер рассылки: /broadcast_resume <номер>")
+        return
+    if broadcast["id"] in _broadcast_tasks:
+        await message.answer(f"Рассылка #{broadcast['id']} уже идет.")
         return
+    if broadcast["status"] == "done":
+        counts = await db.count_broadcast_deliveries(broadcast["id"])
+        await message.answer(format_broadcast_report(broadcast["id"], counts))
+        return
+    await message.answer(f"Рассылка #{broadcast['id']} продолжена.")
+    start_broadcast(message, bot, broadcast["id"])
+
+
+_profile_tasks: set[asyncio.Task] = set()
 
-    match = re.search(r"ID:\s*(\d+)", original.text)
-    if not match:
+
+@router.message(Command("profile"), IsAdminChat())
+async def cmd_profile(message: Message, command: CommandObject):
+    """Profile the bot for the given number of seconds and send the report."""
+    seconds = profiling.DEFAULT_PROFILE_SECONDS
+    if command.args:
+        try:
+            seconds = float(command.args.strip().replace(",", "."))
+        except ValueError:
+            await message.answer("Укажите длительность в секундах: /profile 30")
+            return
+    if profiling.is_capturing():
+        await message.answer("Профилирование уже идет.")
+        return
+
+    async def run():
+        try:
+            report = await profiling.capture_profile(seconds)
+        except Exception:
+            logging.exception("Profile capture failed")
+            await message.answer("Не удалось снять профиль, подробности в логе.")
+            return
+        await message.answer_document(
+            FSInputFile(report.report_path),
+            caption=f"Профиль за {report.seconds:g} с. Полные данные: {report.stats_path}",
+        )
+
+    # Started before replying, so a second /profile sees the capture running.
+    task = asyncio.create_task(run())
+    _profile_tasks.add(task)
+    task.add_done_callback(_profile_tasks.discard)
+    await message.answer(f"Профилирую {profiling.profile_duration(seconds):g} с…")
+
+
+CONTENT_LABELS = {
+    "photo": "фото",
+    "document": "файл",
+    "video": "видео",
+    "voice": "голосовое",
+}
+
+
+def describe_consultation_message(entry: dict) -> str:
+    author = "Клиент" if entry["direction"] == "in" else "Мастер"
+    body = html.escape(entry["text"] or "")
+    if entry["content_type"] != "text":
+        label = CONTENT_LABELS.get(entry["content_type"], entry["content_type"])
+        body = f"[{label}] {body}".rstrip()
+    return f"<b>{author}:</b> {body}"
+
+
+# "ID: <chat_id>" line of the header the bot forwards to the admin chat.
+CLIENT_ID_PATTERN = re.compile(r"ID:\s*(\d+)")
+
+
+def is_from_bot(message: Message, bot: Bot) -> bool:
+    return message.from_user is not None and message.from_user.id == bot.id
+
+
+async def find_client(original: Message, bot: Bot) -> int | None:
+    """Client chat of a consultation message in the admin chat.
+
+    Forwards are looked up in ``consultation_links``; headers forwarded before
+    the links were recorded only carry the client's ID in their text.
+    """
+    client_chat_id = await db.find_consultation_client(original.message_id)
+    if client_chat_id is None and original.text and is_from_bot(original, bot):
+        match = CLIENT_ID_PATTERN.search(original.text)
+        if match:
+            client_chat_id = int(match.group(1))
+    return client_chat_id
+
+
+@router.message(Command("history"), IsAdminChat())
+async def cmd_history(message: Message, bot: Bot, command: CommandObject):
+    """Consultation thread of the client whose message is replied to, or of the given chat ID."""
+    client_chat_id = None
+    if message.reply_to_message:
+        client_chat_id = await find_client(message.reply_to_message, bot)
+    elif command.args and command.args.strip().lstrip("-").isdigit():
+        client_chat_id = int(command.args)
+    if client_chat_id is None:
+        await message.answer(
+            "Ответьте /history на сообщение клиента или укажите ID: /history <ID>"
+        )
+        return
+    history = await db.load_consultation_history(client_chat_id)
+    if not history:
+        await message.answer("История консультаций пуста.")
         return
+    await message.answer(
+        "\n".join(describe_consultation_message(entry) for entry in history),
+        parse_mode=ParseMode.HTML,
+    )
 
-    client_chat_id = int(match.group(1))
 
-    await bot.send_message(
+@router.message(IsAdminChat(), F.reply_to_message)
+async def admin_reply(message: Message, bot: Bot):
+    original = message.reply_to_message
+    client_chat_id = await find_client(original, bot)
+    if client_chat_id is None:
+        # Replies to other admins are not meant for clients.
+        if is_from_bot(original, bot):
+            await message.answer(
+                "Не удалось определить клиента по этому сообщению, ответ не отправлен."
+            )
+        return
+
+    # copy_message keeps text, photos and documents as they are.
+    sent = await bot.copy_message(client_chat_id, message.chat.id, message.message_id)
+    await db.save_consultation_message(
         client_chat_id,
-        message.text
+        "out",
+        message.content_type.value,
+        message.text or message.caption,
+        [message.message_id],
+        sent.message_id,
     )
 
 
-@router.message(F.text & ~F.text.startswith("/"))
+@router.message((F.text & ~F.text.startswith("/")) | F.photo | F.document)
 async def handle_message(message: Message, bot: Bot):
-    if message.chat.id not in ADMIN_CHATS:
+    if not await get_store().is_consulting(message.chat.id):
         return
 
     user = message.from_user
@@ -294,14 +494,32 @@ async def handle_message(message: Message, bot: Bot):
     admin_text = (
         "📩 <b>Новое сообщение для консультации</b>\n\n"
         f"<b>От:</b> {user.first_name or ''} {user.last_name or ''} ({username})\n"
-        f"<b>ID:</b> {message.chat.id}\n\n"
-        f"{message.text}"
+        f"<b>ID:</b> {message.chat.id}"
     )
-
-    await bot.send_message(
-        const.ADMIN_CHAT_ID,
-        admin_text,
-        parse_mode=ParseMode.HTML
+    if message.text:
+        admin_text += f"\n\n{html.escape(message.text)}"
+
+    # Replies to users go first when the outbound limit is reached.
+    with send_priority(SendPriority.FORWARD):
+        sent = await bot.send_message(
+            const.ADMIN_CHAT_ID,
+            admin_text,
+            parse_mode=ParseMode.HTML
+        )
+        admin_message_ids = [sent.message_id]
+        if not message.text:
+            copied = await bot.copy_message(
+                const.ADMIN_CHAT_ID, message.chat.id, message.message_id
+            )
+            admin_message_ids.append(copied.message_id)
+
+    await db.save_consultation_message(
+        message.chat.id,
+        "in",
+        message.content_type.value,
+        message.text or message.caption,
+        admin_message_ids,
+        message.message_id,
     )
 
     await message.answer(
@@ -1,54 +1,40 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+from typing import Any
 
 from aiogram import Router, F
 from aiogram.enums import ParseMode
 from aiogram.types import (
     Message,
     CallbackQuery,
-    InlineKeyboardMarkup,
-    InlineKeyboardButton,
 )
 
 import app.const as const
 import app.db as db
-from app.diagnostics import build_recommendation
-from app.texts import load_test_config, button
+from app.metrics import QUIZ_COMPLETIONS, QUIZ_STARTS
+from app.recommendations import recommend
+from app.texts import load_test_config_async
 import app.keyboards as keyboards
-from app.handlers import ADMIN_CHATS
+from app.filters import ButtonFilter
+from app.state import get_store
 
 router = Router()
 
-TEST_PROGRESS: Dict[int, Any] = {}
-
 
 async def get_progress(chat_id: int) -> dict[str, Any] | None:
-    progress = TEST_PROGRESS.get(chat_id)
-    if progress is not None:
-        return progress
-    progress = await db.load_diagnostic_session(chat_id)
-    if progress is not None:
-        TEST_PROGRESS[chat_id] = progress
-    return progress
+    return await get_store().load_progress(chat_id)
 
 
 async def save_progress(chat_id: int, progress: dict[str, Any]):
-    TEST_PROGRESS[chat_id] = progress
-    await db.save_diagnostic_session(
-        chat_id,
-        progress.get("answers", []),
-        progress.get("question_id", ""),
-    )
+    await get_store().save_progress(chat_id, progress)
 
 
 async def clear_progress(chat_id: int):
-    TEST_PROGRESS.pop(chat_id, None)
-    await db.delete_diagnostic_session(chat_id)
+    await get_store().clear_progress(chat_id)
 
 
 async def send_test_question(message: Message, chat_id: int, question_id: str):
-    test_config = load_test_config()
+    test_config = await load_test_config_async()
     test_questions = test_config.get("questions", {})
     test_start = test_config.get("start")
     if not test_start or not test_questions or not question_id:
@@ -74,23 +60,10 @@ async def send_test_question(message: Message, chat_id: int, question_id: str):
     progress["question_id"] = question_id
     await save_progress(chat_id, progress)
 
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text=opt["text"],
-                    # callback_data: "test:<answer_id>:<next_question_id>"
-                    callback_data=f"{const.TEST}:{opt['id']}:{opt['next']}",
-                )
-            ]
-            for opt in options
-        ]
-    )
-
     await message.answer(
         question["text"],
         parse_mode=ParseMode.HTML,
-        reply_markup=keyboard,
+        reply_markup=keyboards.question_keyboard(question_id),
     )
 
 
@@ -99,33 +72,36 @@ async def send_test_result(message: Message, chat_id: int):
     answers = progress["answers"] if progress else []
 
     await message.answer(
-        build_recommendation(answers),
+        await recommend(answers),
         parse_mode=ParseMode.HTML,
         reply_markup=keyboards.client_keyboard(),
     )
     await clear_progress(chat_id)
+    QUIZ_COMPLETIONS.inc()
 
 
 @router.callback_query(F.data == const.TEST)
 async def callback_test_start(callback: CallbackQuery):
     chat_id = callback.message.chat.id
-    ADMIN_CHATS.discard(chat_id)
+    await get_store().set_consulting(chat_id, False)
     await db.log_user(chat_id, callback.from_user, const.TEST)
 
-    test_start = load_test_config().get("start")
+    test_start = (await load_test_config_async()).get("start")
     await save_progress(chat_id, {"answers": [], "question_id": test_start or ""})
+    QUIZ_STARTS.inc()
     await send_test_question(callback.message, chat_id, test_start)
     await callback.answer()
 
 
-@router.message(F.text == button(const.TEST), ~F.reply_to_message)
+@router.message(ButtonFilter(const.TEST), ~F.reply_to_message)
 async def message_test_start(message: Message):
     chat_id = message.chat.id
-    ADMIN_CHATS.discard(chat_id)
+    await get_store().set_consulting(chat_id, False)
     await db.log_user(chat_id, message.from_user, const.TEST)
 
-    test_start = load_test_config().get("start")
+    test_start = (await load_test_config_async()).get("start")
     await save_progress(chat_id, {"answers": [], "question_id": test_start or ""})
+    QUIZ_STARTS.inc()
     await send_test_question(message, chat_id, test_start)
 
 
@@ -147,8 +123,9 @@ async def callback_test_answer(callback: CallbackQuery):
     # проверяем и обновляем прогресс
     progress = await get_progress(chat_id)
     if progress is None:
-        test_start = load_test_config().get("start")
+        test_start = (await load_test_config_async()).get("start")
         await save_progress(chat_id, {"answers": [], "question_id": test_start or ""})
+        QUIZ_STARTS.inc()
         await send_test_question(callback.message, chat_id, test_start)
         await callback.answer(
             "Предыдущее прохождение завершено. Я начала диагностику заново.",
@@ -156,7 +133,7 @@ async def callback_test_answer(callback: CallbackQuery):
         )
         return
 
-    test_config = load_test_config()
+    test_config = await load_test_config_async()
     questions = test_config.get("questions", {})
     question_id = progress.get("question_id")
     question = questions.get(question_id, {})
@@ -1,11 +1,36 @@
-from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
+from functools import wraps
+from typing import Callable
+
+from aiogram.types import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    KeyboardButton,
+    ReplyKeyboardMarkup,
+)
 
 import app.const as const
-from app.texts import button
+from app.texts import button, load_test_config, snapshot_version, texts_version
 
 SIGNING_URL = "https://dikidi.ru/1723277"
 
 
+def _per_texts_version(build: Callable[[], ReplyKeyboardMarkup]) -> Callable[[], ReplyKeyboardMarkup]:
+    # One instance is sent to every chat until the button labels change. aiogram
+    # models are mutable, so callers must treat the result as read-only; take
+    # model_copy(deep=True) to adjust it for a single message.
+    cached: tuple[int, ReplyKeyboardMarkup] | None = None
+
+    @wraps(build)
+    def wrapper() -> ReplyKeyboardMarkup:
+        nonlocal cached
+        version = texts_version()
+        if cached is None or cached[0] != version:
+            cached = (version, build())
+        return cached[1]
+
+    return wrapper
+
+
 def _button(key: str) -> KeyboardButton:
     return KeyboardButton(text=button(key))
 
@@ -21,12 +46,14 @@ def _keyboard(rows: list[list[str]]) -> ReplyKeyboardMarkup:
     )
 
 
+@_per_texts_version
 def start_keyboard() -> ReplyKeyboardMarkup:
     return _keyboard([
         [const.MASTER, const.CLIENT],
     ])
 
 
+@_per_texts_version
 def client_keyboard() -> ReplyKeyboardMarkup:
     return _keyboard([
         [const.SERVICES],
@@ -36,6 +63,7 @@ def client_keyboard() -> ReplyKeyboardMarkup:
     ])
 
 
+@_per_texts_version
 def services_keyboard() -> ReplyKeyboardMarkup:
     return _keyboard([
         [const.KERATIN],
@@ -45,6 +73,7 @@ def services_keyboard() -> ReplyKeyboardMarkup:
     ])
 
 
+@_per_texts_version
 def services_menu_keyboard() -> ReplyKeyboardMarkup:
     return _keyboard([
         [const.PRICE, const.REVIEWS],
@@ -53,6 +82,7 @@ def services_menu_keyboard() -> ReplyKeyboardMarkup:
     ])
 
 
+@_per_texts_version
 def reviews_keyboard() -> ReplyKeyboardMarkup:
     return _keyboard([
         [const.SIGNING],
@@ -60,8 +90,48 @@ def reviews_keyboard() -> ReplyKeyboardMarkup:
     ])
 
 
+@_per_texts_version
 def master_keyboard() -> ReplyKeyboardMarkup:
     return _keyboard([
         [const.SERVICES],
         [const.CLIENT],
     ])
+
+
+_question_keyboards: dict[str, InlineKeyboardMarkup] = {}
+_question_keyboards_version: int | None = None
+
+
+def question_keyboard(question_id: str) -> InlineKeyboardMarkup | None:
+    """Answer buttons of a published question, built once per snapshot version.
+
+    The markup is shared between chats and must not be modified.
+    """
+    global _question_keyboards, _question_keyboards_version
+    version = snapshot_version()
+    if version != _question_keyboards_version:
+        _question_keyboards = {}
+        _question_keyboards_version = version
+
+    keyboard = _question_keyboards.get(question_id)
+    if keyboard is not None:
+        return keyboard
+
+    question = load_test_config().get("questions", {}).get(question_id)
+    options = question.get("options", []) if question else []
+    if not options:
+        return None
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=opt["text"],
+                    # callback_data: "test:<answer_id>:<next_question_id>"
+                    callback_data=f"{const.TEST}:{opt['id']}:{opt['next']}",
+                )
+            ]
+            for opt in options
+        ]
+    )
+    _question_keyboards[question_id] = keyboard
+    return keyboard
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+import app.db as db
+from app.file_cache import CachedFile
+from app.paths import DATA_DIR
+from app.texts import file, files
+
+PHOTO_SUFFIXES = frozenset({".jpg", ".jpeg", ".png", ".webp"})
+
+Media = str | FSInputFile
+
+
+def is_local_media(value: str) -> bool:
+    """Whether a ``data/files.json`` value is a path under ``data/``.
+
+    Telegram file IDs are URL-safe base64 and never contain "." or "/", so
+    values like ``media/start.jpg`` are local files and everything else is an
+    already known file ID.
+    """
+    return "." in value or "/" in value
+
+
+def _sha256(path: Path) -> str:
+    with path.open("rb") as source:
+        return hashlib.file_digest(source, "sha256").hexdigest()
+
+
+def sent_file_id(message: Message) -> str | None:
+    if message.photo:
+        return message.photo[-1].file_id
+    for attachment in (
+        message.document,
+        message.video,
+        message.animation,
+        message.audio,
+        message.voice,
+    ):
+        if attachment is not None:
+            return attachment.file_id
+    return None
+
+
+# Errors meaning the stored file ID is no longer valid. Other errors that mention
+# a file ("file is too big", "wrong file type", ...) would fail again after an upload.
+STALE_FILE_ID_ERRORS = ("wrong file identifier", "file_reference_")
+
+
+def _is_stale_file_error(error: TelegramBadRequest) -> bool:
+    message = error.message.lower()
+    return any(marker in message for marker in STALE_FILE_ID_ERRORS)
+
+
+class MediaRegistry:
+    """Telegram file IDs of local media files, keyed by content hash.
+
+    A file is uploaded the first time it is sent; the returned file ID is stored
+    in SQLite and every later send goes by ID. Replacing a file changes its hash,
+    so the new content is uploaded once. If Telegram rejects a stored ID, it is
+    dropped and the file is uploaded again. A local file missing on disk is
+    logged and left out instead of failing the handler.
+    """
+
+    def __init__(self, base_dir: Path = DATA_DIR):
+        self.base_dir = base_dir
+        self._hashes: dict[Path, CachedFile[str]] = {}
+        self._file_ids: dict[str, str] | None = None
+        self._upload_locks: dict[str, asyncio.Lock] = {}
+
+    def path(self, value: str) -> Path:
+        return self.base_dir / value
+
+    def content_hash(self, value: str) -> str:
+        # Re-hashed only when the file changes on disk.
+        path = self.path(value)
+        entry = self._hashes.get(path)
+        if entry is None:
+            entry = self._hashes.setdefault(path, CachedFile(path, _sha256))
+        return entry.get()
+
+    def _is_available(self, value: str) -> bool:
+        if not is_local_media(value):
+            return True
+        try:
+            self.content_hash(value)
+        except OSError as error:
+            logging.error("Media file %s is not available: %s", self.path(value), error)
+            return False
+        return True
+
+    async def _known(self) -> dict[str, str]:
+        if self._file_ids is None:
+            self._file_ids = await db.load_media_file_ids()
+        return self._file_ids
+
+    async def _remember(self, content_hash: str, file_id: str):
+        (await self._known())[content_hash] = file_id
+        await db.save_media_file_id(content_hash, file_id)
+
+    async def _forget(self, content_hash: str):
+        (await self._known()).pop(content_hash, None)
+        await db.delete_media_file_id(content_hash)
+
+    async def cached_file_id(self, value: str) -> str | None:
+        if not is_local_media(value):
+            return value
+        return (await self._known()).get(self.content_hash(value))
+
+    async def resolve(self, value: str) -> Media:
+        if not is_local_media(value):
+            return value
+        file_id = await self.cached_file_id(value)
+        return file_id if file_id is not None else FSInputFile(self.path(value))
+
+    async def send(
+        self,
+        value: str,
+        send: Callable[[Media], Awaitable[Message]],
+        fallback: Callable[[], Awaitable[Message]] | None = None,
+    ) -> Message:
+        """Send one file through ``send``, by file ID whenever one is known.
+
+        If the local file is missing, ``fallback`` is awaited instead; without
+        one the ``OSError`` is raised.
+        """
+        if not is_local_media(value):
+            return await send(value)
+        if fallback is not None and not self._is_available(value):
+            return await fallback()
+        content_hash = self.content_hash(value)
+        known = await self._known()
+        file_id = known.get(content_hash)
+        if file_id is not None:
+            try:
+                return await send(file_id)
+            except TelegramBadRequest as error:
+                if not _is_stale_file_error(error):
+                    raise
+                logging.warning("Telegram rejected the file ID of %s, uploading again", value)
+                await self._forget(content_hash)
+        # Concurrent first sends of the same file wait for one upload.
+        lock = self._upload_locks.setdefault(content_hash, asyncio.Lock())
+        async with lock:
+            file_id = known.get(content_hash)
+            if file_id is not None:
+                return await send(file_id)
+            sent = await send(FSInputFile(self.path(value)))
+            file_id = sent_file_id(sent)
+            if file_id is not None:
+                await self._remember(content_hash, file_id)
+        return sent
+
+    async def send_group(
+        self,
+        values: list[str],
+        send: Callable[[list[Media]], Awaitable[list[Message]]],
+    ) -> list[Message]:
+        """Send an album; files without a known ID are uploaded with it.
+
+        Local files missing on disk are left out; nothing is sent if no file is
+        left.
+        """
+        values = [value for value in values if self._is_available(value)]
+        if not values:
+            return []
+        media = [await self.resolve(value) for value in values]
+        try:
+            sent = await send(media)
+        except TelegramBadRequest as error:
+            cached = [
+                value
+                for value, item in zip(values, media)
+                if is_local_media(value) and isinstance(item, str)
+            ]
+            if not cached or not _is_stale_file_error(error):
+                raise
+            # Telegram does not say which item is stale; re-upload all of them.
+            logging.warning("Telegram rejected a file ID in an album, uploading again")
+            for value in cached:
+                await self._forget(self.content_hash(value))
+            media = [await self.resolve(value) for value in values]
+            sent = await send(media)
+        for value, item, message in zip(values, media, sent):
+            if isinstance(item, FSInputFile):
+                file_id = sent_file_id(message)
+                if file_id is not None:
+                    await self._remember(self.content_hash(value), file_id)
+        return sent
+
+    async def upload_missing(
+        self,
+        values: Iterable[str],
+        upload: Callable[[Path], Awaitable[Message]],
+    ) -> tuple[int, int, list[str]]:
+        """Upload local files that have no stored file ID yet.
+
+        Returns the number of uploaded and already cached files and the values
+        whose files are missing on disk.
+        """
+        uploaded = cached = 0
+        missing: list[str] = []
+        seen: set[str] = set()
+        known = await self._known()
+        for value in values:
+            if not is_local_media(value) or value in seen:
+                continue
+            seen.add(value)
+            try:
+                content_hash = self.content_hash(value)
+            except OSError:
+                missing.append(value)
+                continue
+            if content_hash in known:
+                cached += 1
+                continue
+            file_id = sent_file_id(await upload(self.path(value)))
+            if file_id is not None:
+                await self._remember(content_hash, file_id)
+                uploaded += 1
+        return uploaded, cached, missing
+
+
+def media_values(registry_files: dict) -> list[str]:
+    """All file values from ``data/files.json``, flattening lists."""
+    values: list[str] = []
+    for value in registry_files.values():
+        if isinstance(value, str):
+            values.append(value)
+        elif isinstance(value, list):
+            values.extend(item for item in value if isinstance(item, str))
+    return values
+
+
+_media: MediaRegistry | None = None
+
+
+def get_media() -> MediaRegistry:
+    global _media
+    if _media is None:
+        _media = MediaRegistry()
+    return _media
+
+
+def set_media(media: MediaRegistry | None):
+    global _media
+    _media = media
+
+
+async def answer_photo(message: Message, key: str, **kwargs) -> Message:
+    caption = kwargs.get("caption")
+
+    async def without_photo() -> Message:
+        # Same text and keyboard, so the user still gets a reply.
+        options = {
+            name: kwargs[name] for name in ("parse_mode", "reply_markup") if name in kwargs
+        }
+        return await message.answer(caption, **options)
+
+    return await get_media().send(
+        file(key),
+        lambda photo: message.answer_photo(photo, **kwargs),
+        without_photo if caption else None,
+    )
+
+
+async def answer_photo_group(message: Message, key: str) -> list[Message]:
+    return await get_media().send_group(
+        files(key),
+        lambda media: message.answer_media_group(
+            [InputMediaPhoto(media=item) for item in media]
+        ),
+    )
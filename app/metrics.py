@@ -0,0 +1,266 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Only the standard library is used: a metric is a dict of label values to
+numbers, so recording one sample is a dict lookup, a ``bisect`` and a few
+additions, and is cheap enough to stay on in production. Everything runs on the
+event loop thread; ``render()`` is the only reader.
+"""
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+
+# Seconds; from a cached SQLite read to a slow Bot API call.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def _key(self, labels: tuple[Any, ...]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(label) for label in labels)
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        """(suffix, formatted labels, value) of every series."""
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+        if not labelnames:
+            self._values[()] = 0
+
+    def inc(self, *labels: Any, amount: float = 1):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels: Any) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield "_total", _format_labels(self.labelnames, key), value
+
+
+class CallbackCounter(Metric):
+    """Counter whose running total is read from ``callback`` when scraped.
+
+    For totals another object already keeps; the callback must never decrease.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self):
+        yield "_total", "", self.callback()
+
+
+class Gauge(Metric):
+    """Current value, read from ``callback`` when the metrics are scraped."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self):
+        yield "", "", self.callback()
+
+
+class _Series:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self._series: dict[LabelValues, _Series] = {}
+
+    def observe(self, seconds: float, *labels: Any):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            # The last slot counts samples above every bound (+Inf).
+            series = self._series[key] = _Series(len(self.bounds) + 1)
+        series.buckets[bisect_left(self.bounds, seconds)] += 1
+        series.count += 1
+        series.sum += seconds
+
+    def count(self, *labels: Any) -> int:
+        series = self._series.get(self._key(labels))
+        return series.count if series is not None else 0
+
+    def counts(self) -> dict[LabelValues, int]:
+        """Number of observations of every series, keyed by label values."""
+        return {key: series.count for key, series in self._series.items()}
+
+    def samples(self):
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, hits in zip((*self.bounds, math.inf), series.buckets):
+                cumulative += hits
+                labels = _format_labels(
+                    (*self.labelnames, "le"), (*key, _format_value(bound))
+                )
+                yield "_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield "_count", labels, series.count
+            yield "_sum", labels, series.sum
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                logging.exception("Failed to collect metric %s", metric.name)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, callback))
+
+
+def callback_counter(
+    name: str, documentation: str, callback: Callable[[], float]
+) -> CallbackCounter:
+    return REGISTRY.register(CallbackCounter(name, documentation, callback))
+
+
+HANDLER_SECONDS = histogram(
+    "bot_handler_seconds",
+    "Time spent in message and callback query handlers.",
+    ("handler", "outcome"),
+)
+DB_SECONDS = histogram("bot_db_seconds", "Time spent in app.db calls.", ("call",))
+BOT_API_SECONDS = histogram(
+    "bot_api_seconds",
+    "Duration of Bot API requests, excluding time queued by the rate limiter.",
+    ("method", "outcome"),
+)
+QUIZ_STARTS = counter("bot_quiz_starts", "Diagnostic tests started.")
+QUIZ_COMPLETIONS = counter("bot_quiz_completions", "Diagnostic tests finished with a result.")
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+def timed(metric: Histogram) -> Callable[[F], F]:
+    """Record how long each call of the decorated coroutine function takes."""
+
+    def decorate(func: F) -> F:
+        label = func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - started, label)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+async def start_metrics_server(host: str, port: int, registry: Registry = REGISTRY):
+    """Serve ``GET /metrics`` on ``host:port``; returns the aiohttp runner to clean up."""
+    from aiohttp import web
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE}
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,103 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.types import Chat, TelegramObject
+
+from app.metrics import HANDLER_SECONDS
+
+
+class _ChatLock:
+    __slots__ = ("lock", "holders")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.holders = 0
+
+
+class ChatOrderMiddleware(BaseMiddleware):
+    """Handle updates of one chat one at a time, in the order they arrived.
+
+    Updates of different chats still run concurrently. Without this, two quick
+    taps in the same chat race: both handlers read the same diagnostic progress
+    and the later save overwrites the earlier answer.
+
+    A lock exists only while some update of its chat is running or waiting, so
+    the table does not grow with the number of chats ever seen. Register as an
+    outer middleware on ``dp.update``; updates without a chat are not ordered.
+    """
+
+    def __init__(self):
+        self._locks: dict[int, _ChatLock] = {}
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._locks)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        chat: Chat | None = data.get("event_chat")
+        if chat is None:
+            return await handler(event, data)
+
+        entry = self._locks.get(chat.id)
+        if entry is None:
+            entry = self._locks[chat.id] = _ChatLock()
+        entry.holders += 1
+        try:
+            # asyncio.Lock wakes waiters first-in, first-out.
+            async with entry.lock:
+                return await handler(event, data)
+        finally:
+            entry.holders -= 1
+            if not entry.holders:
+                del self._locks[chat.id]
+
+
+def handler_label(data: dict[str, Any]) -> str:
+    """Metric label of the handler about to run: its function name.
+
+    Reply-keyboard buttons all go through one route, so the pressed button's key
+    is appended, e.g. ``message_button:client``.
+    """
+    handler = data.get("handler")
+    name = getattr(getattr(handler, "callback", None), "__name__", "unknown")
+    button = data.get("button")
+    return f"{name}:{button}" if button is not None else name
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Record the duration of every handler in ``bot_handler_seconds``.
+
+    Register as an inner middleware on ``dp.message`` and ``dp.callback_query``:
+    inner middlewares run after the filters have chosen a handler and also apply
+    to the included routers. A handler that raises ``SkipHandler`` is not
+    recorded, the next matching one is.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await handler(event, data)
+            outcome = "ok"
+            return result
+        except SkipHandler:
+            outcome = None
+            raise
+        finally:
+            if outcome is not None:
+                HANDLER_SECONDS.observe(
+                    time.perf_counter() - started, handler_label(data), outcome
+                )
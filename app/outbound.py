@@ -0,0 +1,278 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Iterator
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+
+from app.metrics import BOT_API_SECONDS
+
+# Telegram's documented limits: about 30 messages per second overall, one per
+# second in a private chat and 20 per minute in a group.
+GLOBAL_RATE = 30.0
+PRIVATE_CHAT_RATE = 1.0
+GROUP_CHAT_RATE = 20 / 60
+# Short bursts are tolerated, so a screen of photo + text goes out at once.
+CHAT_BURST = 3
+MAX_RETRIES = 3
+# Idle per-chat limits are dropped once this many chats are tracked.
+MAX_TRACKED_CHATS = 10_000
+
+
+class SendPriority(IntEnum):
+    """Lower value is sent first when the global limit is exhausted."""
+
+    INTERACTIVE = 0
+    FORWARD = 1
+    BULK = 2
+
+
+_priority: ContextVar[SendPriority] = ContextVar(
+    "send_priority", default=SendPriority.INTERACTIVE
+)
+
+
+@contextmanager
+def send_priority(priority: SendPriority) -> Iterator[None]:
+    """Send the Bot API calls made inside the block with ``priority``."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimit:
+    """Token bucket of ``rate`` sends per second holding up to ``burst`` tokens.
+
+    Kept as the theoretical arrival time of the next send (GCRA), so taking a
+    token and computing the wait are O(1) and need no background refill.
+    """
+
+    __slots__ = ("interval", "tolerance", "_tat")
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self._tat = 0.0
+
+    def delay(self, now: float) -> float:
+        return max(0.0, self._tat - self.tolerance - now)
+
+    def take(self, now: float):
+        self._tat = max(self._tat, now) + self.interval
+
+    def reserve(self, now: float) -> float:
+        """Take the next token and return how long to wait before using it."""
+        delay = self.delay(now)
+        self.take(now)
+        return delay
+
+    def pause(self, until: float):
+        """No tokens before ``until``, e.g. after Telegram answered 429."""
+        self._tat = max(self._tat, until + self.tolerance)
+
+    def idle(self, now: float) -> bool:
+        return self._tat <= now
+
+
+def _is_send(method: TelegramMethod) -> bool:
+    name = method.__api_method__
+    return name.startswith(("send", "copy", "forward")) and name != "sendChatAction"
+
+
+def _is_group(chat_id: Any) -> bool:
+    # Groups and channels have negative IDs or are addressed by @username.
+    return not isinstance(chat_id, int) or chat_id < 0
+
+
+@dataclass
+class OutboundStats:
+    queued: int = 0
+    max_queued: int = 0
+    sent: int = 0
+    delayed: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    retries: int = 0
+
+    @property
+    def wait_avg(self) -> float:
+        return self.wait_total / self.sent if self.sent else 0.0
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """Bot API session middleware that keeps sends within Telegram limits.
+
+    Every send first waits for its chat's limit, then for the global one. When
+    the global limit is exhausted, waiting sends go out by ``SendPriority`` and
+    then in arrival order, so replies to users overtake admin forwards and
+    broadcasts. A 429 pauses the chat (or everything, for calls without a chat)
+    for ``retry_after`` seconds and the call is repeated up to ``max_retries``
+    times. Other Bot API calls pass through untouched.
+
+    ``chat_rates`` overrides the rate of single chats. The admin chat is a group,
+    so by default every consultation forward shares 20 sends a minute; the
+    forward is made while ``ChatOrderMiddleware`` holds the client's chat lock,
+    so once that budget is spent, the clients' next updates wait behind their
+    forwards for up to a minute (``OUTBOUND_ADMIN_RATE``).
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        chat_rate: float = PRIVATE_CHAT_RATE,
+        group_rate: float = GROUP_CHAT_RATE,
+        chat_burst: int = CHAT_BURST,
+        max_retries: int = MAX_RETRIES,
+        chat_rates: dict[Any, float] | None = None,
+    ):
+        self.global_limit = RateLimit(global_rate)
+        self.chat_rate = chat_rate
+        self.chat_rates = dict(chat_rates or {})
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.stats = OutboundStats()
+        self._chats: dict[Any, RateLimit] = {}
+        self._queue: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._pump: asyncio.Task | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def _chat_limit(self, chat_id: Any, now: float) -> RateLimit:
+        limit = self._chats.get(chat_id)
+        if limit is None:
+            if len(self._chats) >= MAX_TRACKED_CHATS:
+                self._chats = {
+                    key: value for key, value in self._chats.items() if not value.idle(now)
+                }
+            rate = self.chat_rates.get(chat_id)
+            if rate is None:
+                rate = self.group_rate if _is_group(chat_id) else self.chat_rate
+            limit = self._chats[chat_id] = RateLimit(rate, self.chat_burst)
+        return limit
+
+    async def _acquire_global(self, priority: int):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if not self._queue and not self.global_limit.delay(now):
+            self.global_limit.take(now)
+            return
+        future = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future))
+        if self._pump is None or self._pump.done():
+            self._pump = loop.create_task(self._run_queue())
+        await future
+
+    async def _run_queue(self):
+        loop = asyncio.get_running_loop()
+        while self._queue:
+            delay = self.global_limit.delay(loop.time())
+            if delay:
+                # A more urgent send may arrive meanwhile; the heap is re-read.
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                # The waiting call was cancelled.
+                continue
+            self.global_limit.take(loop.time())
+            future.set_result(None)
+
+    async def _wait_turn(self, chat_id: Any, priority: int):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        stats = self.stats
+        stats.queued += 1
+        stats.max_queued = max(stats.max_queued, stats.queued)
+        try:
+            if chat_id is not None:
+                delay = self._chat_limit(chat_id, started).reserve(started)
+                if delay:
+                    await asyncio.sleep(delay)
+            await self._acquire_global(priority)
+        finally:
+            stats.queued -= 1
+        waited = loop.time() - started
+        stats.sent += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+        if waited > 0.001:
+            stats.delayed += 1
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        if not _is_send(method):
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        priority = _priority.get()
+        attempt = 0
+        while True:
+            await self._wait_turn(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as error:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.stats.retries += 1
+                logging.warning(
+                    "Flood control on %s for chat %s, retrying in %s s",
+                    method.__api_method__,
+                    chat_id,
+                    error.retry_after,
+                )
+                loop = asyncio.get_running_loop()
+                until = loop.time() + error.retry_after
+                if chat_id is not None:
+                    self._chat_limit(chat_id, loop.time()).pause(until)
+                else:
+                    self.global_limit.pause(until)
+
+
+class BotApiMetrics(BaseRequestMiddleware):
+    """Record every Bot API request in ``bot_api_seconds`` by method and outcome.
+
+    Register after ``OutboundLimiter`` so the time a send waits for its turn is
+    not counted; each retry after a 429 is a separate sample.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await make_request(bot, method)
+            outcome = "ok"
+            return response
+        except TelegramRetryAfter:
+            outcome = "flood_wait"
+            raise
+        finally:
+            BOT_API_SECONDS.observe(
+                time.perf_counter() - started, method.__api_method__, outcome
+            )
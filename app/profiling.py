@@ -0,0 +1,223 @@
+"""On-demand profiling and detection of steps that block the event loop.
+
+``SlowCallbackMonitor`` relies on CPython internals: it replaces the private
+``asyncio.events.Handle._run`` for the whole process and reads
+``Handle._callback`` to name the slow step. Loops that do not run pure-Python
+handles (uvloop, a C-accelerated ``Handle``) never call it, so on those, or if
+``_run`` is missing, the monitor logs that and falls back to asyncio debug mode
+with ``slow_callback_duration``.
+"""
+from __future__ import annotations
+
+import asyncio
+import asyncio.events
+import cProfile
+import io
+import logging
+import pstats
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from app.metrics import counter
+from app.paths import DATA_DIR
+
+PROFILE_DIR = DATA_DIR / "profiles"
+DEFAULT_PROFILE_SECONDS = 30.0
+MAX_PROFILE_SECONDS = 300.0
+REPORT_LINES = 40
+
+SLOW_CALLBACKS = counter(
+    "bot_slow_callbacks", "Event loop steps that ran longer than SLOW_CALLBACK_MS."
+)
+
+
+class ProfileInProgress(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class ProfileReport:
+    report_path: Path
+    stats_path: Path
+    seconds: float
+
+
+_capturing = False
+
+
+def profile_duration(seconds: float) -> float:
+    return min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+
+
+def _write_report(profiler: cProfile.Profile, seconds: float, directory: Path) -> ProfileReport:
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = datetime.now().strftime("profile-%Y%m%d-%H%M%S")
+    stats_path = directory / f"{stem}.prof"
+    report_path = directory / f"{stem}.txt"
+    profiler.dump_stats(stats_path)
+
+    def section(sort: str, limit: int) -> str:
+        buffer = io.StringIO()
+        stats = pstats.Stats(profiler, stream=buffer)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return buffer.getvalue()
+
+    report_path.write_text(
+        f"Event loop profile, {seconds:g} s\n\n"
+        f"=== By own time ===\n{section(pstats.SortKey.TIME, REPORT_LINES)}\n"
+        f"=== By cumulative time ===\n{section(pstats.SortKey.CUMULATIVE, REPORT_LINES)}",
+        encoding="utf-8",
+    )
+    return ProfileReport(report_path, stats_path, seconds)
+
+
+async def capture_profile(
+    seconds: float = DEFAULT_PROFILE_SECONDS, directory: Path = PROFILE_DIR
+) -> ProfileReport:
+    """Profile everything the event loop runs for ``seconds`` and write a report.
+
+    cProfile hooks the current thread, which is the loop thread, so every
+    handler, filter and synchronous call made by them is included while the
+    capture runs. Writes ``<stem>.txt`` (top functions by own and cumulative
+    time) and ``<stem>.prof`` for ``python -m pstats`` or snakeviz. Only one
+    capture can run at a time.
+    """
+    global _capturing
+    if _capturing:
+        raise ProfileInProgress("A profile is already being captured")
+    seconds = profile_duration(seconds)
+    _capturing = True
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+        _capturing = False
+    report = await asyncio.to_thread(_write_report, profiler, seconds, directory)
+    logging.info("Profile written to %s", report.report_path)
+    return report
+
+
+def is_capturing() -> bool:
+    return _capturing
+
+
+def start_profile_on_signal(loop: asyncio.AbstractEventLoop, signum: int) -> bool:
+    """Capture a default-length profile whenever the process gets ``signum``.
+
+    Returns False where the loop cannot handle signals (e.g. on Windows).
+    """
+
+    def on_signal():
+        if is_capturing():
+            logging.warning("Profile already running, signal ignored")
+            return
+        task = loop.create_task(capture_profile())
+        task.add_done_callback(_log_failure)
+
+    try:
+        loop.add_signal_handler(signum, on_signal)
+    except (NotImplementedError, RuntimeError, AttributeError):
+        return False
+    return True
+
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("Profile capture failed", exc_info=task.exception())
+
+
+def describe_callback(handle: asyncio.Handle) -> str:
+    """Coroutine and line a loop step belongs to, or the plain callback."""
+    callback = handle._callback
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        name = getattr(coro, "__qualname__", repr(coro))
+        frame = getattr(coro, "cr_frame", None)
+        if frame is not None:
+            # Where the coroutine is suspended now, i.e. where the slow step ended.
+            return f"{owner.get_name()} {name} at {frame.f_code.co_filename}:{frame.f_lineno}"
+        return f"{owner.get_name()} {name}"
+    return repr(handle)
+
+
+class SlowCallbackMonitor:
+    """Log every event loop step that blocks the loop for ``threshold`` seconds.
+
+    Wraps ``asyncio.Handle._run``, which runs each callback and each coroutine
+    step scheduled on the loop, so it works without asyncio debug mode and costs
+    two ``perf_counter()`` calls per step. Where that private method cannot be
+    wrapped, asyncio debug mode reports the slow steps instead; it is costlier
+    and does not update ``bot_slow_callbacks``.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._original = None
+        self._debug_loop: asyncio.AbstractEventLoop | None = None
+
+    @staticmethod
+    def can_wrap(loop: asyncio.AbstractEventLoop | None) -> bool:
+        """Whether ``loop`` runs its callbacks through ``asyncio.events.Handle._run``."""
+        if not callable(getattr(asyncio.events.Handle, "_run", None)):
+            return False
+        return loop is None or isinstance(loop, asyncio.BaseEventLoop)
+
+    def install(self, loop: asyncio.AbstractEventLoop | None = None) -> bool:
+        """Start reporting slow steps; False if debug mode is used instead.
+
+        ``loop`` defaults to the running loop, if any.
+        """
+        if self._original is not None or self._debug_loop is not None:
+            return self._original is not None
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        if not self.can_wrap(loop):
+            if loop is None:
+                logging.warning(
+                    "asyncio.Handle._run is not available, slow callbacks are not reported"
+                )
+                return False
+            logging.warning(
+                "asyncio.Handle._run cannot be wrapped on %s, reporting slow "
+                "callbacks through asyncio debug mode",
+                type(loop).__name__,
+            )
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+            self._debug_loop = loop
+            return False
+        original = self._original = asyncio.events.Handle._run
+        threshold = self.threshold
+
+        def run(handle: asyncio.Handle):
+            started = time.perf_counter()
+            try:
+                original(handle)
+            finally:
+                elapsed = time.perf_counter() - started
+                if elapsed >= threshold:
+                    SLOW_CALLBACKS.inc()
+                    logging.warning(
+                        "Event loop blocked for %.0f ms by %s",
+                        elapsed * 1000,
+                        describe_callback(handle),
+                    )
+
+        asyncio.events.Handle._run = run
+        return True
+
+    def uninstall(self):
+        if self._original is not None:
+            asyncio.events.Handle._run = self._original
+            self._original = None
+        if self._debug_loop is not None:
+            self._debug_loop.set_debug(False)
+            self._debug_loop = None
@@ -0,0 +1,74 @@
+"""Diagnostic results for handlers, rendered off the event loop.
+
+A text already rendered for the same answers under the current sources is
+returned right away. Anything else — re-reading published sources after a
+change, compiling them, analyzing the path and building the HTML — runs in a
+small thread pool, so a result that needs real work does not hold up other
+chats' updates while it is prepared.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import get_recommendation_workers
+from app.diagnostics import build_recommendation, cached_recommendation
+from app.metrics import histogram
+
+RECOMMENDATION_SECONDS = histogram(
+    "bot_recommendation_seconds",
+    "Time to get a diagnostic result; path is memo, executor or inline.",
+    ("path",),
+)
+RECOMMENDATION_QUEUE_SECONDS = histogram(
+    "bot_recommendation_queue_seconds",
+    "Time a result waited for a free renderer thread.",
+)
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_executor() -> ThreadPoolExecutor | None:
+    """The shared renderer pool, or None when RECOMMENDATION_WORKERS is 0."""
+    global _executor
+    if _executor is None:
+        workers = get_recommendation_workers()
+        if workers == 0:
+            return None
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recommend")
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def recommend(answers: list[str]) -> str:
+    """Recommendation text for ``answers``."""
+    started = time.perf_counter()
+    text = cached_recommendation(answers)
+    if text is not None:
+        RECOMMENDATION_SECONDS.observe(time.perf_counter() - started, "memo")
+        return text
+
+    executor = get_executor()
+    if executor is None:
+        text = build_recommendation(answers)
+        RECOMMENDATION_SECONDS.observe(time.perf_counter() - started, "inline")
+        return text
+
+    # The handler's progress dict may change once it resumes.
+    answers = list(answers)
+
+    def render() -> tuple[float, str]:
+        # Metrics are only updated on the loop thread; just note when work began.
+        return time.perf_counter(), build_recommendation(answers)
+
+    picked_up, text = await asyncio.get_running_loop().run_in_executor(executor, render)
+    RECOMMENDATION_QUEUE_SECONDS.observe(picked_up - started)
+    RECOMMENDATION_SECONDS.observe(time.perf_counter() - started, "executor")
+    return text
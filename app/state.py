@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable
+
+import app.db as db
+from app.config import get_session_cache_size, get_session_cache_ttl, get_state_backend
+
+
+class SessionCache:
+    """Bounded LRU cache whose entries also expire after ``ttl`` idle seconds.
+
+    Entries are kept in access order, so expired ones are always at the front and
+    are dropped on the next write; memory stays flat however many chats ever
+    touched the quiz.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._items: OrderedDict[int, tuple[float, dict[str, Any]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: int) -> dict[str, Any] | None:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        now = self._clock()
+        accessed_at, value = item
+        if now - accessed_at > self.ttl:
+            del self._items[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._items[key] = (now, value)
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: int, value: dict[str, Any]):
+        now = self._clock()
+        self._items[key] = (now, value)
+        self._items.move_to_end(key)
+        while self._items:
+            oldest_key, (accessed_at, _) = next(iter(self._items.items()))
+            if len(self._items) <= self.max_size and now - accessed_at <= self.ttl:
+                break
+            del self._items[oldest_key]
+            self.evictions += 1
+
+    def pop(self, key: int):
+        self._items.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class StateStore(ABC):
+    """Per-chat conversation state: diagnostic progress and consultation mode."""
+
+    @abstractmethod
+    async def load_progress(self, chat_id: int) -> dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    async def save_progress(self, chat_id: int, progress: dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def clear_progress(self, chat_id: int):
+        ...
+
+    @abstractmethod
+    async def is_consulting(self, chat_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    async def set_consulting(self, chat_id: int, active: bool):
+        ...
+
+
+class MemoryStateStore(StateStore):
+    """Process-local state. Lost on restart; suitable for tests and a single worker."""
+
+    def __init__(self):
+        self.progress: dict[int, dict[str, Any]] = {}
+        self.consulting: set[int] = set()
+
+    async def load_progress(self, chat_id: int) -> dict[str, Any] | None:
+        return self.progress.get(chat_id)
+
+    async def save_progress(self, chat_id: int, progress: dict[str, Any]):
+        self.progress[chat_id] = progress
+
+    async def clear_progress(self, chat_id: int):
+        self.progress.pop(chat_id, None)
+
+    async def is_consulting(self, chat_id: int) -> bool:
+        return chat_id in self.consulting
+
+    async def set_consulting(self, chat_id: int, active: bool):
+        if active:
+            self.consulting.add(chat_id)
+        else:
+            self.consulting.discard(chat_id)
+
+
+class SqliteStateStore(StateStore):
+    """State persisted in SQLite next to ``diagnostic_sessions``.
+
+    With ``shared=False`` the process keeps a bounded read cache in front of the
+    database, which is only correct while a single process serves the bot. With
+    ``shared=True`` every lookup goes to SQLite, so several workers behind a
+    webhook can serve the same chats.
+    """
+
+    def __init__(self, shared: bool = False, cache: SessionCache | None = None):
+        self.shared = shared
+        if cache is None:
+            cache = SessionCache(get_session_cache_size(), get_session_cache_ttl())
+        self.cache = cache
+        self._consulting: set[int] | None = None
+
+    async def load_progress(self, chat_id: int) -> dict[str, Any] | None:
+        if not self.shared:
+            progress = self.cache.get(chat_id)
+            if progress is not None:
+                return progress
+        progress = await db.load_diagnostic_session(chat_id)
+        if progress is not None and not self.shared:
+            self.cache.put(chat_id, progress)
+        return progress
+
+    async def save_progress(self, chat_id: int, progress: dict[str, Any]):
+        if not self.shared:
+            self.cache.put(chat_id, progress)
+        await db.save_diagnostic_session(
+            chat_id,
+            progress.get("answers", []),
+            progress.get("question_id", ""),
+        )
+
+    async def clear_progress(self, chat_id: int):
+        self.cache.pop(chat_id)
+        await db.delete_diagnostic_session(chat_id)
+
+    async def _local_consulting(self) -> set[int]:
+        if self._consulting is None:
+            loaded = await db.load_consultation_chats()
+            # Concurrent first calls all load; keep the set the first one stored,
+            # which may already have chats added since.
+            if self._consulting is None:
+                self._consulting = loaded
+        return self._consulting
+
+    async def is_consulting(self, chat_id: int) -> bool:
+        if self.shared:
+            return await db.is_consultation_active(chat_id)
+        return chat_id in await self._local_consulting()
+
+    async def set_consulting(self, chat_id: int, active: bool):
+        if self.shared:
+            # Reads do not block under WAL, so avoid a write when leaving a mode
+            # the chat is not in.
+            if active or await db.is_consultation_active(chat_id):
+                await db.set_consultation_active(chat_id, active)
+            return
+        # Nearly every menu tap leaves consultation mode; skip the write when
+        # nothing changes.
+        consulting = await self._local_consulting()
+        if (chat_id in consulting) == active:
+            return
+        await db.set_consultation_active(chat_id, active)
+        if active:
+            consulting.add(chat_id)
+        else:
+            consulting.discard(chat_id)
+
+
+def create_store(backend: str) -> StateStore:
+    if backend == "memory":
+        return MemoryStateStore()
+    return SqliteStateStore(shared=backend == "shared")
+
+
+_store: StateStore | None = None
+
+
+def get_store() -> StateStore:
+    global _store
+    if _store is None:
+        _store = create_store(get_state_backend())
+    return _store
+
+
+def session_cache_stats() -> dict[str, int]:
+    """``SessionCache.stats()`` of the current store; zeros without a cache."""
+    cache = getattr(_store, "cache", None)
+    if cache is None:
+        return {"size": 0, "hits": 0, "misses": 0, "evictions": 0}
+    return cache.stats()
+
+
+def set_store(store: StateStore | None):
+    global _store
+    _store = store
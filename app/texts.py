@@ -1,10 +1,16 @@
 import json
+import threading
+from dataclasses import dataclass
 from pathlib import Path
+from app.diagnostics_snapshot import load_sources, refresh_sources
+from app.file_cache import CachedFile
 from app.paths import DATA_DIR
 
 TEXTS_PATH = DATA_DIR / "texts.json"
 FILES_PATH = DATA_DIR / "files.json"
-DIAGNOSTICS_SNAPSHOT_PATH = DATA_DIR / "diagnostics_snapshot.json"
+# Copy edits show up within this many seconds without a restart.
+TEXTS_CHECK_INTERVAL = 1.0
+BUTTON_PREFIX = "button_"
 
 
 def load_json(path: Path) -> dict:
@@ -15,37 +21,90 @@ def load_json(path: Path) -> dict:
     return {str(k): v for k, v in data.items()}
 
 
-TEXTS = load_json(TEXTS_PATH)
-FILES = load_json(FILES_PATH)
+@dataclass(frozen=True)
+class TextRegistry:
+    """One consistent version of texts, file IDs and the button lookup table."""
+
+    version: int
+    texts: dict
+    files: dict
+    # button label -> button key, e.g. "💆‍♀️ Услуги" -> "services"
+    buttons: dict[str, str]
+
+
+def _build_registry(version: int, texts: dict, files: dict) -> TextRegistry:
+    buttons = {
+        label.strip(): key[len(BUTTON_PREFIX):]
+        for key, label in texts.items()
+        if key.startswith(BUTTON_PREFIX) and isinstance(label, str)
+    }
+    return TextRegistry(version=version, texts=texts, files=files, buttons=buttons)
+
+
+_TEXTS_FILE = CachedFile(TEXTS_PATH, load_json, TEXTS_CHECK_INTERVAL)
+_FILES_FILE = CachedFile(FILES_PATH, load_json, TEXTS_CHECK_INTERVAL)
+_registry_lock = threading.Lock()
+_registry = _build_registry(1, _TEXTS_FILE.get(), _FILES_FILE.get())
+
+
+def registry() -> TextRegistry:
+    """Current registry; rebuilt and swapped in whole when a source file changes."""
+    global _registry
+    texts, files = _TEXTS_FILE.get(), _FILES_FILE.get()
+    current = _registry
+    if texts is not current.texts or files is not current.files:
+        with _registry_lock:
+            current = _registry
+            if texts is not current.texts or files is not current.files:
+                current = _build_registry(current.version + 1, texts, files)
+                _registry = current
+    return current
+
+
+def texts_version() -> int:
+    return registry().version
 
 
 def text(key: str) -> str:
-    return TEXTS.get(key, f"[no text: {key}]")
+    return registry().texts.get(key, f"[no text: {key}]")
 
 
 def button(key: str) -> str:
-    return TEXTS.get(f"button_{key}", f"[no button: {key}]")
+    return registry().texts.get(f"{BUTTON_PREFIX}{key}", f"[no button: {key}]")
+
+
+def button_key(label: str | None) -> str | None:
+    """Key of the button whose current label is ``label``, if any."""
+    if label is None:
+        return None
+    return registry().buttons.get(label.strip())
 
 
 def file(key: str) -> str:
-    return FILES.get(key, f"[no file: {key}]")
+    return registry().files.get(key, f"[no file: {key}]")
 
 
 def files(key: str) -> list[str]:
-    return FILES.get(key, [])
+    return registry().files.get(key, [])
+
+
+def snapshot_version() -> int:
+    """Counter that changes every time a new snapshot is picked up from disk."""
+    return load_sources().version
 
 
 def load_test_config() -> dict:
-    if not DIAGNOSTICS_SNAPSHOT_PATH.exists():
-        return {"start": None, "questions": {}}
+    # The snapshot is read once per published version; afterwards a call costs a
+    # few stat() calls. The returned structures are shared and must not be mutated.
+    return _test_config(load_sources().questions)
+
+
+async def load_test_config_async() -> dict:
+    """``load_test_config()`` for handlers: a new snapshot is read off the loop."""
+    return _test_config((await refresh_sources()).questions)
 
-    try:
-        with DIAGNOSTICS_SNAPSHOT_PATH.open(encoding="utf-8") as f:
-            snapshot = json.load(f)
-    except (json.JSONDecodeError, OSError):
-        return {"start": None, "questions": {}}
 
-    data = snapshot.get("questions", {})
+def _test_config(data: dict) -> dict:
     return {
         "start": data.get("start"),
         "questions": data.get("questions", {}),
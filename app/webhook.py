@@ -0,0 +1,53 @@
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from app.config import WebhookSettings
+
+
+def build_webhook_app(
+    bot: Bot,
+    dp: Dispatcher,
+    settings: WebhookSettings,
+    handle_in_background: bool = True,
+) -> web.Application:
+    """aiohttp application that feeds Telegram webhook requests into ``dp``.
+
+    Requests without the matching ``X-Telegram-Bot-Api-Secret-Token`` header are
+    rejected with 401, so a recorded update can be replayed locally only with the
+    configured secret.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=handle_in_background,
+        secret_token=settings.secret_token,
+    ).register(app, path=settings.path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, settings: WebhookSettings):
+    async def register_webhook(bot: Bot):
+        await bot.set_webhook(
+            settings.url,
+            secret_token=settings.secret_token,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logging.info("Webhook registered at %s", settings.url)
+
+    dp.startup.register(register_webhook)
+    runner = web.AppRunner(build_webhook_app(bot, dp, settings))
+    await runner.setup()
+    site = web.TCPSite(runner, settings.host, settings.port)
+    await site.start()
+    logging.info("Listening for webhook updates on %s:%s%s",
+                 settings.host, settings.port, settings.path)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,248 @@
+"""Micro-benchmarks of the diagnostics engine.
+
+Runs every case on the published sources and on synthetic, scaled copies:
+
+- ``tree xN`` — a new first question whose N answers lead into N renamed copies
+  of the question tree, i.e. N times the questions, options and paths;
+- ``rules xN`` — every rule repeated N times; the copies never match (an extra
+  ``answers_all`` condition that no path satisfies, checked after all the
+  others), so results stay the same while every path evaluates N times the
+  rules.
+
+Cases: compiling the sources, ``analyze_answers_with_sources`` and
+``build_recommendation_with_sources`` (both compile on every call),
+analysis, rendering and memoized recommendation on an already compiled
+instance, ``enumerate_paths`` and ``validate_sources``. Timing is
+``timeit``-style: each case is repeated in batches sized to take about
+``--batch-seconds`` and the median and best batches are reported per call.
+Only local files are read, no network or Telegram credentials are needed.
+
+    python benchmarks/bench_diagnostics.py --scale 10 --json > diagnostics.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from app.diagnostics import (  # noqa: E402
+    analyze_answers_with_sources,
+    build_recommendation_with_sources,
+    compile_diagnostics,
+    render_recommendation,
+)
+from app.diagnostics_snapshot import read_json_sources  # noqa: E402
+from app.diagnostics_validation import enumerate_paths, validate_sources  # noqa: E402
+
+Sources = tuple[dict[str, Any], dict[str, Any], dict[str, Any], dict[str, Any]]
+
+SAMPLE_PATHS = 200
+
+
+def load_real_sources() -> Sources:
+    sources = read_json_sources()
+    return sources.questions, sources.factors, sources.rules, sources.content
+
+
+def scale_tree(sources: Sources, copies: int) -> Sources:
+    questions_config, factors, rules, content = sources
+    questions = questions_config["questions"]
+    answers = factors.get("answers", {})
+    scaled_questions: dict[str, Any] = {
+        "root": {
+            "text": "Какая копия дерева?",
+            "options": [
+                {
+                    "id": f"root.{copy}",
+                    "text": f"копия {copy}",
+                    "next": f"{questions_config['start']}~{copy}",
+                }
+                for copy in range(copies)
+            ],
+        }
+    }
+    scaled_answers: dict[str, Any] = {f"root.{copy}": {} for copy in range(copies)}
+    for copy in range(copies):
+
+        def renamed(question_id: str) -> str:
+            return question_id if question_id == "advice" else f"{question_id}~{copy}"
+
+        for question_id, question in questions.items():
+            scaled_questions[f"{question_id}~{copy}"] = {
+                **question,
+                "options": [
+                    {
+                        **option,
+                        "id": f"{option['id']}~{copy}",
+                        "next": renamed(option["next"]),
+                    }
+                    for option in question.get("options", [])
+                ],
+            }
+        for answer_id, factor in answers.items():
+            scaled_answers[f"{answer_id}~{copy}"] = factor
+    return (
+        {"start": "root", "questions": scaled_questions},
+        {**factors, "answers": scaled_answers},
+        rules,
+        content,
+    )
+
+
+def scale_rules(sources: Sources, copies: int) -> Sources:
+    questions_config, factors, rules_config, content = sources
+    rules = list(rules_config.get("rules", []))
+    for copy in range(1, copies):
+        for rule in rules_config.get("rules", []):
+            conditions = {**rule.get("conditions", {}), "answers_all": [f"never~{copy}"]}
+            rules.append({**rule, "conditions": conditions})
+    return questions_config, factors, {**rules_config, "rules": rules}, content
+
+
+def _time(func: Callable[[], Any], number: int) -> float:
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - started
+
+
+def measure(func: Callable[[], Any], repeat: int, batch_seconds: float) -> dict[str, float]:
+    """Per-call microseconds: median and best of ``repeat`` batches.
+
+    The batch size grows 1, 2, 5, 10, 20, ... like ``timeit`` autorange until a
+    batch takes ``batch_seconds``.
+    """
+    for number in (base * 10**power for power in range(7) for base in (1, 2, 5)):
+        elapsed = _time(func, number)
+        if elapsed >= batch_seconds:
+            break
+    samples = [elapsed / number]
+    samples.extend(_time(func, number) / number for _ in range(repeat - 1))
+    return {
+        "median_us": round(statistics.median(samples) * 1e6, 2),
+        "min_us": round(min(samples) * 1e6, 2),
+        "calls_per_batch": number,
+    }
+
+
+def run_dataset(
+    name: str,
+    sources: Sources,
+    repeat: int,
+    batch_seconds: float,
+    seed: int,
+    cases: set[str] | None,
+) -> dict:
+    questions_config, factors, rules, content = sources
+    paths = enumerate_paths(questions_config)
+    sample = random.Random(seed).sample(paths, min(SAMPLE_PATHS, len(paths)))
+    compiled = compile_diagnostics(factors, rules, content)
+    results_cache = [compiled.analyze(path) for path in sample]
+    cursor = {"index": 0}
+
+    def next_path() -> list[str]:
+        index = cursor["index"] = (cursor["index"] + 1) % len(sample)
+        return sample[index]
+
+    def warm_recommend():
+        compiled.recommend(next_path())
+
+    def render():
+        index = cursor["index"] = (cursor["index"] + 1) % len(sample)
+        render_recommendation(results_cache[index], content)
+
+    all_cases: dict[str, Callable[[], Any]] = {
+        "compile_diagnostics": lambda: compile_diagnostics(factors, rules, content),
+        "analyze_answers_with_sources": lambda: analyze_answers_with_sources(
+            next_path(), factors, rules, content
+        ),
+        "build_recommendation_with_sources": lambda: build_recommendation_with_sources(
+            next_path(), factors, rules, content
+        ),
+        "compiled.analyze": lambda: compiled.analyze(next_path()),
+        "render_recommendation": render,
+        "compiled.recommend (memoized)": warm_recommend,
+        "enumerate_paths": lambda: enumerate_paths(questions_config),
+        "validate_sources": lambda: validate_sources(questions_config, factors, rules, content),
+    }
+    report = validate_sources(questions_config, factors, rules, content)
+    return {
+        "dataset": name,
+        "questions": len(questions_config["questions"]),
+        "options": sum(len(q.get("options", [])) for q in questions_config["questions"].values()),
+        "rules": len(rules.get("rules", [])),
+        "paths": len(paths),
+        "valid": report.ok,
+        "cases": {
+            case: measure(func, repeat, batch_seconds)
+            for case, func in all_cases.items()
+            if cases is None or case in cases
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=10, help="Copies for the scaled datasets")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed batches per case")
+    parser.add_argument("--batch-seconds", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--case", action="append", help="Only run this case; repeat for several"
+    )
+    parser.add_argument(
+        "--dataset", action="append", choices=("real", "tree", "rules"),
+        help="Only run this dataset; repeat for several (default: all)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    real = load_real_sources()
+    datasets = {
+        "real": lambda: real,
+        "tree": lambda: scale_tree(real, args.scale),
+        "rules": lambda: scale_rules(real, args.scale),
+    }
+    labels = {"real": "real", "tree": f"tree x{args.scale}", "rules": f"rules x{args.scale}"}
+    selected = args.dataset or list(datasets)
+    cases = set(args.case) if args.case else None
+    results = [
+        run_dataset(labels[name], datasets[name](), args.repeat, args.batch_seconds, args.seed, cases)
+        for name in selected
+    ]
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "timestamp": int(time.time()),
+                    "results": results,
+                },
+                ensure_ascii=False,
+                indent=2,
+            )
+        )
+        return 0
+    for result in results:
+        print(
+            f"{result['dataset']}: {result['questions']} questions, {result['options']} options, "
+            f"{result['rules']} rules, {result['paths']} paths"
+            + ("" if result["valid"] else " (validation fails)")
+        )
+        for case, timing in result["cases"].items():
+            print(f"  {case:<36}{timing['median_us']:>14,.1f} µs  (min {timing['min_us']:,.1f})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""Micro-benchmark for reply-button routing.
+
+Compares the old layout (one ``F.text == label`` handler per button, checked
+one after another) with the dispatch table behind ``ButtonFilter()``. Handlers
+are no-ops, so the numbers are pure aiogram routing overhead per update.
+
+    python benchmarks/bench_routing.py --updates 20000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from aiogram import Bot, Dispatcher, F, Router  # noqa: E402
+from aiogram.dispatcher.event.bases import SkipHandler  # noqa: E402
+from aiogram.types import Chat, Message, Update, User  # noqa: E402
+
+import app.const as const  # noqa: E402
+from app.filters import ButtonFilter  # noqa: E402
+from app.texts import button  # noqa: E402
+
+KEYS = (
+    const.CLIENT,
+    const.MASTER,
+    const.SERVICES,
+    const.KERATIN,
+    const.BOTOX,
+    const.NANOPLASTIC,
+    const.PRICE,
+    const.REVIEWS,
+    const.SIGNING,
+    const.CONSULTING,
+    const.TEST,
+)
+
+
+async def _noop(message: Message, **kwargs):
+    return None
+
+
+def legacy_router() -> Router:
+    router = Router()
+    for key in KEYS:
+        router.message(F.text == button(key), ~F.reply_to_message)(_noop)
+    router.message(F.text)(_noop)
+    return router
+
+
+def table_router() -> Router:
+    router = Router()
+    actions = {key: _noop for key in KEYS}
+
+    @router.message(ButtonFilter(), ~F.reply_to_message)
+    async def message_button(message: Message, button: str):
+        action = actions.get(button)
+        if action is None:
+            raise SkipHandler()
+        await action(message)
+
+    router.message(F.text)(_noop)
+    return router
+
+
+def make_update(update_id: int, message_text: str) -> Update:
+    user = User(id=1, is_bot=False, first_name="Bench")
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=1, type="private"),
+            from_user=user,
+            text=message_text,
+        ),
+    )
+
+
+async def measure(router: Router, message_text: str, updates: int) -> float:
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    bot = Bot("42:TEST")
+    batch = [make_update(index, message_text) for index in range(updates)]
+    try:
+        started = time.perf_counter()
+        for update in batch:
+            await dispatcher.feed_update(bot, update)
+        elapsed = time.perf_counter() - started
+    finally:
+        await bot.session.close()
+    return elapsed / updates * 1_000_000
+
+
+async def run(updates: int) -> None:
+    cases = {
+        "first button": button(KEYS[0]),
+        "last button": button(KEYS[-1]),
+        "free text": "Подскажите, пожалуйста",
+    }
+    print(f"{'case':<14}{'legacy, µs':>12}{'table, µs':>12}")
+    for name, message_text in cases.items():
+        legacy = await measure(legacy_router(), message_text, updates)
+        table = await measure(table_router(), message_text, updates)
+        print(f"{name:<14}{legacy:>12.1f}{table:>12.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20000, help="Updates per case")
+    args = parser.parse_args()
+    asyncio.run(run(args.updates))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,101 @@
+"""Load time of the published diagnostics data: JSON sources vs. the compiled artifact.
+
+``json`` parses the snapshot, factors and rules files; ``artifact`` reads the
+compiled file, checks its header, checksum and the sources' stat stamps and
+unmarshals it.
+Both read fresh copies in a temporary directory. ``--scale N`` repeats every
+question, module and rule N times (with new IDs) to model larger content.
+
+    python benchmarks/bench_snapshot_load.py --scale 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from app.diagnostics_snapshot import (  # noqa: E402
+    SOURCE_PATHS,
+    read_json_sources,
+    read_sources,
+    write_artifact,
+)
+
+
+def _scaled(mapping: dict, scale: int) -> dict:
+    result = dict(mapping)
+    for copy in range(1, scale):
+        for key, value in mapping.items():
+            result[f"{key}~{copy}"] = value
+    return result
+
+
+def _scale_source(data: dict, scale: int) -> dict:
+    data = dict(data)
+    for key, value in data.items():
+        if isinstance(value, dict):
+            data[key] = _scale_source(value, scale) if key in ("questions", "content") else _scaled(value, scale)
+        elif isinstance(value, list):
+            data[key] = value * scale
+    return data
+
+
+def prepare(directory: Path, scale: int) -> tuple[Path, tuple[Path, ...]]:
+    source_paths = tuple(directory / path.name for path in SOURCE_PATHS)
+    for source, target in zip(SOURCE_PATHS, source_paths):
+        data = json.loads(source.read_text(encoding="utf-8"))
+        if scale > 1:
+            data = _scale_source(data, scale)
+        target.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    artifact_path = directory / "diagnostics_compiled.bin"
+    write_artifact(artifact_path, source_paths)
+    return artifact_path, source_paths
+
+
+def timeit(load, repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        load()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="Content size multiplier")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        artifact_path, source_paths = prepare(Path(temp_dir), args.scale)
+        sources = read_sources(artifact_path=artifact_path, source_paths=source_paths)
+        assert sources.origin == "artifact"
+        assert sources.content == read_json_sources(source_paths).content
+        size_json = sum(path.stat().st_size for path in source_paths)
+        size_artifact = artifact_path.stat().st_size
+        cases = {
+            "json": lambda: read_json_sources(source_paths),
+            "artifact": lambda: read_sources(artifact_path=artifact_path, source_paths=source_paths),
+        }
+        print(f"scale {args.scale}: JSON {size_json / 1024:.0f} KiB, artifact {size_artifact / 1024:.0f} KiB")
+        results = {name: timeit(load, args.repeat) for name, load in cases.items()}
+    for name, samples in results.items():
+        print(
+            f"  {name:<9} median {statistics.median(samples):7.2f} ms"
+            f"  min {min(samples):7.2f} ms"
+        )
+    speedup = statistics.median(results["json"]) / statistics.median(results["artifact"])
+    print(f"  artifact is {speedup:.1f}x faster")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+"""Cold-start benchmark based on ``python -X importtime``.
+
+Every run is a fresh interpreter, so nothing is shared between samples:
+
+- ``bot`` imports ``main`` and builds the dispatcher with all routers, i.e.
+  everything a webhook worker does before it can handle its first update;
+- ``tooling`` runs ``scripts/manage_diagnostics_content.py --help``.
+
+Reports the median wall time, the part spent importing this project's own
+modules and the slowest imports overall.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+
+BOT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.build_dispatcher()
+ready = time.perf_counter()
+print(json.dumps({"import": imported - started, "ready": ready - started}))
+"""
+
+TOOLING_SCRIPT = """
+import json, runpy, sys, time
+started = time.perf_counter()
+sys.argv = ["manage_diagnostics_content.py", "--help"]
+try:
+    runpy.run_path("scripts/manage_diagnostics_content.py", run_name="__main__")
+except SystemExit:
+    pass
+ready = time.perf_counter()
+print(json.dumps({"ready": ready - started}))
+"""
+
+# import time:       self [us] |   cumulative | imported package
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def own_module(name: str) -> bool:
+    return name == "main" or name.startswith(("app.", "scripts"))
+
+
+def run_once(script: str) -> tuple[dict[str, float], dict[str, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=ROOT_DIR,
+        env={**os.environ, "PYTHONPATH": str(ROOT_DIR)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    self_us: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us[match.group(4)] = int(match.group(1))
+    return timings, self_us
+
+
+def measure(name: str, script: str, runs: int, top: int) -> dict:
+    walls: dict[str, list[float]] = defaultdict(list)
+    own: list[float] = []
+    self_samples: dict[str, list[int]] = defaultdict(list)
+    for _ in range(runs):
+        timings, self_us = run_once(script)
+        for key, value in timings.items():
+            walls[key].append(value * 1000)
+        own.append(sum(us for module, us in self_us.items() if own_module(module)) / 1000)
+        for module, us in self_us.items():
+            self_samples[module].append(us)
+    slowest = sorted(
+        ((statistics.median(samples) / 1000, module) for module, samples in self_samples.items()),
+        reverse=True,
+    )[:top]
+    return {
+        "case": name,
+        "runs": runs,
+        **{f"{key}_ms": round(statistics.median(values), 1) for key, values in walls.items()},
+        "own_modules_ms": round(statistics.median(own), 1),
+        "slowest_imports_ms": {module: round(ms, 1) for ms, module in slowest},
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per case")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument("--case", choices=("bot", "tooling", "all"), default="all")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    cases = {"bot": BOT_SCRIPT, "tooling": TOOLING_SCRIPT}
+    names = list(cases) if args.case == "all" else [args.case]
+    results = [measure(name, cases[name], args.runs, args.top) for name in names]
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0
+    for result in results:
+        print(f"{result['case']}: median of {result['runs']} runs")
+        for key in ("import_ms", "ready_ms", "own_modules_ms"):
+            if key in result:
+                print(f"  {key:<16}{result[key]:>10.1f}")
+        print("  slowest imports (self time, ms):")
+        for module, ms in result["slowest_imports_ms"].items():
+            print(f"    {ms:>8.1f}  {module}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,382 @@
+"""Offline load test: synthetic updates through the real Dispatcher.
+
+Builds the dispatcher with ``main.build_dispatcher()`` (all routers and
+middlewares) on a scratch SQLite database and feeds it updates from many
+simulated users at once:
+
+- ``menu`` — reply-keyboard taps of the client menu;
+- ``quiz`` — the diagnostic test along a random path from ``enumerate_paths``;
+- ``consultation`` — opening a consultation and writing questions to the admin.
+
+Each user sends its updates one after another, like a real chat; ``--users``
+users run concurrently. Bot API calls go to an in-process session that
+serializes every request like ``AiohttpSession`` and answers it at once (or
+after ``--api-latency`` ms), so the numbers show the bot's own cost.
+
+Reports updates per second, p50/p95/p99 latency of ``feed_update`` per scenario,
+Bot API calls and database writes. With ``--max-p95-ms`` / ``--min-rps`` it
+exits with 1 when the run is slower, which makes it usable as a regression gate:
+
+    python benchmarks/load_test.py --updates 5000 --users 100 --max-p95-ms 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.methods import TelegramMethod  # noqa: E402
+from aiogram.types import CallbackQuery, Chat, Message, Update, User  # noqa: E402
+
+import app.const as const  # noqa: E402
+import app.db as db  # noqa: E402
+import main  # noqa: E402
+from app.diagnostics_validation import enumerate_paths  # noqa: E402
+from app.metrics import DB_SECONDS  # noqa: E402
+from app.texts import button, load_test_config  # noqa: E402
+
+TOKEN = "42:LOAD"
+BOT_USER_ID = 42
+ADMIN_CHAT_ID = -100
+SCENARIOS = ("menu", "quiz", "consultation")
+MENU_KEYS = (
+    const.CLIENT,
+    const.SERVICES,
+    const.KERATIN,
+    const.BOTOX,
+    const.NANOPLASTIC,
+    const.PRICE,
+    const.SIGNING,
+    const.MASTER,
+)
+# Functions of app.db that write; everything else only reads.
+WRITE_PREFIXES = ("save_", "set_", "delete_", "create_", "finish_", "ActivityLog.")
+
+
+class LoadTestSession(AiohttpSession):
+    """Bot API session that builds each request but answers it locally."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self._message_ids = itertools.count(1)
+
+    def _message(self, chat_id: Any, **fields) -> dict:
+        chat_id = int(chat_id) if str(chat_id).lstrip("-").isdigit() else 0
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(datetime.now(timezone.utc).timestamp()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            **fields,
+        }
+
+    def _result(self, method: TelegramMethod) -> Any:
+        name = method.__api_method__
+        chat_id = getattr(method, "chat_id", 0)
+        if name == "copyMessage":
+            return {"message_id": next(self._message_ids)}
+        if name == "sendMediaGroup":
+            return [self._photo_message(chat_id) for _ in method.media]
+        if name in ("sendPhoto",):
+            return self._photo_message(chat_id)
+        if name.startswith(("send", "forward", "edit")):
+            return self._message(chat_id, text=getattr(method, "text", None) or "")
+        return True
+
+    def _photo_message(self, chat_id: Any) -> dict:
+        file_id = f"photo{next(self._message_ids)}"
+        return self._message(
+            chat_id,
+            photo=[{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}],
+        )
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None):
+        self.build_form_data(bot=bot, method=method)
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = self.check_response(
+            bot=bot,
+            method=method,
+            status_code=200,
+            content=json.dumps({"ok": True, "result": self._result(method)}),
+        )
+        return response.result
+
+
+class UpdateFactory:
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1_000_000)
+        self.bot_user = User(id=BOT_USER_ID, is_bot=True, first_name="Bot")
+
+    @staticmethod
+    def user(user_id: int) -> User:
+        return User(id=user_id, is_bot=False, first_name="Load", username=f"user{user_id}")
+
+    def message(self, user_id: int, text: str) -> Update:
+        return Update(
+            update_id=next(self._update_ids),
+            message=Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=user_id, type="private"),
+                from_user=self.user(user_id),
+                text=text,
+            ),
+        )
+
+    def callback(self, user_id: int, data: str) -> Update:
+        return Update(
+            update_id=next(self._update_ids),
+            callback_query=CallbackQuery(
+                id=str(next(self._update_ids)),
+                from_user=self.user(user_id),
+                chat_instance=str(user_id),
+                data=data,
+                message=Message(
+                    message_id=next(self._message_ids),
+                    date=datetime.now(),
+                    chat=Chat(id=user_id, type="private"),
+                    from_user=self.bot_user,
+                    text="question",
+                ),
+            ),
+        )
+
+
+def menu_updates(factory: UpdateFactory, user_id: int, rng: random.Random) -> Iterator[Update]:
+    yield factory.message(user_id, "/start")
+    for key in rng.choices(MENU_KEYS, k=rng.randint(3, 8)):
+        yield factory.message(user_id, button(key))
+
+
+def quiz_updates(
+    factory: UpdateFactory, user_id: int, rng: random.Random, paths: list[list[str]]
+) -> Iterator[Update]:
+    config = load_test_config()
+    questions = config["questions"]
+    yield factory.message(user_id, button(const.TEST))
+    question_id = config["start"]
+    for answer_id in rng.choice(paths):
+        option = next(
+            item for item in questions[question_id]["options"] if item["id"] == answer_id
+        )
+        yield factory.callback(user_id, f"{const.TEST}:{answer_id}:{option['next']}")
+        question_id = option["next"]
+
+
+def consultation_updates(
+    factory: UpdateFactory, user_id: int, rng: random.Random
+) -> Iterator[Update]:
+    yield factory.message(user_id, button(const.CONSULTING))
+    for number in range(rng.randint(1, 4)):
+        yield factory.message(user_id, f"Вопрос {number + 1}: подойдет ли кератин?")
+
+
+def build_sessions(
+    scenarios: tuple[str, ...], updates: int, seed: int
+) -> list[tuple[str, list[Update]]]:
+    rng = random.Random(seed)
+    factory = UpdateFactory()
+    paths = enumerate_paths(load_test_config())
+    sessions: list[tuple[str, list[Update]]] = []
+    total = 0
+    for user_id in itertools.count(10_000):
+        if total >= updates:
+            break
+        scenario = scenarios[len(sessions) % len(scenarios)]
+        if scenario == "menu":
+            session = list(menu_updates(factory, user_id, rng))
+        elif scenario == "quiz":
+            session = list(quiz_updates(factory, user_id, rng, paths))
+        else:
+            session = list(consultation_updates(factory, user_id, rng))
+        sessions.append((scenario, session))
+        total += len(session)
+    return sessions
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    if len(samples) < 2:
+        value = samples[0] if samples else 0.0
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def db_call_counts() -> dict[str, int]:
+    return {key[0]: count for key, count in DB_SECONDS.counts().items()}
+
+
+async def run_load_test(
+    scenarios: tuple[str, ...],
+    updates: int,
+    users: int,
+    api_latency: float,
+    seed: int,
+) -> dict:
+    session = LoadTestSession(latency=api_latency)
+    bot = Bot(TOKEN, session=session)
+    dp = main.build_dispatcher()
+    sessions = build_sessions(scenarios, updates, seed)
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors = 0
+    queue: asyncio.Queue[tuple[str, list[Update]]] = asyncio.Queue()
+    for item in sessions:
+        queue.put_nowait(item)
+
+    async def simulated_user():
+        nonlocal errors
+        while not queue.empty():
+            scenario, chat_updates = queue.get_nowait()
+            for update in chat_updates:
+                started = time.perf_counter()
+                try:
+                    await dp.feed_update(bot, update)
+                except Exception:
+                    errors += 1
+                    logging.exception("Update %s failed", update.update_id)
+                latencies[scenario].append((time.perf_counter() - started) * 1000)
+
+    db_before = db_call_counts()
+    changes_before = db.get_connection().total_changes
+    started = time.perf_counter()
+    await asyncio.gather(*(simulated_user() for _ in range(max(1, users))))
+    elapsed = time.perf_counter() - started
+    await db.flush_activity()
+    changes = db.get_connection().total_changes - changes_before
+    db_calls = {
+        name: count - db_before.get(name, 0)
+        for name, count in db_call_counts().items()
+        if count - db_before.get(name, 0)
+    }
+    await bot.session.close()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "updates": len(all_latencies),
+        "users": users,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(len(all_latencies) / elapsed, 1),
+        "latency_ms": {k: round(v, 2) for k, v in percentiles(all_latencies).items()},
+        "scenarios": {
+            scenario: {
+                "updates": len(values),
+                **{k: round(v, 2) for k, v in percentiles(values).items()},
+            }
+            for scenario, values in sorted(latencies.items())
+        },
+        "api_calls": dict(session.calls.most_common()),
+        "db_writes": sum(
+            count for name, count in db_calls.items() if name.startswith(WRITE_PREFIXES)
+        ),
+        "db_rows_changed": changes,
+        "db_calls": dict(sorted(db_calls.items())),
+    }
+
+
+def print_report(result: dict):
+    print(
+        f"{result['updates']} updates from {result['users']} concurrent users "
+        f"in {result['seconds']:.2f} s: {result['updates_per_second']:.0f} updates/s, "
+        f"{result['errors']} errors"
+    )
+    latency = result["latency_ms"]
+    print(
+        f"latency, ms: p50 {latency['p50']:.2f}  p95 {latency['p95']:.2f}  "
+        f"p99 {latency['p99']:.2f}"
+    )
+    print(f"  {'scenario':<14}{'updates':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for scenario, stats in result["scenarios"].items():
+        print(
+            f"  {scenario:<14}{stats['updates']:>8}"
+            f"{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}"
+        )
+    print("Bot API calls: " + ", ".join(f"{k} {v}" for k, v in result["api_calls"].items()))
+    print(
+        f"DB: {result['db_writes']} write calls, {result['db_rows_changed']} rows changed"
+    )
+    for name, count in result["db_calls"].items():
+        print(f"  {name:<32}{count:>8}")
+
+
+async def amain(args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original_db_path = db.DB_PATH
+        db.DB_PATH = Path(temp_dir) / "load.db"
+        await db.init_db()
+        try:
+            return await run_load_test(
+                tuple(args.scenario),
+                args.updates,
+                args.users,
+                args.api_latency / 1000,
+                args.seed,
+            )
+        finally:
+            await db.close_db()
+            db.DB_PATH = original_db_path
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=2000, help="Updates to feed, at least")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent simulated users")
+    parser.add_argument(
+        "--scenario", action="append", choices=SCENARIOS,
+        help="Scenario to run; repeat for several (default: all)",
+    )
+    parser.add_argument(
+        "--api-latency", type=float, default=0.0, help="Simulated Bot API round trip, ms"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--max-p95-ms", type=float, help="Fail if p95 latency is higher")
+    parser.add_argument("--min-rps", type=float, help="Fail if throughput is lower")
+    args = parser.parse_args()
+    args.scenario = args.scenario or list(SCENARIOS)
+
+    # The admin chat receives forwarded consultation questions.
+    os.environ.setdefault("ADMIN_CHAT_ID", str(ADMIN_CHAT_ID))
+    os.environ.setdefault("STATE_BACKEND", "sqlite")
+    logging.getLogger().setLevel(logging.WARNING)
+    result = asyncio.run(amain(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+
+    failures = []
+    if result["errors"]:
+        failures.append(f"{result['errors']} updates failed")
+    if args.max_p95_ms is not None and result["latency_ms"]["p95"] > args.max_p95_ms:
+        failures.append(f"p95 {result['latency_ms']['p95']:.2f} ms > {args.max_p95_ms} ms")
+    if args.min_rps is not None and result["updates_per_second"] < args.min_rps:
+        failures.append(f"{result['updates_per_second']} updates/s < {args.min_rps}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
@@ -1,21 +1,139 @@
 import asyncio
 import logging
+import signal
 from aiogram import Bot, Dispatcher
 import app.db as db
-from app.config import get_bot_token
-from app.handlers import router as main_router
-from app.handlers_test import router as test_router
+from app.config import (
+    get_admin_chat_id,
+    get_bot_mode,
+    get_bot_token,
+    get_metrics_address,
+    get_outbound_admin_rate,
+    get_outbound_global_rate,
+    get_slow_callback_threshold,
+    get_updates_concurrency_limit,
+    get_webhook_settings,
+)
+import app.metrics as metrics
+from app.middlewares import ChatOrderMiddleware, HandlerMetricsMiddleware
+from app.outbound import BotApiMetrics, OutboundLimiter
+from app.profiling import SlowCallbackMonitor, start_profile_on_signal
+from app.recommendations import shutdown_executor
+from app.state import session_cache_stats
 
 logging.basicConfig(level=logging.INFO)
 
 
-async def main():
-    bot = Bot(token=get_bot_token())
+def build_dispatcher() -> Dispatcher:
+    # Routers pull in handlers, keyboards, texts and diagnostics, so they are
+    # imported here rather than when main.py is imported.
+    from app.handlers import router as main_router
+    from app.handlers_test import router as test_router
+
     dp = Dispatcher()
+    chat_order = ChatOrderMiddleware()
+    dp.update.outer_middleware(chat_order)
+    metrics.gauge(
+        "bot_active_chats", "Chats with an update running or waiting.",
+        lambda: chat_order.active_chats,
+    )
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
     dp.include_router(test_router)
     dp.include_router(main_router)
+    return dp
+
+
+def register_outbound_gauges(limiter: OutboundLimiter):
+    stats = limiter.stats
+    metrics.gauge(
+        "bot_outbound_queue_depth", "Sends waiting for the global rate limit.",
+        lambda: limiter.queue_depth,
+    )
+    metrics.gauge(
+        "bot_outbound_wait_seconds_max", "Longest rate-limit wait of a send.",
+        lambda: stats.wait_max,
+    )
+    metrics.gauge(
+        "bot_outbound_wait_seconds_avg", "Average rate-limit wait of a send.",
+        lambda: stats.wait_avg,
+    )
+    metrics.callback_counter(
+        "bot_outbound_retries", "Sends repeated after a flood wait.", lambda: stats.retries
+    )
+
+
+def register_cache_metrics():
+    from app.diagnostics import recommendation_cache_info
+
+    for name in ("hits", "misses", "evictions"):
+        metrics.callback_counter(
+            f"bot_session_cache_{name}",
+            f"Quiz session cache {name}.",
+            lambda name=name: session_cache_stats()[name],
+        )
+    metrics.gauge(
+        "bot_session_cache_size", "Quiz sessions held in memory.",
+        lambda: session_cache_stats()["size"],
+    )
+    metrics.callback_counter(
+        "bot_recommendation_cache_hits", "Diagnostic results served from the memo.",
+        lambda: recommendation_cache_info().hits,
+    )
+    metrics.callback_counter(
+        "bot_recommendation_cache_misses", "Diagnostic results rendered anew.",
+        lambda: recommendation_cache_info().misses,
+    )
+    metrics.gauge(
+        "bot_recommendation_cache_size", "Diagnostic results held in the memo.",
+        lambda: recommendation_cache_info().currsize,
+    )
+
+
+async def main():
+    mode = get_bot_mode()
+    webhook_settings = get_webhook_settings() if mode == "webhook" else None
+    # ADMIN_CHAT_ID is otherwise read on first use; fail at startup instead.
+    admin_chat_id = get_admin_chat_id()
+    metrics_address = get_metrics_address()
+    slow_callback_threshold = get_slow_callback_threshold()
+    bot = Bot(token=get_bot_token())
+    limiter = OutboundLimiter(
+        global_rate=get_outbound_global_rate(),
+        chat_rates={admin_chat_id: get_outbound_admin_rate() / 60},
+    )
+    bot.session.middleware(limiter)
+    # Inside the limiter, so queueing time is not counted as API latency.
+    bot.session.middleware(BotApiMetrics())
+    dp = build_dispatcher()
+    register_outbound_gauges(limiter)
+    register_cache_metrics()
     await db.init_db()
-    await dp.start_polling(bot)
+    # kill -USR1 <pid> captures a profile like /profile does.
+    if hasattr(signal, "SIGUSR1"):
+        start_profile_on_signal(asyncio.get_running_loop(), signal.SIGUSR1)
+    if slow_callback_threshold is not None:
+        SlowCallbackMonitor(slow_callback_threshold).install()
+    metrics_runner = None
+    try:
+        if metrics_address is not None:
+            metrics_runner = await metrics.start_metrics_server(*metrics_address)
+        if webhook_settings is not None:
+            # aiohttp.web is only needed to serve webhooks.
+            from app.webhook import run_webhook
+
+            await run_webhook(bot, dp, webhook_settings)
+        else:
+            # Polling is rejected by Telegram while a webhook is registered.
+            await bot.delete_webhook()
+            await dp.start_polling(
+                bot, tasks_concurrency_limit=get_updates_concurrency_limit()
+            )
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        shutdown_executor()
+        await db.close_db()
 
 
 if __name__ == "__main__":
@@ -8,13 +8,13 @@ import tempfile
 from collections import OrderedDict
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT_DIR))
 
-from app.diagnostics import build_recommendation_with_sources  # noqa: E402
-from app.diagnostics_validation import ValidationReport, validate_sources  # noqa: E402
+if TYPE_CHECKING:
+    from app.diagnostics_validation import ValidationReport
 
 DATA_DIR = ROOT_DIR / "data"
 DEFAULT_WORKBOOK = ROOT_DIR / "content" / "diagnostics-content.xlsx"
@@ -219,11 +219,16 @@ def compile_workbook(path: Path) -> tuple[dict[str, Any], dict[str, Any], list[s
     return content, questions_config, errors
 
 
-def validate_workbook(path: Path) -> tuple[ValidationReport, dict[str, Any], dict[str, Any]]:
+def validate_workbook(
+    path: Path, jobs: int = 1
+) -> tuple[ValidationReport, dict[str, Any], dict[str, Any]]:
+    # The diagnostics stack is imported only once a workbook has to be checked.
+    from app.diagnostics_validation import validate_sources
+
     content, questions, compile_errors = compile_workbook(path)
     factors = _load_json(DATA_DIR / "diagnostic_factors.json")
     rules = _load_json(DATA_DIR / "diagnostic_rules.json")
-    report = validate_sources(questions, factors, rules, content)
+    report = validate_sources(questions, factors, rules, content, jobs=jobs)
     report.errors[:0] = compile_errors
     return report, content, questions
 
@@ -252,14 +257,20 @@ def _print_report(report: ValidationReport) -> None:
         )
 
 
-def command_validate(path: Path) -> int:
-    report, _, _ = validate_workbook(path)
+def command_validate(path: Path, jobs: int = 1) -> int:
+    report, _, _ = validate_workbook(path, jobs)
     _print_report(report)
+    from app.diagnostics_snapshot import check_artifact
+
+    # Only reported: without a valid artifact the bot reads the JSON files.
+    problem = check_artifact()
+    if problem is not None:
+        print(f"ПРЕДУПРЕЖДЕНИЕ: опубликованный артефакт не используется ({problem}).")
     return 0 if report.ok else 1
 
 
-def command_preview(path: Path, answers_source: str | None) -> int:
-    report, content, _ = validate_workbook(path)
+def command_preview(path: Path, answers_source: str | None, jobs: int = 1) -> int:
+    report, content, _ = validate_workbook(path, jobs)
     _print_report(report)
     if not report.ok:
         return 1
@@ -270,13 +281,15 @@ def command_preview(path: Path, answers_source: str | None) -> int:
         if answers_source
         else ["1.4", "2.3", "3.4", "4.2", "6.2"]
     )
+    from app.diagnostics import build_recommendation_with_sources
+
     print("\n--- ПРЕДПРОСМОТР ---\n")
     print(build_recommendation_with_sources(answers, factors, rules, content))
     return 0
 
 
-def command_publish(path: Path) -> int:
-    report, content, questions = validate_workbook(path)
+def command_publish(path: Path, jobs: int = 1) -> int:
+    report, content, questions = validate_workbook(path, jobs)
     _print_report(report)
     if not report.ok:
         print("Публикация отменена: исправьте ошибки в таблице.")
@@ -288,6 +301,13 @@ def command_publish(path: Path) -> int:
         "content": content,
     }
     _atomic_json_write(DATA_DIR / "diagnostics_snapshot.json", snapshot)
+    # Written after the JSON: the artifact records stamps of the files on disk.
+    from app.diagnostics_snapshot import ARTIFACT_PATH, check_artifact, write_artifact
+
+    write_artifact(ARTIFACT_PATH)
+    problem = check_artifact(ARTIFACT_PATH)
+    if problem is not None:
+        raise RuntimeError(f"артефакт не прошел проверку: {problem}")
     print("Контент опубликован. Перезапуск бота не требуется для новых прохождений.")
     return 0
 
@@ -304,6 +324,12 @@ def main() -> int:
         "--answers",
         help="ID ответов для preview через запятую, например 1.1,2.1,3.1,4.1,5.1,8.4",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Число процессов для проверки путей; 0 — по числу ядер",
+    )
     args = parser.parse_args()
     path = args.workbook.resolve()
     if not path.exists():
@@ -311,10 +337,10 @@ def main() -> int:
         return 1
     try:
         if args.command == "validate":
-            return command_validate(path)
+            return command_validate(path, args.jobs)
         if args.command == "preview":
-            return command_preview(path, args.answers)
-        return command_publish(path)
+            return command_preview(path, args.answers, args.jobs)
+        return command_publish(path, args.jobs)
     except (OSError, ValueError, RuntimeError) as error:
         print(f"ОШИБКА: {error}")
         return 1
@@ -0,0 +1,73 @@
+"""Local stand-in for the Telegram Bot API used by tests.
+
+Serves ``/bot<token>/<method>`` over HTTP on localhost so a real ``Bot`` with
+an aiohttp session can talk to it. Every call is recorded; chats listed in
+``blocked`` get the same 403 Telegram returns for users who blocked the bot,
+chats in ``unavailable`` a 502 as during a Telegram outage.
+"""
+from __future__ import annotations
+
+import itertools
+from datetime import datetime, timezone
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+TOKEN = "42:TEST"
+
+
+class FakeBotApi:
+    def __init__(self):
+        self.calls: list[tuple[str, dict]] = []
+        self.blocked: set[int] = set()
+        self.unavailable: set[int] = set()
+        self._message_ids = itertools.count(1)
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._server = TestServer(app)
+
+    async def start(self):
+        await self._server.start_server()
+
+    async def close(self):
+        await self._server.close()
+
+    def bot(self, **kwargs) -> Bot:
+        api = TelegramAPIServer.from_base(str(self._server.make_url("")).rstrip("/"))
+        return Bot(TOKEN, session=AiohttpSession(api=api), **kwargs)
+
+    def sent_to(self, method: str = "sendMessage") -> list[int]:
+        return [int(params["chat_id"]) for name, params in self.calls if name == method]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls.append((method, params))
+        chat_id = int(params.get("chat_id", 0))
+        if chat_id in self.blocked:
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 403,
+                    "description": "Forbidden: bot was blocked by the user",
+                },
+                status=403,
+            )
+        if chat_id in self.unavailable:
+            return web.json_response(
+                {"ok": False, "error_code": 502, "description": "Bad Gateway"}, status=502
+            )
+        if method == "copyMessage":
+            return web.json_response(
+                {"ok": True, "result": {"message_id": next(self._message_ids)}}
+            )
+        result = {
+            "message_id": next(self._message_ids),
+            "date": int(datetime.now(timezone.utc).timestamp()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "text": params.get("text", ""),
+        }
+        return web.json_response({"ok": True, "result": result})
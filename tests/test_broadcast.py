@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import app.db as db
+from app.broadcast import run_broadcast
+from app.outbound import OutboundLimiter
+from tests.fake_bot_api import FakeBotApi
+
+
+def make_user(is_bot: bool = False) -> SimpleNamespace:
+    return SimpleNamespace(
+        first_name="Anna",
+        last_name=None,
+        username="anna",
+        is_bot=is_bot,
+        language_code="ru",
+    )
+
+
+class BroadcastTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_db_path = db.DB_PATH
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        await db.init_db()
+        for chat_id in range(1, 8):
+            await db.log_user(chat_id, make_user())
+        await db.log_user(100, make_user(is_bot=True))
+        await db.flush_activity()
+
+        self.api = FakeBotApi()
+        await self.api.start()
+        self.bot = self.api.bot()
+        self.bot.session.middleware(OutboundLimiter(global_rate=1000, chat_rate=1000))
+
+    async def asyncTearDown(self):
+        await self.bot.session.close()
+        await self.api.close()
+        await db.close_db()
+        db.DB_PATH = self.original_db_path
+        self.temp_dir.cleanup()
+
+    async def test_broadcast_reaches_every_user_and_marks_blocked_ones(self):
+        self.api.blocked.add(3)
+        broadcast_id = await db.create_broadcast("Новости салона")
+
+        counts = await run_broadcast(self.bot, broadcast_id, workers=3, page_size=2)
+
+        self.assertEqual(counts, {"sent": 6, "blocked": 1})
+        self.assertEqual(sorted(self.api.sent_to()), [1, 2, 3, 4, 5, 6, 7])
+        self.assertTrue(await db.is_user_blocked(3))
+        broadcast = await db.load_broadcast(broadcast_id)
+        self.assertEqual((broadcast["status"], broadcast["cursor"]), ("done", 7))
+
+        # The next broadcast skips the blocked user.
+        self.api.calls.clear()
+        await run_broadcast(self.bot, await db.create_broadcast("Еще новости"))
+        self.assertEqual(sorted(self.api.sent_to()), [1, 2, 4, 5, 6, 7])
+
+    async def test_interrupted_broadcast_resumes_without_duplicates(self):
+        broadcast_id = await db.create_broadcast("Новости салона")
+        # State left by a run that stopped during the second page.
+        await db.save_broadcast_delivery(broadcast_id, 1, "sent")
+        await db.save_broadcast_delivery(broadcast_id, 2, "sent")
+        await db.set_broadcast_cursor(broadcast_id, 2)
+        await db.save_broadcast_delivery(broadcast_id, 4, "sent")
+
+        counts = await run_broadcast(self.bot, broadcast_id, page_size=2)
+
+        self.assertEqual(sorted(self.api.sent_to()), [3, 5, 6, 7])
+        self.assertEqual(counts, {"sent": 7})
+
+    async def test_server_error_is_retried_on_resume(self):
+        self.api.unavailable.add(3)
+        broadcast_id = await db.create_broadcast("Новости салона")
+
+        counts = await run_broadcast(self.bot, broadcast_id, page_size=2)
+
+        self.assertEqual(counts, {"sent": 6, "retry": 1})
+        # Tried once with the page and once more after the last page.
+        self.assertEqual(self.api.sent_to().count(3), 2)
+        self.assertEqual((await db.load_broadcast(broadcast_id))["status"], "running")
+
+        self.api.unavailable.clear()
+        self.api.calls.clear()
+        counts = await run_broadcast(self.bot, broadcast_id, page_size=2)
+
+        self.assertEqual(self.api.sent_to(), [3])
+        self.assertEqual(counts, {"sent": 7})
+        self.assertEqual((await db.load_broadcast(broadcast_id))["status"], "done")
+
+    async def test_user_who_writes_again_is_unblocked(self):
+        await db.save_broadcast_delivery(await db.create_broadcast("x"), 3, "blocked")
+        self.assertTrue(await db.is_user_blocked(3))
+
+        await db.log_user(3, make_user())
+        await db.flush_activity()
+        self.assertFalse(await db.is_user_blocked(3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+from aiogram.types import Chat, Message, PhotoSize, User
+
+import app.const as const
+import app.db as db
+import app.handlers as handlers
+from app.state import MemoryStateStore, set_store
+from tests.fake_bot_api import FakeBotApi
+
+CLIENT_CHAT_ID = 501
+ADMIN_CHAT_ID = -100
+
+
+def make_message(bot, chat_id: int, message_id: int, **fields) -> Message:
+    return Message(
+        message_id=message_id,
+        date=datetime.now(),
+        chat=Chat(id=chat_id, type="private" if chat_id > 0 else "group"),
+        from_user=User(id=abs(chat_id), is_bot=False, first_name="Anna", username="anna"),
+        **fields,
+    ).as_(bot)
+
+
+class ConsultationTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        patcher = mock.patch.dict(vars(const), ADMIN_CHAT_ID=ADMIN_CHAT_ID)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_db_path = db.DB_PATH
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        await db.init_db()
+        self.store = MemoryStateStore()
+        set_store(self.store)
+        await self.store.set_consulting(CLIENT_CHAT_ID, True)
+
+        self.api = FakeBotApi()
+        await self.api.start()
+        self.bot = self.api.bot()
+
+    async def asyncTearDown(self):
+        await self.bot.session.close()
+        await self.api.close()
+        set_store(None)
+        await db.close_db()
+        db.DB_PATH = self.original_db_path
+        self.temp_dir.cleanup()
+
+    def admin_message_ids(self) -> list[int]:
+        # The fake API gives every call the next message ID, starting from 1.
+        return [
+            index
+            for index, (_, params) in enumerate(self.api.calls, start=1)
+            if int(params["chat_id"]) == ADMIN_CHAT_ID
+        ]
+
+    async def test_admin_reply_is_routed_by_the_forwarded_message_id(self):
+        question = make_message(
+            self.bot, CLIENT_CHAT_ID, 10, text="Как ухаживать после кератина?"
+        )
+        await handlers.handle_message(question, self.bot)
+        forwarded_id = self.admin_message_ids()[0]
+
+        # Reformatted text without "ID:" does not matter anymore.
+        forwarded = make_message(self.bot, ADMIN_CHAT_ID, forwarded_id, text="Вопрос")
+        reply = make_message(
+            self.bot,
+            ADMIN_CHAT_ID,
+            900,
+            text="Мойте без сульфатов",
+            reply_to_message=forwarded,
+        )
+        await handlers.admin_reply(reply, self.bot)
+
+        method, params = self.api.calls[-1]
+        self.assertEqual(method, "copyMessage")
+        self.assertEqual(int(params["chat_id"]), CLIENT_CHAT_ID)
+        self.assertEqual(int(params["message_id"]), 900)
+        history = await db.load_consultation_history(CLIENT_CHAT_ID)
+        self.assertEqual(
+            [(entry["direction"], entry["text"]) for entry in history],
+            [("in", "Как ухаживать после кератина?"), ("out", "Мойте без сульфатов")],
+        )
+
+    async def test_photo_question_is_copied_and_both_admin_messages_are_linked(self):
+        photo = [PhotoSize(file_id="photo", file_unique_id="p", width=1, height=1)]
+        question = make_message(self.bot, CLIENT_CHAT_ID, 11, photo=photo, caption="Вот так")
+        await handlers.handle_message(question, self.bot)
+
+        header_id, copy_id = self.admin_message_ids()
+        self.assertEqual(await db.find_consultation_client(header_id), CLIENT_CHAT_ID)
+        self.assertEqual(await db.find_consultation_client(copy_id), CLIENT_CHAT_ID)
+        history = await db.load_consultation_history(CLIENT_CHAT_ID)
+        self.assertEqual(history[0]["content_type"], "photo")
+        self.assertEqual(
+            handlers.describe_consultation_message(history[0]), "<b>Клиент:</b> [фото] Вот так"
+        )
+
+    async def test_reply_to_a_header_forwarded_before_links_uses_its_id_line(self):
+        header = Message(
+            message_id=5,
+            date=datetime.now(),
+            chat=Chat(id=ADMIN_CHAT_ID, type="group"),
+            from_user=User(id=self.bot.id, is_bot=True, first_name="Bot"),
+            text=f"📩 Новое сообщение для консультации\n\nID: {CLIENT_CHAT_ID}",
+        ).as_(self.bot)
+        reply = make_message(self.bot, ADMIN_CHAT_ID, 901, text="Да", reply_to_message=header)
+
+        await handlers.admin_reply(reply, self.bot)
+
+        method, params = self.api.calls[-1]
+        self.assertEqual((method, int(params["chat_id"])), ("copyMessage", CLIENT_CHAT_ID))
+
+    async def test_reply_to_an_unknown_bot_message_is_reported(self):
+        notice = Message(
+            message_id=6,
+            date=datetime.now(),
+            chat=Chat(id=ADMIN_CHAT_ID, type="group"),
+            from_user=User(id=self.bot.id, is_bot=True, first_name="Bot"),
+            text="Рассылка #1 завершена.",
+        ).as_(self.bot)
+        reply = make_message(self.bot, ADMIN_CHAT_ID, 902, text="Ок", reply_to_message=notice)
+
+        await handlers.admin_reply(reply, self.bot)
+
+        self.assertEqual(self.api.sent_to(), [ADMIN_CHAT_ID])
+        self.assertEqual(self.api.sent_to("copyMessage"), [])
+
+    async def test_reply_to_unknown_message_is_ignored(self):
+        unrelated = make_message(self.bot, ADMIN_CHAT_ID, 77, text="ID: 123")
+        reply = make_message(
+            self.bot, ADMIN_CHAT_ID, 78, text="?", reply_to_message=unrelated
+        )
+        await handlers.admin_reply(reply, self.bot)
+        self.assertEqual(self.api.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import app.db as db
+
+
+def make_user(first_name: str = "Anna") -> SimpleNamespace:
+    return SimpleNamespace(
+        first_name=first_name,
+        last_name=None,
+        username="anna",
+        is_bot=False,
+        language_code="ru",
+    )
+
+
+class ConnectionTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_db_path = db.DB_PATH
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        await db.init_db()
+
+    async def asyncTearDown(self):
+        await db.close_db()
+        db.DB_PATH = self.original_db_path
+        self.temp_dir.cleanup()
+
+    async def test_connection_is_shared_and_uses_wal(self):
+        connection = db.get_connection()
+        await db.save_diagnostic_session(42, ["1.1"], "2")
+        self.assertIs(db.get_connection(), connection)
+        rows = await connection.execute_fetchall("PRAGMA journal_mode")
+        self.assertEqual(rows[0][0], "wal")
+
+    async def test_failed_transaction_is_rolled_back(self):
+        await db.save_diagnostic_session(42, ["1.1"], "2")
+        with self.assertRaises(RuntimeError):
+            async with db.transaction() as connection:
+                await connection.execute(
+                    "DELETE FROM diagnostic_sessions WHERE chat_id = ?", (42,)
+                )
+                raise RuntimeError("boom")
+        progress = await db.load_diagnostic_session(42)
+        self.assertEqual(progress, {"answers": ["1.1"], "question_id": "2"})
+
+
+class ActivityLogTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_db_path = db.DB_PATH
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        await db.init_db()
+
+    async def asyncTearDown(self):
+        await db.close_db()
+        db.DB_PATH = self.original_db_path
+        self.temp_dir.cleanup()
+
+    async def fetch_user(self, chat_id: int):
+        rows = await db.get_connection().execute_fetchall(
+            "SELECT first_name, phone_number, command FROM users WHERE chat_id = ?",
+            (chat_id,),
+        )
+        return rows[0] if rows else None
+
+    async def stored_chats(self) -> list[int]:
+        rows = await db.get_connection().execute_fetchall(
+            "SELECT chat_id FROM users ORDER BY chat_id"
+        )
+        return [row[0] for row in rows]
+
+    async def test_activity_is_written_in_batch(self):
+        await db.log_user(7, make_user(), "start", phone_number="+7000")
+        self.assertIsNone(await self.fetch_user(7))
+
+        await db.log_user(7, make_user("Anya"), "client")
+        await db.flush_activity()
+
+        self.assertEqual(tuple(await self.fetch_user(7)), ("Anya", "+7000", "client"))
+
+    async def test_missing_user_is_ignored(self):
+        await db.log_user(7, None, "start")
+        await db.flush_activity()
+        self.assertIsNone(await self.fetch_user(7))
+
+    async def test_failed_writes_keep_a_bounded_backlog(self):
+        await db.close_db()
+        with mock.patch.dict("os.environ", ACTIVITY_BATCH_SIZE="2"):
+            await db.init_db()
+        for chat_id in range(1, 7):
+            await db.log_user(chat_id, make_user(), "start", phone_number="+7000")
+        await db.log_user(1, make_user("Anya"), "client")
+
+        with mock.patch.object(db, "ACTIVITY_BACKLOG_BATCHES", 2), mock.patch.object(
+            db, "transaction", side_effect=RuntimeError("locked")
+        ):
+            with self.assertLogs(level="WARNING"), self.assertRaises(RuntimeError):
+                await db.flush_activity()
+            for _ in range(2):
+                with self.assertRaises(RuntimeError):
+                    await db.flush_activity()
+        await db.flush_activity()
+
+        # Two batches of two rows survive: chat 1 (its newest row, which keeps
+        # the phone number) and the newest other chats.
+        self.assertEqual(await self.stored_chats(), [1, 4, 5, 6])
+        self.assertEqual(tuple(await self.fetch_user(1)), ("Anya", "+7000", "client"))
+
+    async def test_pending_activity_is_flushed_on_shutdown(self):
+        await db.log_user(7, make_user(), "start")
+        await db.close_db()
+        await db.init_db()
+        self.assertEqual(tuple(await self.fetch_user(7)), ("Anna", None, "start"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,32 @@
 from __future__ import annotations
 
 import json
+import os
 import tempfile
 import unittest
+from dataclasses import replace
 from pathlib import Path
+from unittest import mock
 
 import app.db as db
-from app.diagnostics import analyze_answers, build_recommendation, load_diagnostic_sources
-from app.diagnostics_validation import TELEGRAM_TEXT_LIMIT, enumerate_paths, validate_sources
+from app.diagnostics import (
+    analyze_answers,
+    build_recommendation,
+    compile_diagnostics,
+    load_compiled_diagnostics,
+    load_diagnostic_sources,
+    load_sources,
+    recommendation_cache_info,
+)
+from app.diagnostics_validation import (
+    MAX_REPORTED_PATH_ERRORS,
+    TELEGRAM_TEXT_LIMIT,
+    enumerate_paths,
+    iter_analyzed_paths,
+    iter_paths,
+    validate_sources,
+)
+from app.file_cache import CachedFile, read_json_object
 from app.paths import DATA_DIR
 
 
@@ -25,6 +44,23 @@ class DiagnosticsTests(unittest.TestCase):
         self.assertEqual(report.terminal_paths, 3696)
         self.assertLess(report.longest_result, TELEGRAM_TEXT_LIMIT)
 
+    def test_parallel_validation_matches_serial(self):
+        questions = load_questions()
+        serial = validate_sources(questions, *load_diagnostic_sources())
+        parallel = validate_sources(questions, *load_diagnostic_sources(), jobs=2)
+        self.assertEqual(parallel, serial)
+
+    def test_all_failing_paths_are_counted(self):
+        questions = load_questions()
+        factors, rules, content = load_diagnostic_sources()
+        content = {**content, "settings": {**content["settings"], "footer": "x" * TELEGRAM_TEXT_LIMIT}}
+
+        report = validate_sources(questions, factors, rules, content, jobs=2)
+
+        self.assertEqual(len(report.errors), MAX_REPORTED_PATH_ERRORS + 1)
+        self.assertIn("1.1|2.1|3.1|4.1|5.1|8.1", report.errors[0])
+        self.assertIn("всего 3696", report.errors[-1])
+
     def test_primary_module_follows_explicit_main_problem(self):
         cases = {
             "3.1": "primary_volume",
@@ -59,6 +95,58 @@ class DiagnosticsTests(unittest.TestCase):
         self.assertNotIn("volume_sensitivity", text)
         self.assertNotIn("/10", text)
 
+    def test_compiled_sources_are_reused_between_calls(self):
+        self.assertIs(load_compiled_diagnostics(), load_compiled_diagnostics())
+
+    def test_recommendation_is_memoized_per_answer_path(self):
+        compiled = compile_diagnostics(*load_diagnostic_sources())
+        answers = ["1.1", "2.1", "3.1", "4.1", "5.1", "8.1"]
+
+        first = compiled.recommend(answers)
+        second = compiled.recommend([*answers, "8.1"])
+
+        self.assertIs(first, second)
+        self.assertEqual(compiled.recommendation_cache_info().hits, 1)
+        self.assertEqual(first, build_recommendation(answers))
+
+    def test_recommendation_cache_totals_survive_a_new_version(self):
+        answers = ["1.1", "2.1", "3.1", "4.1", "5.1", "8.1"]
+        build_recommendation(answers)
+        build_recommendation(answers)
+        before = recommendation_cache_info()
+
+        published = replace(load_sources(), version=load_sources().version + 1000)
+        with mock.patch("app.diagnostics.load_sources", return_value=published):
+            build_recommendation(answers)
+        after = recommendation_cache_info()
+
+        self.assertGreaterEqual(before.hits, 1)
+        self.assertEqual((after.hits, after.misses), (before.hits, before.misses + 1))
+        self.assertEqual(after.currsize, 1)
+
+    def test_compiled_rules_ignore_empty_conditions(self):
+        factors = {"answers": {"a": {"labels": {"state": "dry"}, "tags": ["x"]}}}
+        rules = {
+            "fallback_primary_id": "fallback",
+            "rules": [
+                {
+                    "module_id": "dry",
+                    "role": "primary",
+                    "priority": 10,
+                    "conditions": {"label_in": {"state": "dry"}, "any_tags": []},
+                },
+            ],
+        }
+        content = {
+            "modules": [
+                {"id": "dry", "role": "primary"},
+                {"id": "fallback", "role": "primary"},
+            ],
+        }
+        compiled = compile_diagnostics(factors, rules, content)
+        self.assertEqual(compiled.analyze(["a"]).primary["id"], "dry")
+        self.assertEqual(compiled.analyze(["b"]).primary["id"], "fallback")
+
     def test_questions_have_no_legacy_exact_path_rules(self):
         self.assertNotIn("rules", load_questions())
 
@@ -67,6 +155,72 @@ class DiagnosticsTests(unittest.TestCase):
         self.assertEqual(paths[0], ["1.1", "2.1", "3.1", "4.1", "5.1", "8.1"])
         self.assertEqual(len(paths), len({tuple(path) for path in paths}))
 
+    def test_paths_are_streamed(self):
+        paths = iter_paths(load_questions())
+        self.assertEqual(next(paths), ["1.1", "2.1", "3.1", "4.1", "5.1", "8.1"])
+
+    def test_question_cycle_is_reported_in_walk_order(self):
+        config = {
+            "start": "1",
+            "questions": {
+                "1": {"text": "a", "options": [{"id": "a", "next": "2"}]},
+                "2": {"text": "b", "options": [{"id": "b", "next": "1"}]},
+            },
+        }
+        with self.assertRaisesRegex(ValueError, "1 -> 2 -> 1"):
+            enumerate_paths(config)
+
+    def test_prefix_accumulation_matches_full_analysis(self):
+        compiled = compile_diagnostics(*load_diagnostic_sources())
+        for path, result in iter_analyzed_paths(load_questions(), compiled):
+            expected = compiled.analyze(path)
+            self.assertEqual(
+                (result.answers, result.labels, result.scores, result.tags, result.primary),
+                (expected.answers, expected.labels, expected.scores, expected.tags, expected.primary),
+            )
+            self.assertEqual((result.alerts, result.addons), (expected.alerts, expected.addons))
+
+
+class SnapshotCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "snapshot.json"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def publish(self, value: dict):
+        temp_path = self.path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(value), encoding="utf-8")
+        os.replace(temp_path, self.path)
+
+    def test_unchanged_file_is_parsed_once(self):
+        self.publish({"version": 1})
+        calls = []
+        cached = CachedFile(self.path, lambda path: calls.append(path) or read_json_object(path))
+
+        first = cached.get()
+        second = cached.get()
+
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cached.version, 1)
+
+    def test_published_file_is_picked_up_without_restart(self):
+        self.publish({"version": 1})
+        cached = CachedFile(self.path, read_json_object)
+        self.assertEqual(cached.get(), {"version": 1})
+
+        self.publish({"version": 1})
+        self.assertEqual(cached.get(), {"version": 1})
+        self.assertEqual(cached.version, 2)
+
+    def test_missing_file_is_an_empty_object(self):
+        cached = CachedFile(self.path, read_json_object)
+        self.assertEqual(cached.get(), {})
+        self.publish({"version": 2})
+        self.assertEqual(cached.get(), {"version": 2})
+
 
 class DiagnosticSessionTests(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self):
@@ -76,6 +230,7 @@ class DiagnosticSessionTests(unittest.IsolatedAsyncioTestCase):
         await db.init_db()
 
     async def asyncTearDown(self):
+        await db.close_db()
         db.DB_PATH = self.original_db_path
         self.temp_dir.cleanup()
 
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import app.diagnostics_snapshot as diagnostics_snapshot
+from app.diagnostics_snapshot import (
+    ArtifactError,
+    SOURCE_PATHS,
+    check_artifact,
+    dump_artifact,
+    load_artifact,
+    read_json_sources,
+    read_sources,
+    write_artifact,
+)
+
+
+class DiagnosticsSnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        root = Path(self.temp_dir.name)
+        self.source_paths = tuple(root / path.name for path in SOURCE_PATHS)
+        for source, target in zip(SOURCE_PATHS, self.source_paths):
+            shutil.copyfile(source, target)
+        self.artifact_path = root / "diagnostics_compiled.bin"
+
+    def read(self):
+        return read_sources(artifact_path=self.artifact_path, source_paths=self.source_paths)
+
+    def test_artifact_matches_json_sources(self):
+        write_artifact(self.artifact_path, self.source_paths)
+
+        sources = self.read()
+        expected = read_json_sources(self.source_paths)
+
+        self.assertEqual(sources.origin, "artifact")
+        self.assertEqual(sources.questions, expected.questions)
+        self.assertEqual(sources.factors, expected.factors)
+        self.assertEqual(sources.rules, expected.rules)
+        self.assertEqual(sources.content, expected.content)
+
+    def test_valid_artifact_is_loaded_without_reading_sources(self):
+        write_artifact(self.artifact_path, self.source_paths)
+
+        with mock.patch("app.diagnostics_snapshot.read_json_object") as read_json, mock.patch(
+            "app.diagnostics_snapshot.source_digests"
+        ) as digests:
+            self.assertEqual(self.read().origin, "artifact")
+
+        read_json.assert_not_called()
+        digests.assert_not_called()
+        self.assertIsNone(check_artifact(self.artifact_path, self.source_paths))
+
+    def test_missing_artifact_falls_back_to_json(self):
+        self.assertEqual(self.read().origin, "json")
+
+    def test_damaged_artifact_falls_back_to_json(self):
+        write_artifact(self.artifact_path, self.source_paths)
+        data = bytearray(self.artifact_path.read_bytes())
+        data[-1] ^= 0xFF
+        self.artifact_path.write_bytes(bytes(data))
+
+        with self.assertRaisesRegex(ArtifactError, "checksum"):
+            load_artifact(bytes(data))
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(self.read().origin, "json")
+
+    def test_foreign_or_truncated_file_is_rejected(self):
+        data = dump_artifact({"questions": {}})
+
+        with self.assertRaisesRegex(ArtifactError, "not a compiled"):
+            load_artifact(b"NOTDIAG\x00" + data[8:])
+        with self.assertRaisesRegex(ArtifactError, "shorter"):
+            load_artifact(data[:10])
+
+    def test_edited_json_source_wins_over_artifact(self):
+        write_artifact(self.artifact_path, self.source_paths)
+        rules_path = self.source_paths[2]
+        rules_path.write_text(rules_path.read_text(encoding="utf-8") + "\n", encoding="utf-8")
+
+        self.assertEqual(self.read().origin, "json")
+        self.assertIn("older", check_artifact(self.artifact_path, self.source_paths))
+
+    def test_check_artifact_compares_contents(self):
+        write_artifact(self.artifact_path, self.source_paths)
+        with mock.patch(
+            "app.diagnostics_snapshot.source_digests", return_value={"rules": "changed"}
+        ):
+            self.assertIn("contents", check_artifact(self.artifact_path, self.source_paths))
+
+
+class RefreshSourcesTests(unittest.IsolatedAsyncioTestCase):
+    async def test_changed_sources_are_reloaded_in_a_thread(self):
+        threads: list[threading.Thread] = []
+
+        def load():
+            threads.append(threading.current_thread())
+            return "loaded"
+
+        with mock.patch.object(diagnostics_snapshot, "current_sources", return_value=None):
+            with mock.patch.object(diagnostics_snapshot, "load_sources", load):
+                self.assertEqual(await diagnostics_snapshot.refresh_sources(), "loaded")
+
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+    async def test_unchanged_sources_are_returned_on_the_loop(self):
+        current = diagnostics_snapshot.load_sources()
+        with mock.patch("asyncio.to_thread") as to_thread:
+            self.assertIs(await diagnostics_snapshot.refresh_sources(), current)
+        to_thread.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
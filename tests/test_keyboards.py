@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+import app.const as const
+import app.keyboards as keyboards
+import app.texts as texts
+
+
+class KeyboardTests(unittest.TestCase):
+    def test_reply_keyboard_is_reused_until_texts_change(self):
+        first = keyboards.client_keyboard()
+        self.assertIs(keyboards.client_keyboard(), first)
+
+        with mock.patch.object(keyboards, "texts_version", lambda: texts.texts_version() + 1):
+            rebuilt = keyboards.client_keyboard()
+        self.assertIsNot(rebuilt, first)
+        self.assertEqual(rebuilt, first)
+
+    def test_question_keyboard_encodes_answer_and_next_question(self):
+        keyboard = keyboards.question_keyboard("1")
+        first = keyboard.inline_keyboard[0][0]
+
+        self.assertIs(keyboards.question_keyboard("1"), keyboard)
+        self.assertEqual(first.callback_data, f"{const.TEST}:1.1:2")
+        self.assertIsNone(keyboards.question_keyboard("missing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+
+import app.db as db
+from app.media import MediaRegistry, answer_photo, is_local_media, set_media
+
+
+def sent_photo(file_id: str):
+    return mock.Mock(photo=[mock.Mock(file_id="thumb"), mock.Mock(file_id=file_id)])
+
+
+class MediaRegistryTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.base_dir = Path(self.temp_dir.name)
+        self.original_db_path = db.DB_PATH
+        db.DB_PATH = self.base_dir / "test.db"
+        await db.init_db()
+        (self.base_dir / "media").mkdir()
+        (self.base_dir / "media" / "start.jpg").write_bytes(b"start")
+
+    async def asyncTearDown(self):
+        await db.close_db()
+        db.DB_PATH = self.original_db_path
+        self.temp_dir.cleanup()
+
+    def test_file_ids_and_paths_are_told_apart(self):
+        self.assertTrue(is_local_media("media/start.jpg"))
+        self.assertFalse(is_local_media("AgACAgIAAxkDAAOAaSWUu_3BmenqDQnb8-eDbr1D6ngAAgUO"))
+
+    async def test_file_is_uploaded_once_and_then_sent_by_id(self):
+        send = mock.AsyncMock(return_value=sent_photo("photo-1"))
+        await MediaRegistry(self.base_dir).send("media/start.jpg", send)
+        self.assertIsInstance(send.await_args.args[0], FSInputFile)
+
+        # A new registry simulates a restart: the ID comes from SQLite.
+        send.reset_mock()
+        await MediaRegistry(self.base_dir).send("media/start.jpg", send)
+        send.assert_awaited_once_with("photo-1")
+
+    async def test_rejected_file_id_falls_back_to_upload(self):
+        await db.save_media_file_id(
+            MediaRegistry(self.base_dir).content_hash("media/start.jpg"), "stale"
+        )
+        rejected = TelegramBadRequest(mock.Mock(), "Bad Request: wrong file identifier")
+        send = mock.AsyncMock(side_effect=[rejected, sent_photo("fresh")])
+
+        await MediaRegistry(self.base_dir).send("media/start.jpg", send)
+
+        self.assertEqual(send.await_args_list[0].args, ("stale",))
+        self.assertIsInstance(send.await_args_list[1].args[0], FSInputFile)
+        self.assertEqual(list((await db.load_media_file_ids()).values()), ["fresh"])
+
+    async def test_unrelated_file_error_keeps_the_file_id(self):
+        registry = MediaRegistry(self.base_dir)
+        await db.save_media_file_id(registry.content_hash("media/start.jpg"), "photo-1")
+        too_big = TelegramBadRequest(mock.Mock(), "Bad Request: file is too big")
+        send = mock.AsyncMock(side_effect=too_big)
+
+        with mock.patch.object(registry, "_forget") as forget:
+            with self.assertRaises(TelegramBadRequest):
+                await registry.send("media/start.jpg", send)
+
+        forget.assert_not_called()
+        send.assert_awaited_once_with("photo-1")
+
+    async def test_expired_file_reference_is_stale(self):
+        registry = MediaRegistry(self.base_dir)
+        await db.save_media_file_id(registry.content_hash("media/start.jpg"), "stale")
+        expired = TelegramBadRequest(mock.Mock(), "Bad Request: FILE_REFERENCE_EXPIRED")
+        send = mock.AsyncMock(side_effect=[expired, sent_photo("fresh")])
+
+        await registry.send("media/start.jpg", send)
+
+        self.assertIsInstance(send.await_args.args[0], FSInputFile)
+
+    async def test_changed_file_is_uploaded_again(self):
+        registry = MediaRegistry(self.base_dir)
+        send = mock.AsyncMock(return_value=sent_photo("photo-1"))
+        await registry.send("media/start.jpg", send)
+
+        path = self.base_dir / "media" / "start.jpg"
+        path.write_bytes(b"new start")
+        send.reset_mock()
+        await registry.send("media/start.jpg", send)
+        self.assertIsInstance(send.await_args.args[0], FSInputFile)
+
+    async def test_album_uploads_only_unknown_files(self):
+        (self.base_dir / "media" / "review.jpg").write_bytes(b"review")
+        registry = MediaRegistry(self.base_dir)
+        await registry.send("media/start.jpg", mock.AsyncMock(return_value=sent_photo("start")))
+
+        send = mock.AsyncMock(return_value=[sent_photo("start"), sent_photo("review")])
+        await registry.send_group(["media/start.jpg", "media/review.jpg", "legacy-id"], send)
+
+        start, review, legacy = send.await_args.args[0]
+        self.assertEqual((start, legacy), ("start", "legacy-id"))
+        self.assertIsInstance(review, FSInputFile)
+        self.assertEqual(await registry.cached_file_id("media/review.jpg"), "review")
+
+    async def test_missing_file_is_sent_as_text(self):
+        set_media(MediaRegistry(self.base_dir))
+        self.addCleanup(set_media, None)
+        message = mock.AsyncMock()
+
+        with mock.patch("app.media.file", return_value="media/absent.jpg"):
+            with self.assertLogs(level="ERROR"):
+                await answer_photo(message, "start", caption="Привет", reply_markup="kb")
+
+        message.answer_photo.assert_not_awaited()
+        message.answer.assert_awaited_once_with("Привет", reply_markup="kb")
+
+    async def test_album_skips_missing_files(self):
+        registry = MediaRegistry(self.base_dir)
+        send = mock.AsyncMock(return_value=[sent_photo("start")])
+
+        with self.assertLogs(level="ERROR"):
+            await registry.send_group(["media/absent.jpg", "media/start.jpg"], send)
+            self.assertEqual(await registry.send_group(["media/absent.jpg"], send), [])
+
+        (only,) = send.await_args.args[0]
+        self.assertIsInstance(only, FSInputFile)
+        send.assert_awaited_once()
+
+    async def test_upload_missing_skips_cached_and_reports_absent_files(self):
+        registry = MediaRegistry(self.base_dir)
+        upload = mock.AsyncMock(return_value=sent_photo("start"))
+
+        result = await registry.upload_missing(
+            ["media/start.jpg", "media/start.jpg", "media/absent.jpg", "legacy-id"], upload
+        )
+        self.assertEqual(result, (1, 0, ["media/absent.jpg"]))
+
+        result = await registry.upload_missing(["media/start.jpg"], upload)
+        self.assertEqual(result, (0, 1, []))
+        upload.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
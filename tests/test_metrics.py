@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import socket
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+import aiohttp
+from aiogram.types import Chat, Message, Update, User
+
+import app.db as db
+import main
+from app import metrics
+from app.const import TEST
+from app.outbound import BotApiMetrics
+from app.state import MemoryStateStore, set_store
+from app.texts import button
+from tests.fake_bot_api import FakeBotApi
+
+
+class MetricTypesTests(unittest.IsolatedAsyncioTestCase):
+    def test_histogram_buckets_are_cumulative_and_inclusive(self):
+        histogram = metrics.Histogram("t_seconds", "Test.", ("call",), buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(seconds, "q")
+
+        lines = histogram.render()
+
+        self.assertIn('t_seconds_bucket{call="q",le="0.1"} 2', lines)
+        self.assertIn('t_seconds_bucket{call="q",le="1.0"} 3', lines)
+        self.assertIn('t_seconds_bucket{call="q",le="+Inf"} 4', lines)
+        self.assertIn('t_seconds_count{call="q"} 4', lines)
+        self.assertIn('t_seconds_sum{call="q"} 3.65', lines)
+
+    def test_labels_are_escaped_and_checked(self):
+        counter = metrics.Counter("t", "Test.", ("name",))
+        counter.inc('a"b')
+
+        self.assertIn('t_total{name="a\\"b"} 1', counter.render())
+        with self.assertRaises(ValueError):
+            counter.inc()
+
+    def test_callback_counter_renders_a_total(self):
+        retries = {"value": 2}
+        counter = metrics.CallbackCounter("t_retries", "Test.", lambda: retries["value"])
+
+        lines = counter.render()
+
+        self.assertIn("# TYPE t_retries counter", lines)
+        self.assertIn("t_retries_total 2", lines)
+
+    def test_histogram_counts_every_series(self):
+        histogram = metrics.Histogram("t_seconds", "Test.", ("call",))
+        histogram.observe(0.1, "a")
+        histogram.observe(0.2, "a")
+        histogram.observe(0.3, "b")
+
+        self.assertEqual(histogram.counts(), {("a",): 2, ("b",): 1})
+
+    def test_cache_statistics_are_exported_as_counters(self):
+        main.register_cache_metrics()
+
+        text = metrics.REGISTRY.render()
+
+        self.assertIn("# TYPE bot_session_cache_evictions counter", text)
+        self.assertIn("bot_recommendation_cache_hits_total ", text)
+        self.assertIn("# TYPE bot_recommendation_cache_size gauge", text)
+
+    async def test_timed_records_failed_calls_too(self):
+        histogram = metrics.Histogram("t_seconds", "Test.", ("call",))
+
+        @metrics.timed(histogram)
+        async def broken():
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            await broken()
+        self.assertEqual(histogram.count(broken.__qualname__), 1)
+
+    async def test_metrics_endpoint_serves_the_registry(self):
+        registry = metrics.Registry()
+        registry.register(metrics.Gauge("t_depth", "Test.", lambda: 3))
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+
+        runner = await metrics.start_metrics_server("127.0.0.1", port, registry)
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                    body = await response.text()
+                    content_type = response.headers["Content-Type"]
+        finally:
+            await runner.cleanup()
+
+        self.assertIn("t_depth 3", body)
+        self.assertTrue(content_type.startswith("text/plain; version=0.0.4"))
+
+
+class DispatcherMetricsTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_db_path = db.DB_PATH
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        await db.init_db()
+        set_store(MemoryStateStore())
+        self.api = FakeBotApi()
+        await self.api.start()
+        self.bot = self.api.bot()
+        self.bot.session.middleware(BotApiMetrics())
+
+    async def asyncTearDown(self):
+        await self.bot.session.close()
+        await self.api.close()
+        set_store(None)
+        await db.close_db()
+        db.DB_PATH = self.original_db_path
+        self.temp_dir.cleanup()
+
+    async def test_button_press_records_handler_api_and_quiz_metrics(self):
+        handler_before = metrics.HANDLER_SECONDS.count(f"message_test_start:{TEST}", "ok")
+        api_before = metrics.BOT_API_SECONDS.count("sendMessage", "ok")
+        starts_before = metrics.QUIZ_STARTS.value()
+        message = Message(
+            message_id=1,
+            date=datetime.now(),
+            chat=Chat(id=501, type="private"),
+            from_user=User(id=501, is_bot=False, first_name="Anna"),
+            text=button(TEST),
+        )
+
+        await main.build_dispatcher().feed_update(
+            self.bot, Update(update_id=1, message=message)
+        )
+
+        self.assertEqual(
+            metrics.HANDLER_SECONDS.count(f"message_test_start:{TEST}", "ok"), handler_before + 1
+        )
+        self.assertEqual(metrics.BOT_API_SECONDS.count("sendMessage", "ok"), api_before + 1)
+        self.assertEqual(metrics.QUIZ_STARTS.value(), starts_before + 1)
+        self.assertIn("bot_handler_seconds_bucket{", metrics.REGISTRY.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
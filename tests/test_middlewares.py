@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Chat, Message, Update, User
+
+from app.middlewares import ChatOrderMiddleware
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=chat_id, type="private"),
+            from_user=User(id=chat_id, is_bot=False, first_name="Test"),
+            text=str(update_id),
+        ),
+    )
+
+
+class ChatOrderMiddlewareTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.events: list[tuple[str, int, int]] = []
+        self.middleware = ChatOrderMiddleware()
+        self.dp = Dispatcher()
+        self.dp.update.outer_middleware(self.middleware)
+        router = Router()
+
+        @router.message()
+        async def record(message: Message):
+            self.events.append(("start", message.chat.id, message.message_id))
+            # The first update of a chat is the slowest one.
+            await asyncio.sleep(0.02 if message.message_id % 10 == 1 else 0)
+            self.events.append(("end", message.chat.id, message.message_id))
+
+        self.dp.include_router(router)
+        self.bot = Bot("42:TEST")
+
+    async def asyncTearDown(self):
+        await self.bot.session.close()
+
+    async def feed(self, *updates: Update):
+        await asyncio.gather(*(self.dp.feed_update(self.bot, update) for update in updates))
+
+    async def test_updates_of_one_chat_run_in_arrival_order(self):
+        await self.feed(*(make_update(update_id, 1) for update_id in (1, 2, 3)))
+
+        self.assertEqual(
+            self.events,
+            [(kind, 1, update_id) for update_id in (1, 2, 3) for kind in ("start", "end")],
+        )
+        self.assertEqual(self.middleware.active_chats, 0)
+
+    async def test_different_chats_are_handled_concurrently(self):
+        await self.feed(make_update(1, 1), make_update(12, 2))
+
+        self.assertEqual(
+            self.events[:2], [("start", 1, 1), ("start", 2, 12)]
+        )
+        self.assertEqual(self.events[2], ("end", 2, 12))
+        self.assertEqual(self.middleware.active_chats, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
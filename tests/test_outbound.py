@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from unittest import mock
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+
+from app.outbound import OutboundLimiter, RateLimit, SendPriority, send_priority
+
+
+class RateLimitTests(unittest.TestCase):
+    def test_burst_is_free_and_then_sends_are_spaced(self):
+        limit = RateLimit(rate=2, burst=3)
+        delays = [limit.reserve(10.0) for _ in range(5)]
+        self.assertEqual(delays, [0.0, 0.0, 0.0, 0.5, 1.0])
+        self.assertTrue(RateLimit(rate=2).idle(10.0))
+
+    def test_pause_blocks_until_the_given_time(self):
+        limit = RateLimit(rate=1, burst=3)
+        limit.pause(15.0)
+        self.assertEqual(limit.delay(10.0), 5.0)
+
+
+class OutboundLimiterTests(unittest.IsolatedAsyncioTestCase):
+    async def test_interactive_sends_overtake_queued_bulk_sends(self):
+        limiter = OutboundLimiter(global_rate=50, chat_rate=1000, chat_burst=10)
+        order: list[int] = []
+
+        async def make_request(bot, method):
+            order.append(method.chat_id)
+
+        async def send(chat_id: int, priority: SendPriority):
+            with send_priority(priority):
+                await limiter(make_request, mock.Mock(), SendMessage(chat_id=chat_id, text="x"))
+
+        await send(1, SendPriority.INTERACTIVE)
+        bulk = [asyncio.create_task(send(chat_id, SendPriority.BULK)) for chat_id in (2, 3)]
+        await asyncio.sleep(0)
+        await send(4, SendPriority.INTERACTIVE)
+        await asyncio.gather(*bulk)
+
+        self.assertEqual(order, [1, 4, 2, 3])
+        self.assertEqual(limiter.stats.sent, 4)
+        self.assertEqual(limiter.stats.max_queued, 3)
+        self.assertEqual(limiter.queue_depth, 0)
+
+    async def test_sends_to_one_chat_respect_the_chat_limit(self):
+        limiter = OutboundLimiter(global_rate=1000, chat_rate=20, chat_burst=1)
+        make_request = mock.AsyncMock()
+        loop = asyncio.get_running_loop()
+
+        started = loop.time()
+        for _ in range(3):
+            await limiter(make_request, mock.Mock(), SendMessage(chat_id=7, text="x"))
+
+        self.assertGreaterEqual(loop.time() - started, 0.09)
+        self.assertEqual(limiter.stats.delayed, 2)
+
+    async def test_chat_rates_override_the_group_rate(self):
+        limiter = OutboundLimiter(global_rate=1000, chat_burst=1, chat_rates={-100: 1000})
+        make_request = mock.AsyncMock()
+        loop = asyncio.get_running_loop()
+
+        started = loop.time()
+        for _ in range(3):
+            await limiter(make_request, mock.Mock(), SendMessage(chat_id=-100, text="x"))
+
+        # At the default group rate the third send would wait six seconds.
+        self.assertLess(loop.time() - started, 0.5)
+
+    async def test_flood_wait_is_retried(self):
+        limiter = OutboundLimiter()
+        method = SendMessage(chat_id=7, text="x")
+        make_request = mock.AsyncMock(
+            side_effect=[TelegramRetryAfter(method, "Too Many Requests", 0), "sent"]
+        )
+
+        self.assertEqual(await limiter(make_request, mock.Mock(), method), "sent")
+        self.assertEqual(make_request.await_count, 2)
+        self.assertEqual(limiter.stats.retries, 1)
+
+    async def test_flood_wait_is_raised_after_max_retries(self):
+        limiter = OutboundLimiter(max_retries=1)
+        method = SendMessage(chat_id=7, text="x")
+        error = TelegramRetryAfter(method, "Too Many Requests", 0)
+        make_request = mock.AsyncMock(side_effect=[error, error])
+
+        with self.assertRaises(TelegramRetryAfter):
+            await limiter(make_request, mock.Mock(), method)
+
+    async def test_other_methods_are_not_limited(self):
+        limiter = OutboundLimiter()
+        make_request = mock.AsyncMock(return_value="me")
+
+        self.assertEqual(await limiter(make_request, mock.Mock(), GetMe()), "me")
+        self.assertEqual(limiter.stats.sent, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app import profiling
+
+
+def busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfileCaptureTests(unittest.IsolatedAsyncioTestCase):
+    async def test_capture_reports_code_run_by_other_tasks(self):
+        async def blocking_handler():
+            await asyncio.sleep(0.01)
+            busy(0.02)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            capture = asyncio.create_task(profiling.capture_profile(0.1, Path(temp_dir)))
+            await asyncio.sleep(0)
+            self.assertTrue(profiling.is_capturing())
+            with self.assertRaises(profiling.ProfileInProgress):
+                await profiling.capture_profile(0.1, Path(temp_dir))
+            await blocking_handler()
+            report = await capture
+
+            self.assertFalse(profiling.is_capturing())
+            self.assertTrue(report.stats_path.exists())
+            self.assertIn("busy", report.report_path.read_text(encoding="utf-8"))
+
+    def test_duration_is_bounded(self):
+        self.assertEqual(profiling.profile_duration(10_000), profiling.MAX_PROFILE_SECONDS)
+        self.assertEqual(profiling.profile_duration(-1), 0.1)
+
+
+class SlowCallbackMonitorTests(unittest.IsolatedAsyncioTestCase):
+    async def test_blocking_step_is_logged_with_its_coroutine(self):
+        monitor = profiling.SlowCallbackMonitor(threshold=0.02)
+        monitor.install()
+        self.addCleanup(monitor.uninstall)
+        before = profiling.SLOW_CALLBACKS.value()
+
+        async def slow_handler():
+            busy(0.03)
+            await asyncio.sleep(0)
+
+        async def fast_handler():
+            await asyncio.sleep(0)
+
+        with self.assertLogs(level="WARNING") as logs:
+            await asyncio.create_task(fast_handler())
+            await asyncio.create_task(slow_handler())
+
+        self.assertEqual(profiling.SLOW_CALLBACKS.value(), before + 1)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("slow_handler", logs.output[0])
+
+    def test_foreign_loop_falls_back_to_debug_mode(self):
+        # e.g. uvloop, whose handles never call asyncio.Handle._run
+        loop = mock.Mock(spec=asyncio.AbstractEventLoop)
+        original = asyncio.Handle._run
+        monitor = profiling.SlowCallbackMonitor(threshold=0.05)
+
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(monitor.install(loop))
+
+        self.assertIs(asyncio.Handle._run, original)
+        loop.set_debug.assert_called_once_with(True)
+        self.assertEqual(loop.slow_callback_duration, 0.05)
+        monitor.uninstall()
+        loop.set_debug.assert_called_with(False)
+
+    def test_uninstall_restores_the_loop(self):
+        original = asyncio.Handle._run
+        monitor = profiling.SlowCallbackMonitor(threshold=1)
+        monitor.install()
+        self.assertIsNot(asyncio.Handle._run, original)
+        monitor.uninstall()
+        self.assertIs(asyncio.Handle._run, original)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import threading
+import unittest
+from unittest import mock
+
+import app.recommendations as recommendations
+from app.diagnostics import build_recommendation, load_compiled_diagnostics
+
+ANSWERS = ["1.2", "2.2", "3.2", "4.2", "5.2", "8.2"]
+
+
+class RecommendTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.addCleanup(recommendations.shutdown_executor)
+        recommendations.shutdown_executor()
+
+    async def test_new_path_is_rendered_in_the_executor(self):
+        threads: list[str] = []
+        original = recommendations.build_recommendation
+
+        def record_thread(answers):
+            threads.append(threading.current_thread().name)
+            return original(answers)
+
+        queued = recommendations.RECOMMENDATION_QUEUE_SECONDS.count()
+        compiled = load_compiled_diagnostics()
+        path = [*ANSWERS[:-1], "8.3"]
+        with mock.patch.object(compiled, "cached_recommendation", return_value=None):
+            with mock.patch.object(recommendations, "build_recommendation", record_thread):
+                text = await recommendations.recommend(path)
+
+        self.assertEqual(text, build_recommendation(path))
+        self.assertEqual(recommendations.RECOMMENDATION_QUEUE_SECONDS.count(), queued + 1)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith("recommend"))
+
+    async def test_memoized_path_skips_the_executor(self):
+        expected = build_recommendation(ANSWERS)
+        before = recommendations.RECOMMENDATION_SECONDS.count("memo")
+
+        with mock.patch.object(recommendations, "get_executor") as get_executor:
+            text = await recommendations.recommend(ANSWERS)
+
+        self.assertIs(text, expected)
+        get_executor.assert_not_called()
+        self.assertEqual(recommendations.RECOMMENDATION_SECONDS.count("memo"), before + 1)
+
+    async def test_changed_sources_are_reloaded_off_the_loop(self):
+        build_recommendation(ANSWERS)
+        before = recommendations.RECOMMENDATION_SECONDS.count("executor")
+
+        with mock.patch("app.diagnostics.current_sources", return_value=None):
+            text = await recommendations.recommend(ANSWERS)
+
+        self.assertEqual(text, build_recommendation(ANSWERS))
+        self.assertEqual(recommendations.RECOMMENDATION_SECONDS.count("executor"), before + 1)
+
+    async def test_zero_workers_render_inline(self):
+        with mock.patch.dict("os.environ", RECOMMENDATION_WORKERS="0"):
+            with mock.patch("app.diagnostics.current_sources", return_value=None):
+                self.assertIsNone(recommendations.get_executor())
+                text = await recommendations.recommend(ANSWERS)
+
+        self.assertEqual(text, build_recommendation(ANSWERS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from aiogram.dispatcher.event.bases import SkipHandler
+
+import app.const as const
+import app.handlers as handlers
+import app.handlers_test as handlers_test
+from app.filters import ButtonFilter, IsAdminChat
+from app.texts import button
+
+
+class ButtonDispatchTests(unittest.IsolatedAsyncioTestCase):
+    def test_every_reply_button_has_an_action(self):
+        for key in (
+            const.CLIENT,
+            const.MASTER,
+            const.SERVICES,
+            const.KERATIN,
+            const.BOTOX,
+            const.NANOPLASTIC,
+            const.PRICE,
+            const.REVIEWS,
+            const.SIGNING,
+            const.CONSULTING,
+        ):
+            self.assertIn(key, handlers.BUTTON_ACTIONS)
+
+    async def test_test_button_is_routed_by_the_test_router(self):
+        self.assertNotIn(const.TEST, handlers.BUTTON_ACTIONS)
+        message = mock.Mock(text=button(const.TEST), reply_to_message=None)
+        observer = handlers_test.router.message
+        routes = [
+            handler for handler in observer.handlers
+            if handler.callback is handlers_test.message_test_start
+        ]
+
+        self.assertEqual(len(routes), 1)
+        matched, data = await routes[0].check(message)
+        self.assertTrue(matched)
+        self.assertEqual(data["button"], const.TEST)
+
+    async def test_button_label_is_dispatched_through_the_table(self):
+        message = mock.Mock(text=f" {button(const.PRICE)} ")
+        matched = await ButtonFilter()(message)
+        action = mock.AsyncMock()
+
+        with mock.patch.dict(handlers.BUTTON_ACTIONS, {const.PRICE: action}):
+            await handlers.message_button(message, **matched)
+
+        action.assert_awaited_once_with(message)
+
+    async def test_unknown_button_is_passed_to_the_next_handler(self):
+        with mock.patch.dict(handlers.BUTTON_ACTIONS, clear=True):
+            with self.assertRaises(SkipHandler):
+                await handlers.message_button(mock.Mock(), button=const.PRICE)
+
+
+class AdminChatTests(unittest.IsolatedAsyncioTestCase):
+    def test_handlers_import_without_admin_chat_id(self):
+        # A broken value proves the variable is not read during import.
+        env = {**os.environ, "ADMIN_CHAT_ID": "not-a-number"}
+        script = (
+            "import app.const as const, app.handlers, app.handlers_test\n"
+            "try:\n"
+            "    const.ADMIN_CHAT_ID\n"
+            "except RuntimeError:\n"
+            "    print('lazy')\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=Path(__file__).resolve().parents[1],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.stdout.strip(), "lazy", result.stderr)
+
+    async def test_admin_chat_filter_reads_the_configured_chat(self):
+        with mock.patch.dict(vars(const), ADMIN_CHAT_ID=-100):
+            self.assertTrue(await IsAdminChat()(mock.Mock(chat=mock.Mock(id=-100))))
+            self.assertFalse(await IsAdminChat()(mock.Mock(chat=mock.Mock(id=5))))
+
+
+if __name__ == "__main__":
+    unittest.main()
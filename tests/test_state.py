@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+import app.db as db
+from app.state import MemoryStateStore, SessionCache, SqliteStateStore, create_store
+
+
+class MemoryStateStoreTests(unittest.IsolatedAsyncioTestCase):
+    async def test_progress_and_consultation_round_trip(self):
+        store = MemoryStateStore()
+        await store.save_progress(42, {"answers": ["1.1"], "question_id": "2"})
+        await store.set_consulting(42, True)
+
+        self.assertEqual(await store.load_progress(42), {"answers": ["1.1"], "question_id": "2"})
+        self.assertTrue(await store.is_consulting(42))
+
+        await store.clear_progress(42)
+        await store.set_consulting(42, False)
+        self.assertIsNone(await store.load_progress(42))
+        self.assertFalse(await store.is_consulting(42))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SessionCacheTests(unittest.TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = SessionCache(max_size=2, ttl=60, clock=FakeClock())
+        cache.put(1, {"answers": []})
+        cache.put(2, {"answers": []})
+        cache.get(1)
+        cache.put(3, {"answers": []})
+
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNotNone(cache.get(3))
+        self.assertEqual(cache.stats(), {"size": 2, "hits": 3, "misses": 1, "evictions": 1})
+
+    def test_idle_entries_expire(self):
+        clock = FakeClock()
+        cache = SessionCache(max_size=10, ttl=60, clock=clock)
+        cache.put(1, {"answers": []})
+        cache.put(2, {"answers": []})
+        clock.now = 50
+        cache.get(2)
+        clock.now = 100
+        cache.put(3, {"answers": []})
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get(2))
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.evictions, 1)
+
+
+class SqliteStateStoreTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_db_path = db.DB_PATH
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        await db.init_db()
+
+    async def asyncTearDown(self):
+        await db.close_db()
+        db.DB_PATH = self.original_db_path
+        self.temp_dir.cleanup()
+
+    async def test_shared_stores_see_each_others_state(self):
+        first, second = SqliteStateStore(shared=True), SqliteStateStore(shared=True)
+
+        await first.save_progress(42, {"answers": ["1.1"], "question_id": "2"})
+        await first.set_consulting(7, True)
+        self.assertEqual(await second.load_progress(42), {"answers": ["1.1"], "question_id": "2"})
+        self.assertTrue(await second.is_consulting(7))
+
+        await second.clear_progress(42)
+        await second.set_consulting(7, False)
+        self.assertIsNone(await first.load_progress(42))
+        self.assertFalse(await first.is_consulting(7))
+
+    async def test_consultation_mode_survives_restart(self):
+        await SqliteStateStore().set_consulting(7, True)
+        self.assertTrue(await SqliteStateStore().is_consulting(7))
+        self.assertTrue(await db.is_consultation_active(7))
+
+    async def test_concurrent_first_lookups_keep_consultation_mode(self):
+        store = SqliteStateStore()
+
+        await asyncio.gather(
+            store.set_consulting(7, True), *(store.is_consulting(chat_id) for chat_id in range(3))
+        )
+
+        self.assertTrue(await store.is_consulting(7))
+
+    async def test_evicted_progress_is_reloaded_from_database(self):
+        store = SqliteStateStore(cache=SessionCache(max_size=1, ttl=60))
+        await store.save_progress(1, {"answers": ["1.1"], "question_id": "2"})
+        await store.save_progress(2, {"answers": ["1.2"], "question_id": "2"})
+
+        self.assertEqual(len(store.cache), 1)
+        self.assertEqual(await store.load_progress(1), {"answers": ["1.1"], "question_id": "2"})
+
+    def test_backend_selection(self):
+        self.assertIsInstance(create_store("memory"), MemoryStateStore)
+        self.assertFalse(create_store("sqlite").shared)
+        self.assertTrue(create_store("shared").shared)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import app.texts as texts
+from app.file_cache import CachedFile
+from app.filters import ButtonFilter
+
+
+class TextRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.texts_path = Path(self.temp_dir.name) / "texts.json"
+        self.publish({"client": "Hi", "button_client": "Client"})
+        patcher = mock.patch.multiple(
+            texts,
+            _TEXTS_FILE=CachedFile(self.texts_path, texts.load_json),
+            _FILES_FILE=CachedFile(Path(self.temp_dir.name) / "files.json", texts.load_json),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def publish(self, value: dict):
+        temp_path = self.texts_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(value), encoding="utf-8")
+        os.replace(temp_path, self.texts_path)
+
+    def test_changed_labels_are_picked_up_without_restart(self):
+        self.assertEqual(texts.button_key("Client"), "client")
+        version = texts.texts_version()
+
+        self.publish({"client": "Hello", "button_client": "Клиент"})
+
+        self.assertEqual(texts.text("client"), "Hello")
+        self.assertIsNone(texts.button_key("Client"))
+        self.assertEqual(texts.button_key("Клиент"), "client")
+        self.assertEqual(texts.texts_version(), version + 1)
+
+    def test_broken_edit_keeps_previous_texts(self):
+        self.assertEqual(texts.text("client"), "Hi")
+        self.texts_path.write_text("{", encoding="utf-8")
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(texts.text("client"), "Hi")
+
+    def test_button_filter_passes_matched_key(self):
+        message = SimpleNamespace(text="Client")
+        self.assertEqual(asyncio.run(ButtonFilter("client")(message)), {"button": "client"})
+        self.assertFalse(asyncio.run(ButtonFilter("master")(message)))
+        self.assertFalse(asyncio.run(ButtonFilter()(SimpleNamespace(text="unknown"))))
+
+
+if __name__ == "__main__":
+    unittest.main()
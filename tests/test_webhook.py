@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.config import WebhookSettings
+from app.webhook import build_webhook_app
+
+SETTINGS = WebhookSettings(
+    base_url="https://bot.example.com",
+    path="/telegram/webhook",
+    host="127.0.0.1",
+    port=8080,
+    secret_token="test-secret",
+)
+
+RECORDED_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private", "first_name": "Anna"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Anna"},
+        "text": "hello",
+    },
+}
+
+
+class WebhookTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.received: asyncio.Queue[str] = asyncio.Queue()
+        dp = Dispatcher()
+
+        @dp.message()
+        async def record(message: Message):
+            await self.received.put(message.text)
+
+        bot = Bot(token="42:TEST")
+        self.client = TestClient(TestServer(build_webhook_app(bot, dp, SETTINGS)))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_update_with_secret_is_dispatched(self):
+        response = await self.client.post(
+            SETTINGS.path,
+            json=RECORDED_UPDATE,
+            headers={"X-Telegram-Bot-Api-Secret-Token": SETTINGS.secret_token},
+        )
+        self.assertEqual(response.status, 200)
+        self.assertEqual(await asyncio.wait_for(self.received.get(), 1), "hello")
+
+    async def test_update_without_secret_is_rejected(self):
+        response = await self.client.post(SETTINGS.path, json=RECORDED_UPDATE)
+        self.assertEqual(response.status, 401)
+        self.assertTrue(self.received.empty())
+
+
+if __name__ == "__main__":
+    unittest.main()